@@ -1,76 +1,554 @@
+import numpy as np
 import pandas as pd
-from fastapi import FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+import pyarrow as pa
+from fastapi import Depends, FastAPI, Header, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import anthropic
 import os
 import json
+import functools
+import asyncio
 import threading
+import time
+import resource
 from contextlib import asynccontextmanager
-from typing import Dict, Any
+from typing import AsyncIterator, Callable, Dict, Any, List, Optional, Tuple
+
+import http_cache
+import metrics
+import prompt_builder
+import regulator_db
+import sdwis_codes
+import sdwis_index
+import sdwis_rollups
+import sdwis_schema
+import sdwis_shards
+import search_index
+import service_areas
+import snapshot
+import spatial
+from llm_stub import StubAsyncAnthropic
+from summary_store import SummaryStore
 
 # --- CONFIGURATION ---
 # The data is expected in a 'data' subdirectory.
 # The 'data' directory itself will also be served publicly.
 DATA_DIR = "./data"
+# Legacy JSON summary cache; imported into SUMMARY_DB on first start.
 CACHE_FILE = "pws_summary_cache.json"
+SUMMARY_DB = "pws_summary_cache.sqlite3"
+# Optional expiry policy for stored summaries (unset = keep forever).
+SUMMARY_TTL_DAYS = os.environ.get("SUMMARY_TTL_DAYS")
+SUMMARY_MAX_ENTRIES = os.environ.get("SUMMARY_MAX_ENTRIES")
+# Columnar snapshots of the prepared tables, rebuilt whenever a source CSV changes.
+SNAPSHOT_DIR = "./.snapshot"
+# SQLite copy of the tables, indexed for cross-table regulator queries; kept in sync on every (re)load.
+REGULATOR_DB = os.path.join(SNAPSHOT_DIR, "regulator.sqlite3")
+# Gzip (and, with the optional brotli package, brotli) copies of the files served under /data, by content hash.
+STATIC_CACHE_DIR = os.path.join(SNAPSHOT_DIR, "static")
+# Most rows /api/regulator/systems/export streams for one query.
+REGULATOR_EXPORT_MAX_ROWS = 100000
+# Poll DATA_DIR this often (seconds) and reload changed tables; unset = reload only via /admin/reload.
+DATA_WATCH_SECONDS = float(os.environ.get("DATA_WATCH_SECONDS", "0"))
+# Required in the X-Admin-Token header of admin endpoints when set.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+# Per-state layout written by `filter_sdwis_to_georgia.py --partition`. When set, only its shared reference
+# tables are loaded up front; each state's tables load on first access and the least recently used states
+# are evicted beyond SHARD_MEMORY_BUDGET_MB. Search, map and lookup are built from every state's systems and
+# served areas, which stay resident; rollups and the regulator DB need every table and are not available.
+SHARD_DIR = os.environ.get("SHARD_DIR")
+SHARD_MEMORY_BUDGET_MB = float(os.environ.get("SHARD_MEMORY_BUDGET_MB", "2048"))
+# For `uvicorn app:app --workers N`: keep table columns as Arrow-backed views of the memory-mapped snapshots
+# rather than per-process copies, so every worker shares one copy through the page cache. Snapshots are
+# built by whichever worker gets there first, the summary store is one SQLite DB, and each worker keeps its
+# own indexes. POST /admin/reload reaches a single worker; set DATA_WATCH_SECONDS so all of them reload.
+SHARED_TABLES = os.environ.get("SHARED_TABLES", "0") == "1"
 
 # --- ANTHROPIC CLIENT SETUP ---
 # It is highly recommended to use environment variables for API keys
-client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY", "YOUR_ANTHROPIC_API_KEY"))
+client = anthropic.AsyncAnthropic(api_key=os.environ.get("ANTHROPIC_API_KEY", "YOUR_ANTHROPIC_API_KEY"))
+# Set LLM_STUB_LATENCY to answer with the local fake LLM instead (seconds to its first word, then
+# LLM_STUB_TOKEN_DELAY per word), e.g. to measure time-to-first-token without API calls.
+if os.environ.get("LLM_STUB_LATENCY"):
+    client = StubAsyncAnthropic(latency=float(os.environ["LLM_STUB_LATENCY"]),
+                                token_delay=float(os.environ.get("LLM_STUB_TOKEN_DELAY", "0.02")))
+LLM_MODEL = "claude-3-haiku-20240307"
+# Upper bound on LLM calls outstanding at once across all requests.
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "4"))
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+# Prompt digest limits: characters per table section (~4 characters per token)
+# and how many of the most recent records each section lists.
+PROMPT_TABLE_CHAR_BUDGET = int(os.environ.get("PROMPT_TABLE_CHAR_BUDGET", "2500"))
+PROMPT_LATEST_RECORDS = int(os.environ.get("PROMPT_LATEST_RECORDS", "10"))
+# Also size the legacy raw-rows prompt for one in every PROMPT_SIZE_AUDIT generations, to track the
+# reduction (0: never). Off by default: it re-reads and formats the raw rows the digest replaced.
+PROMPT_SIZE_AUDIT = int(os.environ.get("PROMPT_SIZE_AUDIT", "0"))
+# Raw-rows sampling per table: the latest records of the last few years plus an even spread of older ones.
+SAMPLE_RECENT_YEARS = 5
+SAMPLE_RECENT_RECORDS = 300
+SAMPLE_OLDER_RECORDS = 50
+# Longest timeline /api/systems/{pwsid}/timeline returns; the most recent events are kept.
+TIMELINE_MAX_EVENTS = 1000
 
 # --- GLOBAL IN-MEMORY STORAGE & LOCK ---
 dataframes: Dict[str, pd.DataFrame] = {}
-pws_cache: Dict[str, str] = {}
-cache_lock = threading.Lock()
+# Rarely read columns kept out of `dataframes`, as memory-mapped Arrow tables in the same row order.
+deferred_columns: Dict[str, pa.Table] = {}
+pwsid_index: Dict[str, sdwis_index.PartitionIndex] = {}
+pwsid_index_stats: Dict[str, Any] = {}
+# Event-date keys per event table, ascending within each system's row range.
+event_keys: Dict[str, sdwis_index.EventKeys] = {}
+# Source CSV hash each loaded table was built from, to tell which tables a reload must re-read.
+table_versions: Dict[str, str] = {}
+# Per-table and combined content fingerprints of each system's rows; a summary is stale once they move.
+table_fingerprints: Dict[str, Dict[str, int]] = {}
+# CSVs that failed to load, with the (size, mtime_ns) they failed at; skipped until the file changes.
+failed_tables: Dict[str, Tuple[int, int]] = {}
+pwsid_fingerprints: Dict[str, str] = {}
+# Held for the duration of a load so reloads never overlap.
+reload_lock = threading.Lock()
+regulator_lock = threading.Lock()
+reload_status: Dict[str, Any] = {"running": False, "reloads": 0, "trigger": None, "last_result": None,
+                                 "last_error": None}
+data_version: Optional[str] = None
+code_decoder = sdwis_codes.CodeDecoder()
+zip_coords: Dict[str, Tuple[float, float]] = {}
+# Geocoded systems with violation counts, indexed by grid cell for viewport queries.
+map_grid: Optional[spatial.PointGrid] = None
+map_thresholds: Dict[str, int] = {}
+# Place -> serving systems, for the "who supplies my water" lookup.
+service_area_index: Optional[service_areas.ServiceAreaIndex] = None
+# Typeahead index over system names, PWSIDs and places.
+system_search: Optional[search_index.SearchIndex] = None
+prompt_size_stats: Dict[str, int] = {"prompts": 0, "compact_chars": 0, "audited": 0, "audited_compact_chars": 0,
+                                     "raw_chars": 0}
+summary_store: Optional[SummaryStore] = None
+regulator: Optional[regulator_db.RegulatorDB] = None
+# Per-state tables in sharded mode (SHARD_DIR); None when everything is loaded from DATA_DIR.
+shard_store: Optional[sdwis_shards.ShardStore] = None
+# Statewide and per-group rollups, refreshed at ingest for the systems that changed.
+rollups: Optional[sdwis_rollups.Rollups] = None
+# Summary generations in flight, keyed by PWSID, so concurrent misses share one LLM call.
+inflight_summaries: Dict[str, asyncio.Task] = {}
+# The text streamed so far by each in-flight generation, for /water_quality/{pwsid}/stream listeners.
+inflight_streams: Dict[str, "SummaryBroadcast"] = {}
+
+# --- METRICS (served at /metrics) ---
+http_request_seconds = metrics.Histogram(
+    "sdwis_http_request_seconds", "Request latency by route template and status.", ["route", "status"])
+summary_stage_seconds = metrics.Histogram(
+    "sdwis_summary_stage_seconds", "Latency of each summary pipeline stage (cache_read, data_filter, sampling, "
+    "prompt_build, llm_queue, llm, cache_write).", ["stage"])
+summary_requests_total = metrics.Counter(
+    "sdwis_summary_requests_total", "Summary requests by cache result: hit, miss (started a generation) or joined "
+    "(waited on one already in flight).", ["result"])
+prompt_bytes = metrics.Histogram("sdwis_prompt_bytes", "Size of each summary prompt in bytes.",
+                                 buckets=metrics.SIZE_BUCKETS)
+llm_tokens_total = metrics.Counter("sdwis_llm_tokens_total", "LLM tokens by direction (input, output).",
+                                   ["direction"])
+llm_calls_total = metrics.Counter("sdwis_llm_calls_total", "LLM calls by outcome (ok, error).", ["outcome"])
+llm_calls_in_flight = metrics.Gauge("sdwis_llm_calls_in_flight",
+                                    f"LLM calls holding one of the LLM_MAX_CONCURRENCY ({LLM_MAX_CONCURRENCY}) slots.")
+summaries_in_flight = metrics.Gauge("sdwis_summaries_in_flight", "Summary generations in progress.",
+                                    function=lambda: len(inflight_summaries))
+table_load_seconds = metrics.Gauge("sdwis_table_load_seconds",
+                                   "Duration of each table's last (re)load, from its snapshot or CSV.", ["table"])
+data_load_seconds = metrics.Gauge("sdwis_data_load_seconds",
+                                  "Duration of the last load_all_data that changed any table.")
 
 
 # --- CACHE AND DATA LOADING FUNCTIONS ---
-def load_cache_from_file():
-    """Loads the PWSID summary cache from the local JSON file."""
-    global pws_cache
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, 'r') as f:
-            try:
-                pws_cache = json.load(f)
-                print(f"Loaded {len(pws_cache)} items from {CACHE_FILE}")
-            except json.JSONDecodeError:
-                print(f"Warning: Could not decode JSON from {CACHE_FILE}. Starting with empty cache.")
-                pws_cache = {}
+def open_summary_store():
+    """Opens the SQLite summary store, importing the legacy JSON cache the first time."""
+    global summary_store
+    summary_store = SummaryStore(
+        SUMMARY_DB,
+        ttl_seconds=float(SUMMARY_TTL_DAYS) * 86400 if SUMMARY_TTL_DAYS else None,
+        max_entries=int(SUMMARY_MAX_ENTRIES) if SUMMARY_MAX_ENTRIES else None,
+    )
+    if summary_store.count() == 0:
+        imported = summary_store.import_json(CACHE_FILE)
+        if imported:
+            print(f"Imported {imported} summaries from {CACHE_FILE} into {SUMMARY_DB}")
+    purged = summary_store.purge_expired()
+    print(f"Summary store {SUMMARY_DB} holds {summary_store.count()} items ({purged} expired entries purged).")
 
 
-def save_cache_to_file():
-    """Saves the in-memory cache to the local JSON file."""
-    with open(CACHE_FILE, 'w') as f:
-        json.dump(pws_cache, f, indent=4)
+def current_rss_mb() -> float:
+    """Resident set size of this process in MiB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def process_memory_mb() -> Dict[str, float]:
+    """
+    This process's memory split into pages shared with other processes and
+    private ones, in MiB. PSS charges each shared page to its processes in
+    equal parts, so summing it across workers gives their real footprint.
+    Empty where /proc/self/smaps_rollup is unavailable.
+    """
+    fields = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared",
+              "Private_Clean": "private", "Private_Dirty": "private"}
+    usage: Dict[str, float] = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if parts and parts[0].rstrip(":") in fields:
+                    key = fields[parts[0].rstrip(":")]
+                    usage[key] = usage.get(key, 0) + int(parts[1]) / 1024
+    except (OSError, ValueError):
+        return {}
+    return {key: round(value, 1) for key, value in usage.items()}
 
 
-def load_all_data():
+def prepare_table(name: str, df: pd.DataFrame) -> pd.DataFrame:
     """
-    Loads all CSV files from the DATA_DIR into memory on startup.
+    Applies the column schema and sorts PWSID-keyed tables by system (and
+    event tables by event date within each system); the result is what gets
+    snapshotted.
     """
-    global dataframes
-    print(f"Loading all SDWIS data from '{DATA_DIR}' directory...")
+    df = sdwis_schema.apply_schema(df)
+    if 'PWSID' in df.columns:
+        df = sdwis_index.sort_by_pwsid(df, sdwis_index.EVENT_DATE_COLUMNS.get(name))
+    return df
+
+
+def build_zip_coords(zip_df: pd.DataFrame) -> Dict[str, Tuple[float, float]]:
+    """Maps zero-padded 5-digit ZIP codes to (lat, lon)."""
+    zips = zip_df['zip'].astype(str).str.zfill(5)
+    return dict(zip(zips, zip(zip_df['latitude'].astype(float), zip_df['longitude'].astype(float))))
+
+
+def table_dir() -> str:
+    """Directory of the tables loaded up front: DATA_DIR, or only the shared reference tables in sharded mode."""
+    return os.path.join(SHARD_DIR, sdwis_shards.SHARED_PARTITION) if SHARD_DIR else DATA_DIR
+
+
+def file_stat(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def read_changed_tables() -> Dict[str, Any]:
+    """
+    Reads the CSVs in table_dir() whose content differs from the loaded tables
+    (all of them on the first load). Tables come from the columnar snapshot
+    in SNAPSHOT_DIR when it is still fresh for the source CSV, and are
+    re-parsed (and re-snapshotted) otherwise. Unchanged tables are reused as
+    they are, along with everything built from them. A CSV that fails to
+    load keeps its previously loaded table, if any, and is not retried until
+    it changes.
+    """
+    files = {os.path.splitext(filename)[0]: os.path.join(table_dir(), filename)
+             for filename in sorted(os.listdir(table_dir())) if filename.endswith(".csv")}
+    tables = {"frames": {}, "deferred": {}, "versions": {}, "changed": [], "sources": {"snapshot": 0, "csv": 0}}
+
+    def keep_loaded(file_key: str):
+        if file_key in dataframes:
+            tables["frames"][file_key] = dataframes[file_key]
+            tables["versions"][file_key] = table_versions[file_key]
+            if file_key in deferred_columns:
+                tables["deferred"][file_key] = deferred_columns[file_key]
+
+    for file_key in set(failed_tables) - set(files):
+        del failed_tables[file_key]
+    for file_key, file_path in files.items():
+        if file_key in dataframes and snapshot.is_current(SNAPSHOT_DIR, file_key, file_path,
+                                                          table_versions.get(file_key)):
+            keep_loaded(file_key)
+            continue
+        stat = file_stat(file_path)
+        if failed_tables.get(file_key) == stat:
+            keep_loaded(file_key)
+            continue
+        started = time.perf_counter()
+        try:
+            df, source, deferred = snapshot.load_table(SNAPSHOT_DIR, file_key, file_path,
+                                                       functools.partial(prepare_table, file_key),
+                                                       defer=sdwis_schema.DEFERRED_COLUMNS.get(file_key, ()),
+                                                       arrow_backed=SHARED_TABLES)
+        except Exception as e:
+            print(f"Error loading {os.path.basename(file_path)}: {e}; skipped until it changes.")
+            failed_tables[file_key] = stat
+            keep_loaded(file_key)
+            continue
+        failed_tables.pop(file_key, None)
+        table_load_seconds.set(time.perf_counter() - started, table=file_key)
+        tables["sources"][source] += 1
+        tables["frames"][file_key] = df
+        tables["versions"][file_key] = snapshot.read_manifest(SNAPSHOT_DIR, file_key).get("csv_sha256")
+        if deferred is not None:
+            tables["deferred"][file_key] = deferred
+        tables["changed"].append(file_key)
+    tables["removed"] = sorted(set(dataframes) - set(tables["frames"]))
+    return tables
+
+
+def build_data_state(tables: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Builds the new value of every data global from freshly read tables. Only
+    the changed tables are re-indexed and re-fingerprinted; the lookup
+    structures are rebuilt when a table they draw on changed.
+    """
+    frames, changed = tables["frames"], set(tables["changed"]) | set(tables["removed"])
+    state: Dict[str, Any] = {"dataframes": frames, "deferred_columns": tables["deferred"],
+                             "table_versions": tables["versions"]}
+
+    # Snapshots are written PWSID-sorted, so this keeps the row order the deferred columns share.
+    started = time.perf_counter()
+    sorted_frames, new_indexes, _ = sdwis_index.index_all({name: frames[name] for name in tables["changed"]})
+    frames.update(sorted_frames)
+    indexes = {name: index for name, index in pwsid_index.items() if name in frames and name not in changed}
+    indexes.update(new_indexes)
+    keys = {name: value for name, value in event_keys.items() if name in indexes and name not in changed}
+    keys.update(sdwis_index.build_event_index({name: frames[name] for name in new_indexes}))
+    state.update(pwsid_index=indexes, event_keys=keys,
+                 pwsid_index_stats=sdwis_index.partition_stats(indexes, time.perf_counter() - started))
+    print(f"PWSID index built for {len(new_indexes)} of {len(indexes)} tables "
+          f"({state['pwsid_index_stats']['indexed_systems']} systems) "
+          f"in {state['pwsid_index_stats']['build_seconds']}s, "
+          f"~{state['pwsid_index_stats']['memory_bytes'] / 1024:.0f} KiB; "
+          f"event-date keys ~{sum(value.nbytes for value in keys.values()) / 1024:.0f} KiB.")
+
+    started = time.perf_counter()
+    fingerprints = {name: value for name, value in table_fingerprints.items() if name in indexes and name not in changed}
+    for name in new_indexes:
+        deferred = tables["deferred"].get(name)
+        fingerprints[name] = sdwis_index.partition_fingerprints(
+            frames[name], indexes[name], deferred.to_pandas() if deferred is not None else None)
+    state.update(table_fingerprints=fingerprints, pwsid_fingerprints=sdwis_index.combine_fingerprints(fingerprints))
+    print(f"Fingerprinted {len(state['pwsid_fingerprints'])} systems in {time.perf_counter() - started:.3f}s.")
+
+    state["data_version"] = snapshot.data_version(SNAPSHOT_DIR, frames.keys())
+    print(f"Data version: {state['data_version']}")
+
+    def touched(*names: str) -> bool:
+        return any(name in changed for name in names) or (
+            bool(tables.get("directory_states"))
+            and any(name in sdwis_shards.DIRECTORY_TABLES + (sdwis_shards.VIOLATIONS_TABLE,) for name in names))
+
+    state["code_decoder"] = code_decoder
+    if touched('SDWA_REF_CODE_VALUES'):
+        state["code_decoder"] = sdwis_codes.CodeDecoder(frames['SDWA_REF_CODE_VALUES']) \
+            if 'SDWA_REF_CODE_VALUES' in frames else sdwis_codes.CodeDecoder()
+    state["zip_coords"] = zip_coords
+    if touched('zipCodeToLatLong'):
+        state["zip_coords"] = build_zip_coords(frames['zipCodeToLatLong']) if 'zipCodeToLatLong' in frames else {}
+
+    directory, violations = shard_store.directory() if shard_store is not None else (frames, None)
+    systems, areas = directory.get('SDWA_PUB_WATER_SYSTEMS'), directory.get('SDWA_GEOGRAPHIC_AREAS')
+    state["system_search"] = system_search
+    if touched('SDWA_PUB_WATER_SYSTEMS', 'SDWA_GEOGRAPHIC_AREAS'):
+        state["system_search"] = search_index.SearchIndex(systems, areas) if systems is not None else None
+        if state["system_search"] is not None:
+            print(f"Search index built: {state['system_search'].stats}")
+
+    state.update(map_grid=map_grid, map_thresholds=map_thresholds, service_area_index=service_area_index)
+    if touched('SDWA_PUB_WATER_SYSTEMS', 'SDWA_VIOLATIONS_ENFORCEMENT', 'zipCodeToLatLong', 'SDWA_GEOGRAPHIC_AREAS'):
+        state.update(map_grid=None, map_thresholds={}, service_area_index=None)
+        if systems is not None and state["zip_coords"]:
+            started = time.perf_counter()
+            if violations is None:
+                violations = violation_counts(indexes.get('SDWA_VIOLATIONS_ENFORCEMENT', {}))
+            points = spatial.build_map_points(systems, state["zip_coords"], violations)
+            state["map_grid"] = spatial.PointGrid(points)
+            state["map_thresholds"] = spatial.color_thresholds(points['violations'])
+            print(f"Map layer built with {len(state['map_grid'])} systems in {len(state['map_grid'].cells)} "
+                  f"grid cells in {time.perf_counter() - started:.3f}s.")
+
+            if areas is not None:
+                started = time.perf_counter()
+                index = service_areas.ServiceAreaIndex(areas, systems, points, state["zip_coords"])
+                state["service_area_index"] = index
+                print(f"Service area index built ({len(index.by_zip)} ZIPs, {len(index.by_city)} cities, "
+                      f"{len(index.by_county)} counties) in {time.perf_counter() - started:.3f}s.")
+    return state
+
+
+def stale_pwsids(old: Dict[str, str], new: Dict[str, str]) -> List[str]:
+    """PWSIDs whose rows changed between two fingerprint maps (including systems added or removed)."""
+    return [pwsid for pwsid in old.keys() | new.keys() if old.get(pwsid) != new.get(pwsid)]
+
+
+def refresh_rollups(state: Dict[str, Any], changed_tables: List[str],
+                    stale: List[str]) -> Optional[sdwis_rollups.Rollups]:
+    """
+    Rollups for the new state: rebuilt in full on the first load (or when a
+    source table appeared or went away), updated for the `stale` systems
+    otherwise.
+    """
+    frames, indexes = state["dataframes"], state["pwsid_index"]
+    if 'SDWA_PUB_WATER_SYSTEMS' not in frames:
+        return None
+    touched = [name for name in sdwis_rollups.SOURCE_TABLES if name in changed_tables]
+    if rollups is not None and not touched:
+        return rollups
+    if rollups is None or any((name in frames) != (name in dataframes) for name in sdwis_rollups.SOURCE_TABLES):
+        refreshed = sdwis_rollups.Rollups.build(frames, indexes)
+    else:
+        refreshed = rollups.updated(frames, indexes, stale)
+    print(f"Rollups refreshed: {refreshed.stats}")
+    return refreshed
+
+
+def load_all_data() -> Dict[str, Any]:
+    """
+    Loads the CSVs in DATA_DIR on startup and reloads them when a new export
+    lands. Only tables whose CSV changed are re-read and re-indexed. The new
+    state is built off to the side while requests keep using the old one,
+    then every data global is swapped in with a single update. Summaries of
+    systems whose rows changed are invalidated. Returns what changed.
+    """
+    with reload_lock:
+        if not os.path.isdir(table_dir()):
+            print(f"Error: Data directory '{table_dir()}' not found. Please create it and add your CSV files.")
+            return {}
+        print(f"Loading SDWIS data from '{table_dir()}' directory...")
+        started = time.perf_counter()
+        rss_before = current_rss_mb()
+        tables = read_changed_tables()
+        result = {"changed_tables": tables["changed"], "removed_tables": tables["removed"], "stale_summaries": 0}
+        if failed_tables:
+            result["failed_tables"] = sorted(failed_tables)
+        result["static_files"] = build_static_files()
+        if SHARD_DIR:
+            result["reloaded_states"] = refresh_shards()
+            tables["directory_states"] = result["directory_states"] = shard_store.refresh_directory()
+            if tables["directory_states"]:
+                print(f"Directory tables read for {len(tables['directory_states'])} states.")
+        if not tables["changed"] and not tables["removed"] and not tables.get("directory_states"):
+            print("No table changed; keeping the loaded data.")
+            return result
+        print(f"Read {len(tables['changed'])} changed tables "
+              f"({tables['sources']['snapshot']} from snapshot, {tables['sources']['csv']} parsed from CSV), "
+              f"kept {len(tables['frames']) - len(tables['changed'])}, removed {len(tables['removed'])} "
+              f"in {time.perf_counter() - started:.2f}s, RSS +{current_rss_mb() - rss_before:.0f} MiB "
+              f"({current_rss_mb():.0f} MiB total).")
+
+        state = build_data_state(tables)
+        stale = stale_pwsids(pwsid_fingerprints, state["pwsid_fingerprints"]) if dataframes else []
+        state["rollups"] = refresh_rollups(state, tables["changed"] + tables["removed"], stale)
+        # One dict update under the GIL: requests see either the old globals or the new ones.
+        previous = {name: globals()[name] for name in state}
+        globals().update(state)
+        del previous
+
+        if stale and summary_store is not None:
+            result["stale_summaries"] = summary_store.delete_many(stale)
+        frame_bytes = sum(int(df.memory_usage(deep=True).sum()) for df in dataframes.values())
+        data_load_seconds.set(time.perf_counter() - started)
+        print(f"Data loaded in {time.perf_counter() - started:.2f}s: {len(dataframes)} tables, "
+              f"{frame_bytes / 2**20:.0f} MiB in memory, "
+              f"{sum(len(table.column_names) for table in deferred_columns.values())} deferred columns "
+              f"({sum(table.nbytes for table in deferred_columns.values()) / 2**20:.0f} MiB) memory-mapped; "
+              f"{len(stale)} systems changed, {result['stale_summaries']} cached summaries invalidated.")
+        return result
+
+
+def build_static_files() -> Dict[str, Any]:
+    """Precompresses new versions of the files served under /data (unchanged files are only stat'ed)."""
     if not os.path.isdir(DATA_DIR):
-        print(f"Error: Data directory '{DATA_DIR}' not found. Please create it and add your CSV files.")
-        return
+        return {}
+    stats = static_files.build()
+    if stats["variants_written"]:
+        print(f"Precompressed {stats['variants_written']} static variants in {stats['build_seconds']:.2f}s: "
+              f"{stats['bytes'] / 2**20:.1f} MiB -> "
+              + ", ".join(f"{encoding} {size / 2**20:.1f} MiB" for encoding, size in stats["compressed_bytes"].items())
+              + ".")
+    return stats
+
+
+def refresh_shards() -> List[str]:
+    """
+    Sets up the shard store on the first load; afterwards forgets the states
+    whose CSVs changed, so they reload (and their summaries are re-checked)
+    on next access.
+    """
+    global shard_store
+    if shard_store is None:
+        shard_store = sdwis_shards.ShardStore(SHARD_DIR, os.path.join(SNAPSHOT_DIR, "shards"), prepare_table,
+                                              int(SHARD_MEMORY_BUDGET_MB * 2**20), arrow_backed=SHARED_TABLES)
+        print(f"Sharded mode: {len(shard_store.states())} states under '{SHARD_DIR}', loaded on first access "
+              f"within {SHARD_MEMORY_BUDGET_MB:.0f} MiB.")
+        return []
+    stale = shard_store.refresh()
+    if stale:
+        print(f"States changed since they were loaded: {', '.join(stale)}.")
+    return stale
+
+
+def sync_regulator_db() -> List[str]:
+    """
+    Materializes the loaded tables whose version changed into the regulator
+    database. Runs after a (re)load, off the request path. With several
+    workers, the first to get the file lock rebuilds and the rest find the
+    tables current.
+    """
+    global regulator
+    with regulator_lock, snapshot.file_lock(f"{REGULATOR_DB}.lock"):
+        with reload_lock:
+            frames, deferred, versions = dataframes, deferred_columns, table_versions
+        if regulator is None:
+            os.makedirs(os.path.dirname(REGULATOR_DB), exist_ok=True)
+            regulator = regulator_db.RegulatorDB(REGULATOR_DB)
+        return regulator.sync(frames, deferred, versions)
+
+
+async def sync_regulator_in_background():
+    try:
+        rebuilt = await run_in_threadpool(sync_regulator_db)
+        print(f"Regulator DB up to date ({len(rebuilt)} tables rebuilt).")
+    except Exception as e:
+        print(f"Error syncing the regulator DB: {e}")
+
 
-    for filename in os.listdir(DATA_DIR):
-        if filename.endswith(".csv"):
-            file_key = os.path.splitext(filename)[0]
-            file_path = os.path.join(DATA_DIR, filename)
-            try:
-                df = pd.read_csv(file_path, low_memory=False)
-                if 'SUBMISSIONYEARQUARTER' in df.columns:
-                    # Ensure quarter column is numeric for sorting
-                    df['sortable_quarter'] = pd.to_numeric(df['SUBMISSIONYEARQUARTER'].str.replace('Q', ''),
-                                                           errors='coerce')
-                    df.dropna(subset=['sortable_quarter'], inplace=True)  # Drop rows where conversion failed
-                    df['sortable_quarter'] = df['sortable_quarter'].astype(int)
-                dataframes[file_key] = df
-            except Exception as e:
-                print(f"Error loading {filename}: {e}")
-    print(f"Data loading complete. Loaded {len(dataframes)} files.")
+async def reload_in_background(trigger: str):
+    """Runs load_all_data in the thread pool, then syncs the regulator DB, and records the outcome in reload_status."""
+    reload_status.update(running=True, trigger=trigger, started_at=time.time())
+    try:
+        result = await run_in_threadpool(load_all_data)
+        reload_status.update(last_result=result, last_error=None, reloads=reload_status["reloads"] + 1)
+        await sync_regulator_in_background()
+    except Exception as e:
+        print(f"Error reloading data: {e}")
+        reload_status.update(last_error=str(e))
+    finally:
+        reload_status.update(running=False, finished_at=time.time())
+
+
+def data_files_changed() -> bool:
+    """Whether any loaded CSV (or loaded state's CSV) was added, removed or modified since it was loaded."""
+    if not os.path.isdir(table_dir()):
+        return False
+    if shard_store is not None and (shard_store.stale_states() or shard_store.directory_changed()):
+        return True
+    files = {os.path.splitext(filename)[0]: os.path.join(table_dir(), filename)
+             for filename in os.listdir(table_dir()) if filename.endswith(".csv")}
+    # A CSV that failed to load counts as changed only once the file changes again.
+    failed = {name for name, path in files.items() if failed_tables.get(name) == file_stat(path)}
+    if files.keys() - failed != table_versions.keys() - failed:
+        return True
+    return not all(snapshot.is_current(SNAPSHOT_DIR, name, path, table_versions[name])
+                   for name, path in files.items() if name not in failed)
+
+
+async def watch_data_dir():
+    """Polls the data directory every DATA_WATCH_SECONDS and reloads when a CSV changed."""
+    while True:
+        await asyncio.sleep(DATA_WATCH_SECONDS)
+        try:
+            changed = not reload_status["running"] and await run_in_threadpool(data_files_changed)
+        except OSError as e:
+            print(f"Warning: could not check '{table_dir()}' for changes: {e}")
+            continue
+        if changed:
+            print(f"Change detected in '{SHARD_DIR or DATA_DIR}'; reloading.")
+            await reload_in_background("watcher")
 
 
 # --- FASTAPI LIFESPAN MANAGER ---
@@ -79,62 +557,148 @@ async def lifespan(app: FastAPI):
     # On application startup
     print("Application startup...")
     load_all_data()
-    load_cache_from_file()
+    open_summary_store()
+    asyncio.create_task(sync_regulator_in_background())
+    watcher = asyncio.create_task(watch_data_dir()) if DATA_WATCH_SECONDS else None
     yield
     # On application shutdown
+    if watcher is not None:
+        watcher.cancel()
     print("Application shutdown.")
 
 
 app = FastAPI(lifespan=lifespan)
+# Strong ETags (data version + body hash), 304s and compression for JSON responses; streams pass through.
+app.add_middleware(http_cache.HTTPCacheMiddleware, version=lambda: data_version)
+# Server-Timing headers with the summary pipeline stages, and per-route latency histograms.
+app.add_middleware(metrics.RequestMetricsMiddleware, histogram=http_request_seconds)
 
 # --- Mount the data directory to be served publicly ---
-app.mount("/data", StaticFiles(directory=DATA_DIR), name="data")
+# Precompressed variants with content-hash ETags; `?v=<version>` URLs from /api/datasets are cached for good.
+static_files = http_cache.PrecompressedStaticFiles(directory=DATA_DIR, cache_dir=STATIC_CACHE_DIR)
+app.mount("/data", static_files, name="data")
 
 
 # --- DATA PROCESSING & LLM FUNCTIONS ---
 
-def get_data_for_pwsid(pwsid: str) -> Dict[str, Any]:
+def tables_for(pwsid: str) -> sdwis_shards.Shard:
     """
-    Filters data for a given PWSID, applying separate sampling rules for
-    pre-2020 and post-2020 records before combining them.
+    The loaded tables holding a PWSID: its state's shard (loaded on first
+    access) in sharded mode, the global tables otherwise. Loading a shard
+    blocks, so async code calls this from the thread pool. Call it once per
+    request and pass the result down: a reload swaps the globals, and rows
+    from two calls could belong to different loads.
     """
-    pws_data = {}
-    for name, df in dataframes.items():
-        if 'PWSID' in df.columns and 'sortable_quarter' in df.columns:
-            # Filter all data for the specific PWSID first
-            df_pws = df[df['PWSID'] == pwsid]
+    if shard_store is not None:
+        return shard_store.get(sdwis_shards.state_of(pwsid))
+    return sdwis_shards.Shard("", dataframes, deferred_columns, pwsid_index, event_keys, pwsid_fingerprints)
+
 
-            if df_pws.empty:
-                continue
+def all_systems() -> Optional[pd.DataFrame]:
+    """Every system's SDWA_PUB_WATER_SYSTEMS row: across all states' directory tables in sharded mode."""
+    if shard_store is not None:
+        return shard_store.directory()[0].get('SDWA_PUB_WATER_SYSTEMS')
+    return dataframes.get('SDWA_PUB_WATER_SYSTEMS')
 
-            # Split data into pre-2020 and post-2020 periods
-            pre_2020_df = df_pws[df_pws['sortable_quarter'] < 20201]
-            post_2020_df = df_pws[df_pws['sortable_quarter'] >= 20201]
 
-            # Sample pre-2020 data if it exceeds the max limit
-            if len(pre_2020_df) > 50:
-                pre_2020_df = pre_2020_df.sample(n=50, random_state=42)  # random_state for reproducible samples
+def system_fingerprint(pwsid: str) -> Optional[str]:
+    """Content fingerprint of a system's rows (None for an unknown PWSID)."""
+    if shard_store is not None:
+        return shard_store.fingerprint(pwsid)
+    return pwsid_fingerprints.get(pwsid)
 
-            # Sample post-2020 data if it exceeds the max limit
-            if len(post_2020_df) > 300:
-                post_2020_df = post_2020_df.sample(n=300, random_state=42)
 
-            # Combine the sampled dataframes
-            combined_df = pd.concat([pre_2020_df, post_2020_df])
+def sample_event_windows(tables: sdwis_shards.Shard, name: str, pwsid: str) -> pd.DataFrame:
+    """
+    A system's records from one table, sampled by event date: every record
+    from the last SAMPLE_RECENT_YEARS (the latest SAMPLE_RECENT_RECORDS of
+    them) plus SAMPLE_OLDER_RECORDS spread evenly over everything older, in
+    date order. Both windows are binary searches over the event-date index.
+    Tables without an event date keep their first SAMPLE_RECENT_RECORDS rows.
+    """
+    df, index = tables.dataframes[name], tables.pwsid_index[name]
+    if name not in tables.event_keys:
+        return sdwis_index.slice_partition(df, index, pwsid).head(SAMPLE_RECENT_RECORDS)
+    bounds = index.get(pwsid)
+    if bounds is None:
+        return df.iloc[0:0]
+    cutoff = pd.Timestamp.now().normalize() - pd.DateOffset(years=SAMPLE_RECENT_YEARS)
+    keys = tables.event_keys[name]
+    older_lo, older_hi = sdwis_index.window_bounds(keys, bounds, end=cutoff - pd.Timedelta(1))
+    recent_lo, recent_hi = sdwis_index.window_bounds(keys, bounds, start=cutoff)
+    older = np.unique(np.linspace(older_lo, older_hi - 1, min(SAMPLE_OLDER_RECORDS, older_hi - older_lo)).astype(int))
+    recent = np.arange(max(recent_lo, recent_hi - SAMPLE_RECENT_RECORDS), recent_hi)
+    return df.iloc[np.concatenate((older, recent))]
 
-            # Sort the final combined dataframe to preserve chronological order
-            if not combined_df.empty:
-                combined_df = combined_df.sort_values('sortable_quarter', ascending=True)
-                clean_name = name.replace("SDWA_", "").replace("_", " ").title()
-                pws_data[clean_name] = combined_df.to_dict(orient='records')
 
+def get_data_for_pwsid(pwsid: str) -> Dict[str, Any]:
+    """Raw records for a PWSID from every PWSID-keyed table, sampled by event-date window."""
+    pws_data = {}
+    tables = tables_for(pwsid)
+    for name in tables.pwsid_index:
+        sampled = sample_event_windows(tables, name, pwsid)
+        if not sampled.empty:
+            clean_name = name.replace("SDWA_", "").replace("_", " ").title()
+            pws_data[clean_name] = sampled.to_dict(orient='records')
     return pws_data
 
 
-def generate_summary_with_haiku(pwsid: str, data: Dict[str, Any]) -> str:
+def get_summary_frames(pwsid: str) -> Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
+    """
+    Every row (deferred columns included) for a PWSID from each PWSID-keyed
+    table that has any, and the PROMPT_LATEST_RECORDS of them the digest lists.
     """
-    Generates a summary using a detailed prompt that instructs the model
-    to avoid preambles and understand the data sampling.
+    frames, latest = {}, {}
+    tables = tables_for(pwsid)
+    for name, index in tables.pwsid_index.items():
+        df_pws = sdwis_index.slice_partition(tables.dataframes[name], index, pwsid)
+        if not df_pws.empty:
+            frames[name] = with_deferred_columns(tables, name, pwsid, df_pws)
+            latest[name] = latest_records(tables, name, pwsid, frames[name], PROMPT_LATEST_RECORDS)
+    return frames, latest
+
+
+def latest_records(tables: sdwis_shards.Shard, name: str, pwsid: str, df_pws: pd.DataFrame, n: int) -> pd.DataFrame:
+    """
+    The `n` most recent of a system's rows `df_pws` (its whole partition),
+    newest first and undated ones after them. Event tables are stored in
+    date order within each system, so this is a reversed slice, not a sort.
+    Other tables keep their first `n` rows.
+    """
+    if name not in tables.event_keys:
+        return df_pws.head(n)
+    bounds = tables.pwsid_index[name][pwsid]
+    dated = sdwis_index.dated_stop(tables.event_keys[name], bounds) - bounds[0]
+    newest = np.arange(dated - 1, max(dated - n, 0) - 1, -1)
+    undated = np.arange(dated, min(len(df_pws), dated + n - len(newest)))
+    return df_pws.iloc[np.concatenate((newest, undated))]
+
+
+def with_deferred_columns(tables: sdwis_shards.Shard, name: str, pwsid: str, df_pws: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds a table's deferred columns to (a subset of) its rows for one PWSID.
+    They are read from the memory-mapped snapshot over the system's row range
+    and matched to the frame by row position.
+    """
+    table = tables.deferred_columns.get(name)
+    if table is None or df_pws.empty:
+        return df_pws
+    start, stop = tables.pwsid_index[name][pwsid]
+    deferred = table.slice(start, stop - start).to_pandas()
+    deferred.index = pd.RangeIndex(start, stop)
+    return df_pws.join(deferred)
+
+
+def build_summary_digest(frames: Dict[str, pd.DataFrame], latest: Dict[str, pd.DataFrame]) -> str:
+    """Per-table digests of a system's rows: counts and date ranges over every record, the latest ones listed."""
+    return prompt_builder.build_data_digest(frames, latest, code_decoder, PROMPT_TABLE_CHAR_BUDGET,
+                                            PROMPT_LATEST_RECORDS)
+
+
+def build_summary_prompt(pwsid: str, digest: str) -> str:
+    """
+    Builds a detailed prompt that instructs the model to avoid preambles and
+    explains the compact per-table digests it is given instead of raw rows.
     """
     prompt = f"""
     You are a helpful assistant specializing in water quality reports. Your task is to provide a clear, concise summary for a citizen regarding the water quality history for the public water system with ID {pwsid}.
@@ -143,21 +707,327 @@ def generate_summary_with_haiku(pwsid: str, data: Dict[str, Any]) -> str:
     - Write in a clear and reassuring tone. If there are significant issues (like multiple violations), mention them calmly and factually.
     - The summary should be 1-3 paragraphs long.
     - **Do not use a preamble or any introductory phrases.** Begin the summary directly. For example, instead of saying "Based on the data provided...", start with something like "The water quality for this system has been generally satisfactory..." or "Records for this water system show a few violations over the past several years...".
-    - The data provided contains a sample of up to 100 records from before 2020 and up to 500 recent records from 2020 onwards. Your summary should synthesize findings from both periods if data is available for both.
+    - The data is a digest of each table for this system. Record counts, date ranges and code counts cover every record; only the most recent records are listed individually. Codes are followed by their descriptions in parentheses.
 
     Use the following data to generate your summary:
-    {str(data)}
+    {digest}
+    """
+    record_prompt_size(pwsid, prompt, digest)
+    return prompt
+
+
+def record_prompt_size(pwsid: str, prompt: str, digest: str):
+    """Logs the prompt size and how the data digest compares with the legacy raw-rows dump."""
+    prompt_size_stats["prompts"] += 1
+    prompt_size_stats["compact_chars"] += len(digest)
+    prompt_bytes.observe(len(prompt.encode()))
+    if not PROMPT_SIZE_AUDIT or prompt_size_stats["prompts"] % PROMPT_SIZE_AUDIT:
+        print(f"Prompt for {pwsid}: {len(prompt)} chars")
+        return
+    raw_chars = len(str(get_data_for_pwsid(pwsid)))
+    prompt_size_stats["audited"] += 1
+    prompt_size_stats["audited_compact_chars"] += len(digest)
+    prompt_size_stats["raw_chars"] += raw_chars
+    print(f"Prompt for {pwsid}: {len(prompt)} chars; data {raw_chars} -> {len(digest)} chars "
+          f"({100 * (1 - len(digest) / max(raw_chars, 1)):.1f}% smaller)")
+
+
+async def generate_summary_with_haiku(prompt: str, on_text: Optional[Callable[[str], None]] = None) -> str:
     """
-    print(f"{len(prompt)=}")
+    Generates a summary with the async Anthropic client. At most
+    LLM_MAX_CONCURRENCY calls are outstanding at once; the rest queue here.
+    With `on_text`, the completion is streamed and each text delta is passed
+    to it as it arrives.
+    """
+    with metrics.stage(summary_stage_seconds, "llm_queue"):
+        await llm_semaphore.acquire()
     try:
-        message = client.messages.create(
-            model="claude-3-haiku-20240307",
+        with metrics.stage(summary_stage_seconds, "llm"), llm_calls_in_flight.track():
+            message = await call_llm(prompt, on_text)
+    except Exception as e:
+        llm_calls_total.inc(outcome="error")
+        raise HTTPException(status_code=500, detail=f"Error generating summary with Anthropic API: {e}")
+    finally:
+        llm_semaphore.release()
+    llm_calls_total.inc(outcome="ok")
+    llm_tokens_total.inc(message.usage.input_tokens, direction="input")
+    llm_tokens_total.inc(message.usage.output_tokens, direction="output")
+    return message.content[0].text
+
+
+async def call_llm(prompt: str, on_text: Optional[Callable[[str], None]]):
+    """One completion request; streamed to `on_text` when given. Returns the final message."""
+    if on_text is None:
+        return await client.messages.create(
+            model=LLM_MODEL,
             max_tokens=2048,
             messages=[{"role": "user", "content": prompt}]
         )
-        return message.content[0].text
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating summary with Anthropic API: {e}")
+    started = time.perf_counter()
+    first_text_seconds = None
+    async with client.messages.stream(
+        model=LLM_MODEL,
+        max_tokens=2048,
+        messages=[{"role": "user", "content": prompt}]
+    ) as stream:
+        async for text in stream.text_stream:
+            if first_text_seconds is None:
+                first_text_seconds = time.perf_counter() - started
+            on_text(text)
+        message = await stream.get_final_message()
+    print(f"Summary streamed: first text after {first_text_seconds or 0:.2f}s, "
+          f"complete after {time.perf_counter() - started:.2f}s.")
+    return message
+
+
+def store_summary(pwsid: str, summary: str, fingerprint: Optional[str]):
+    """Persists a generated summary with the data version, rows fingerprint and model that produced it."""
+    summary_store.put(pwsid, summary, data_version=data_version, model=LLM_MODEL, fingerprint=fingerprint)
+    print(f"New summary for {pwsid} generated and saved to cache.")
+
+
+async def generate_and_cache_summary(pwsid: str, on_text: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Runs the full cache-miss pipeline for one PWSID. The pandas work and the
+    cache write run in the thread pool so the event loop keeps serving
+    other requests while this one is in progress. `on_text` receives the
+    summary as it streams in.
+    """
+    with metrics.stage(summary_stage_seconds, "data_filter"):
+        # Taken before the rows are read, so a reload mid-generation leaves the summary marked stale.
+        fingerprint = await run_in_threadpool(system_fingerprint, pwsid)
+        frames, latest = await run_in_threadpool(get_summary_frames, pwsid)
+    if not frames:
+        raise HTTPException(status_code=404, detail=f"PWSID '{pwsid}' not found or has no data available.")
+
+    with metrics.stage(summary_stage_seconds, "sampling"):
+        digest = await run_in_threadpool(build_summary_digest, frames, latest)
+    with metrics.stage(summary_stage_seconds, "prompt_build"):
+        prompt = await run_in_threadpool(build_summary_prompt, pwsid, digest)
+    summary = await generate_summary_with_haiku(prompt, on_text)
+    with metrics.stage(summary_stage_seconds, "cache_write"):
+        await run_in_threadpool(store_summary, pwsid, summary, fingerprint)
+    return summary
+
+
+def cached_summary(pwsid: str) -> Optional[Dict[str, Any]]:
+    """
+    The stored summary for a PWSID, or None if there is none or the system's
+    rows changed since it was generated (summaries stored without a
+    fingerprint are kept).
+    """
+    cached = summary_store.get(pwsid)
+    if cached is None:
+        return None
+    if cached["fingerprint"] is not None and cached["fingerprint"] != system_fingerprint(pwsid):
+        return None
+    return cached
+
+
+class SummaryBroadcast:
+    """
+    The text of one in-flight generation, replayed to any number of
+    listeners: a listener that joins late first gets every chunk produced so
+    far, then each new chunk as it arrives.
+    """
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.finished = False
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, text: str):
+        self.chunks.append(text)
+        self._notify()
+
+    def finish(self):
+        self.finished = True
+        self._notify()
+
+    async def follow(self) -> AsyncIterator[str]:
+        sent = 0
+        while True:
+            while sent < len(self.chunks):
+                sent += 1
+                yield self.chunks[sent - 1]
+            if self.finished:
+                return
+            await self._changed.wait()
+
+
+def start_summary(pwsid: str) -> Tuple[asyncio.Task, SummaryBroadcast]:
+    """
+    Single-flight start of generate_and_cache_summary: the first miss for a
+    PWSID starts the generation, and every concurrent miss gets the same
+    task and broadcast of its streamed text.
+    """
+    task = inflight_summaries.get(pwsid)
+    summary_requests_total.inc(result="joined" if task is not None else "miss")
+    if task is None:
+        broadcast = SummaryBroadcast()
+        task = asyncio.create_task(generate_and_cache_summary(pwsid, broadcast.append))
+        inflight_summaries[pwsid] = task
+        inflight_streams[pwsid] = broadcast
+
+        def finished(_):
+            broadcast.finish()
+            inflight_summaries.pop(pwsid, None)
+            inflight_streams.pop(pwsid, None)
+
+        task.add_done_callback(finished)
+    return task, inflight_streams[pwsid]
+
+
+async def get_or_start_summary(pwsid: str) -> str:
+    """
+    Waits for the (possibly shared) generation of a PWSID's summary. The
+    task is shielded so one client disconnecting does not cancel the
+    generation the other waiters depend on.
+    """
+    task, _ = start_summary(pwsid)
+    return await asyncio.shield(task)
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """One Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def summary_events(pwsid: str, cached: Optional[Dict[str, Any]]) -> AsyncIterator[str]:
+    """
+    A summary as Server-Sent Events: `meta` (PWSID and source), `text` chunks
+    as they stream in, then `done` with the full summary, or `error`. A
+    cached summary is sent the same way, as a single chunk.
+    """
+    if cached is not None:
+        yield sse_event("meta", {"pwsid": pwsid, "source": "cache"})
+        yield sse_event("text", {"text": cached["summary"]})
+        yield sse_event("done", {"summary": cached["summary"]})
+        return
+    task, broadcast = start_summary(pwsid)
+    yield sse_event("meta", {"pwsid": pwsid, "source": "generated"})
+    async for text in broadcast.follow():
+        yield sse_event("text", {"text": text})
+    try:
+        summary = await asyncio.shield(task)
+    except HTTPException as e:
+        yield sse_event("error", {"status": e.status_code, "detail": e.detail})
+        return
+    yield sse_event("done", {"summary": summary})
+
+
+# --- DASHBOARD API HELPERS ---
+
+def to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """JSON-safe records (NaN -> null, numpy scalars -> Python, dates -> ISO strings)."""
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+
+def get_table_for_pwsid(tables: sdwis_shards.Shard, name: str, pwsid: str) -> pd.DataFrame:
+    """All rows of one table for a PWSID (empty if the table is not loaded)."""
+    if name not in tables.pwsid_index:
+        return pd.DataFrame()
+    return sdwis_index.slice_partition(tables.dataframes[name], tables.pwsid_index[name], pwsid)
+
+
+def parse_mdy(series: pd.Series) -> pd.Series:
+    """Date column as datetime64 (tables are loaded with dates already parsed)."""
+    if sdwis_schema.is_date(series):
+        return series
+    return pd.to_datetime(series, format=sdwis_schema.DATE_FORMAT, errors='coerce')
+
+
+def violation_timeline(tables: sdwis_shards.Shard, pwsid: str) -> List[Dict[str, Any]]:
+    """Violations for the dashboard Gantt chart, decoded and with resolved start/finish dates."""
+    violations = get_table_for_pwsid(tables, 'SDWA_VIOLATIONS_ENFORCEMENT', pwsid)
+    if violations.empty:
+        return []
+    start = parse_mdy(violations['NON_COMPL_PER_BEGIN_DATE'])
+    finish = parse_mdy(violations['CALCULATED_RTC_DATE']).fillna(parse_mdy(violations['NON_COMPL_PER_END_DATE']))
+    finish = finish.fillna(pd.Timestamp.now().normalize())
+    timeline = pd.DataFrame({
+        'violation_id': violations['VIOLATION_ID'],
+        'contaminant': code_decoder.decode(violations['CONTAMINANT_CODE']),
+        'violation': code_decoder.decode(violations['VIOLATION_CODE']),
+        'start': start.dt.strftime('%Y-%m-%d'),
+        'finish': finish.dt.strftime('%Y-%m-%d'),
+        'health_based': violations['IS_HEALTH_BASED_IND'] == 'Y',
+        'status': violations['VIOLATION_STATUS'],
+        'measure': violations['VIOL_MEASURE'],
+        'limit': violations['FEDERAL_MCL'],
+        'unit': violations['UNIT_OF_MEASURE'],
+    })
+    return to_records(timeline[start.notna() & (start <= finish)])
+
+
+def recent_site_visits(tables: sdwis_shards.Shard, pwsid: str, limit: int = 20) -> List[Dict[str, Any]]:
+    visits = get_table_for_pwsid(tables, 'SDWA_SITE_VISITS', pwsid)
+    if visits.empty:
+        return []
+    visits = visits.assign(_date=parse_mdy(visits['VISIT_DATE'])).sort_values('_date', ascending=False).head(limit)
+    visits = with_deferred_columns(tables, 'SDWA_SITE_VISITS', pwsid, visits)
+    return to_records(pd.DataFrame({
+        'visit_date': visits['_date'].dt.strftime('%Y-%m-%d'),
+        'reason': code_decoder.decode(visits['VISIT_REASON_CODE']),
+        'agency': code_decoder.decode(visits['AGENCY_TYPE_CODE']),
+        'comments': visits['VISIT_COMMENTS'],
+    }))
+
+
+def source_facilities(tables: sdwis_shards.Shard, pwsid: str) -> List[Dict[str, Any]]:
+    facilities = get_table_for_pwsid(tables, 'SDWA_FACILITIES', pwsid)
+    if facilities.empty:
+        return []
+    facilities = facilities[facilities['IS_SOURCE_IND'] == 'Y']
+    return to_records(pd.DataFrame({
+        'name': facilities['FACILITY_NAME'],
+        'type': code_decoder.decode(facilities['FACILITY_TYPE_CODE']),
+        'water_type': code_decoder.decode(facilities['WATER_TYPE_CODE']),
+        'availability': code_decoder.decode(facilities['AVAILABILITY_CODE']),
+    }))
+
+
+# What each event table contributes to a system timeline: its kind and the code columns describing an event.
+TIMELINE_FIELDS: Dict[str, Tuple[str, List[str]]] = {
+    'SDWA_VIOLATIONS_ENFORCEMENT': ('violation', ['VIOLATION_CODE', 'CONTAMINANT_CODE']),
+    'SDWA_PN_VIOLATION_ASSOC': ('public_notice', ['VIOLATION_CODE', 'CONTAMINANT_CODE']),
+    'SDWA_LCR_SAMPLES': ('lead_copper_sample', ['CONTAMINANT_CODE']),
+    'SDWA_SITE_VISITS': ('site_visit', ['VISIT_REASON_CODE']),
+    'SDWA_EVENTS_MILESTONES': ('milestone', ['EVENT_MILESTONE_CODE', 'EVENT_REASON_CODE']),
+}
+
+
+def system_timeline(tables: sdwis_shards.Shard, pwsid: str, start: Optional[pd.Timestamp],
+                    end: Optional[pd.Timestamp]) -> pd.DataFrame:
+    """
+    Dated events of every kind for a system between `start` and `end`
+    (inclusive, either open), oldest first. Each table contributes one
+    binary-searched window of its date-sorted rows.
+    """
+    events = []
+    for name, (kind, code_columns) in TIMELINE_FIELDS.items():
+        if name not in tables.event_keys:
+            continue
+        rows = sdwis_index.slice_window(tables.dataframes[name], tables.pwsid_index[name], tables.event_keys[name],
+                                        pwsid, start, end)
+        if rows.empty:
+            continue
+        decoded = [code_decoder.decode(rows[column]) for column in code_columns if column in rows.columns]
+        description = [' - '.join(part for part in parts if isinstance(part, str)) for parts in zip(*decoded)]
+        dates = rows[sdwis_index.EVENT_DATE_COLUMNS[name]]
+        events.append(pd.DataFrame({'date': dates, 'kind': kind, 'description': description})[dates.notna()])
+    if not events:
+        return pd.DataFrame(columns=['date', 'kind', 'description'])
+    return pd.concat(events, ignore_index=True).sort_values('date', kind='mergesort')
+
+
+def violation_counts(index: sdwis_index.PartitionIndex) -> pd.Series:
+    """Violation count per PWSID, read straight off the violations partition index."""
+    return pd.Series({pwsid: stop - start for pwsid, (start, stop) in index.items()}, dtype='int64')
 
 
 # --- API ENDPOINTS ---
@@ -173,26 +1043,258 @@ async def root():
 @app.get("/water_quality/{pwsid}")
 async def get_water_quality_summary(pwsid: str):
     pwsid = pwsid.upper()  # Standardize PWSID
-    if pwsid in pws_cache:
-        return {"pwsid": pwsid, "summary": pws_cache[pwsid], "source": "cache"}
+    with metrics.stage(summary_stage_seconds, "cache_read"):
+        cached = await run_in_threadpool(cached_summary, pwsid)
+    if cached is not None:
+        summary_requests_total.inc(result="hit")
+        return {"pwsid": pwsid, "summary": cached["summary"], "source": "cache"}
+
+    summary = await get_or_start_summary(pwsid)
+    return {"pwsid": pwsid, "summary": summary, "source": "generated"}
 
-    data = get_data_for_pwsid(pwsid)
-    if not data:
+
+@app.get("/water_quality/{pwsid}/stream")
+async def stream_water_quality_summary(pwsid: str):
+    """
+    The same summary as /water_quality/{pwsid}, as a Server-Sent Events
+    stream that delivers a generated summary while the LLM writes it.
+    """
+    pwsid = pwsid.upper()
+    with metrics.stage(summary_stage_seconds, "cache_read"):
+        cached = await run_in_threadpool(cached_summary, pwsid)
+    if cached is None and await run_in_threadpool(system_fingerprint, pwsid) is None:
         raise HTTPException(status_code=404, detail=f"PWSID '{pwsid}' not found or has no data available.")
+    if cached is not None:
+        summary_requests_total.inc(result="hit")
+    return StreamingResponse(summary_events(pwsid, cached), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-    summary = generate_summary_with_haiku(pwsid, data)
 
-    with cache_lock:
-        pws_cache[pwsid] = summary
-        save_cache_to_file()
-        print(f"New summary for {pwsid} generated and saved to cache.")
+@app.get("/api/search")
+def search_systems(q: str = "", limit: int = search_index.DEFAULT_LIMIT):
+    """Typeahead for the system picker: active systems matching every word of `q` as a prefix."""
+    if system_search is None:
+        raise HTTPException(status_code=503, detail="Search index is not available.")
+    limit = max(1, min(limit, search_index.MAX_LIMIT))
+    return {"query": q, "results": system_search.search(q, limit=limit, active_only=True)}
 
-    return {"pwsid": pwsid, "summary": summary, "source": "generated"}
+
+@app.get("/api/systems/{pwsid}")
+def get_system_dashboard(pwsid: str):
+    """Everything the dashboard view renders for one system, in one small payload."""
+    pwsid = pwsid.upper()
+    # One snapshot of the tables for the whole request, so a reload cannot mix two generations of rows.
+    tables = tables_for(pwsid)
+    system = get_table_for_pwsid(tables, 'SDWA_PUB_WATER_SYSTEMS', pwsid)
+    if system.empty:
+        raise HTTPException(status_code=404, detail=f"PWSID '{pwsid}' not found.")
+    info = system.iloc[0]
+    return {
+        "pwsid": pwsid,
+        "name": info['PWS_NAME'],
+        "city": None if pd.isna(info['CITY_NAME']) else info['CITY_NAME'],
+        "violations": violation_timeline(tables, pwsid),
+        "site_visits": recent_site_visits(tables, pwsid),
+        "facilities": source_facilities(tables, pwsid),
+    }
+
+
+@app.get("/api/systems/{pwsid}/timeline")
+def get_system_timeline(pwsid: str, start: Optional[str] = Query(None, alias="from"),
+                        end: Optional[str] = Query(None, alias="to")):
+    """
+    Violations, public notices, lead/copper samples, site visits and
+    milestones for one system, oldest first, optionally limited to the dates
+    `from` through `to` (YYYY-MM-DD, inclusive).
+    """
+    pwsid = pwsid.upper()
+    tables = tables_for(pwsid)
+    if get_table_for_pwsid(tables, 'SDWA_PUB_WATER_SYSTEMS', pwsid).empty:
+        raise HTTPException(status_code=404, detail=f"PWSID '{pwsid}' not found.")
+    try:
+        start_date = pd.Timestamp(start) if start else None
+        end_date = pd.Timestamp(end) if end else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {e}")
+    events = system_timeline(tables, pwsid, start_date, end_date)
+    return {"pwsid": pwsid, "from": start, "to": end, "total": len(events),
+            "counts": events['kind'].value_counts().to_dict(),
+            "events": to_records(events.tail(TIMELINE_MAX_EVENTS).assign(date=events['date'].dt.strftime('%Y-%m-%d')))}
+
+
+@app.get("/api/map")
+def get_map(bbox: Optional[str] = None, zoom: int = Query(7, ge=0, le=spatial.MAX_ZOOM)):
+    """
+    Systems visible in a map viewport. `bbox` is 'west,south,east,north'
+    (Leaflet's toBBoxString); without it the whole layer is returned. Busy
+    viewports below CLUSTER_MAX_ZOOM come back as clusters.
+    """
+    if map_grid is None:
+        raise HTTPException(status_code=503, detail="Map layer is not available.")
+    try:
+        bounds = spatial.parse_bbox(bbox) if bbox else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bbox '{bbox}': {e}")
+    visible = map_grid.within(bounds)
+    clusters = visible.iloc[0:0]
+    if spatial.should_cluster(zoom, len(visible)):
+        visible, clusters = spatial.cluster_points(visible, zoom)
+    return {"zoom": zoom, "thresholds": map_thresholds,
+            "points": to_records(visible), "clusters": to_records(clusters)}
+
+
+@app.get("/api/zip/{zip_code}")
+async def get_zip_location(zip_code: str):
+    coords = zip_coords.get(zip_code.zfill(5))
+    if coords is None:
+        raise HTTPException(status_code=404, detail=f"Location data for ZIP code {zip_code} could not be found.")
+    return {"zip": zip_code, "lat": coords[0], "lon": coords[1]}
+
+
+@app.get("/api/lookup")
+async def lookup_water_supplier(zip: Optional[str] = None, city: Optional[str] = None,
+                                county: Optional[str] = None, k: int = service_areas.DEFAULT_NEAREST):
+    """
+    Which systems serve a ZIP code, city or county. A ZIP with no listed
+    service area falls back to the `k` nearest active systems.
+    """
+    if service_area_index is None:
+        raise HTTPException(status_code=503, detail="Service area index is not available.")
+    if zip:
+        result = service_area_index.lookup_zip(zip, k=max(1, min(k, 50)))
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"Location data for ZIP code {zip} could not be found.")
+        return result
+    if city or county:
+        return {"city": city, "county": county, "method": "index",
+                "systems": service_area_index.lookup_place(city=city, county=county)}
+    raise HTTPException(status_code=400, detail="Provide one of zip, city or county.")
+
+
+@app.get("/api/rollups")
+def get_rollups(dimension: Optional[str] = None):
+    """
+    Statewide metrics for active systems, plus the same metrics per county,
+    system type, source water and owner type (or just `dimension`).
+    Precomputed at ingest.
+    """
+    if rollups is None:
+        detail = "Rollups are not available in sharded mode." if shard_store is not None else \
+            "Rollups are not available."
+        raise HTTPException(status_code=503, detail=detail)
+    if dimension is not None and dimension not in sdwis_rollups.DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"dimension must be one of {', '.join(sdwis_rollups.DIMENSIONS)}.")
+    dimensions = [dimension] if dimension else list(sdwis_rollups.DIMENSIONS)
+    return {"data_version": data_version, "state": rollups.totals(),
+            "dimensions": {name: rollups.records(name, code_decoder) for name in dimensions}}
+
+
+@app.get("/api/datasets")
+def list_datasets():
+    """The downloadable files under /data, with content-versioned URLs and their compressed sizes."""
+    return {"data_version": data_version, "encodings": list(http_cache.ENCODINGS),
+            "files": static_files.versioned_urls("/data")}
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus text exposition of the request, summary pipeline, LLM and data-load metrics."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/debug/shards")
+def shard_stats():
+    """Shard hits, misses, loads (with load times), evictions and the resident states, in sharded mode."""
+    if shard_store is None:
+        raise HTTPException(status_code=404, detail="Not running in sharded mode (SHARD_DIR is unset).")
+    return shard_store.report()
+
+
+@app.get("/debug/memory")
+def memory_usage():
+    """
+    Deep in-memory size of every loaded table, per column with its dtype, plus
+    the deferred columns that stay memory-mapped (paged in only when read).
+    """
+    tables = {name: sdwis_schema.memory_report(df) for name, df in sorted(dataframes.items())}
+    deferred = {name: {"columns": table.column_names, "mapped_bytes": table.nbytes}
+                for name, table in sorted(deferred_columns.items())}
+    return {"rss_mb": round(current_rss_mb(), 1), "process_mb": process_memory_mb(), "pid": os.getpid(),
+            "shared_tables": SHARED_TABLES,
+            "in_memory_bytes": sum(report["bytes"] for report in tables.values()),
+            "mapped_bytes": sum(table["mapped_bytes"] for table in deferred.values()),
+            "tables": tables, "deferred": deferred}
+
+
+def regulator_filters(county: Optional[str] = None, city: Optional[str] = None, system_type: Optional[str] = None,
+                      active_only: bool = True, min_population: Optional[int] = None,
+                      open_health_violations: bool = False, violation_since: Optional[str] = None,
+                      contaminant_code: Optional[str] = None, significant_deficiency: bool = False,
+                      source_water_type: Optional[str] = None) -> Dict[str, Any]:
+    """Query parameters shared by the regulator endpoints (see regulator_db.system_filters)."""
+    if violation_since:
+        try:
+            violation_since = pd.Timestamp(violation_since).strftime('%Y-%m-%d')
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid violation_since: {e}")
+    if regulator is None or not regulator.has_table('SDWA_PUB_WATER_SYSTEMS'):
+        detail = "The regulator database is not available in sharded mode." if shard_store is not None else \
+            "Regulator database is not available yet."
+        raise HTTPException(status_code=503, detail=detail)
+    return {"county": county, "city": city, "system_type": system_type, "active_only": active_only,
+            "min_population": min_population, "open_health_violations": open_health_violations,
+            "violation_since": violation_since, "contaminant_code": contaminant_code,
+            "significant_deficiency": significant_deficiency, "source_water_type": source_water_type}
+
+
+@app.get("/api/regulator/systems")
+def query_regulator_systems(after: Optional[str] = None, limit: int = regulator_db.DEFAULT_PAGE_SIZE,
+                            filters: Dict[str, Any] = Depends(regulator_filters)):
+    """
+    Systems matching regulator filters, e.g. `county=Fulton&open_health_violations=true&significant_deficiency=true`,
+    one page at a time in PWSID order. Pass the returned `next_after` as `after` for the next page.
+    """
+    limit = max(1, min(limit, regulator_db.MAX_PAGE_SIZE))
+    systems = regulator.systems(after=after.upper() if after else None, limit=limit, **filters)
+    return {"filters": {key: value for key, value in filters.items() if value not in (None, False)},
+            "systems": systems, "next_after": systems[-1]["pwsid"] if len(systems) == limit else None}
+
+
+@app.get("/api/regulator/systems/export")
+def export_regulator_systems(filters: Dict[str, Any] = Depends(regulator_filters)):
+    """Every system matching the filters (up to REGULATOR_EXPORT_MAX_ROWS), streamed as NDJSON."""
+    rows = regulator.iter_systems(limit=REGULATOR_EXPORT_MAX_ROWS, **filters)
+    return StreamingResponse((json.dumps(row) + "\n" for row in rows), media_type="application/x-ndjson")
+
+
+@app.post("/admin/reload", status_code=202)
+async def reload_data(x_admin_token: Optional[str] = Header(None)):
+    """
+    Starts a background reload of the tables whose CSVs changed. Requests
+    keep being served from the loaded data until the new data is swapped in.
+    """
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+    if reload_status["running"]:
+        raise HTTPException(status_code=409, detail="A reload is already running.")
+    asyncio.create_task(reload_in_background("admin"))
+    return {"status": "started"}
+
+
+@app.get("/admin/reload")
+async def get_reload_status():
+    return reload_status
 
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "loaded_dataframes": len(dataframes), "cached_items": len(pws_cache)}
+    return {"status": "ok", "pid": os.getpid(), "loaded_dataframes": len(dataframes),
+            "cached_items": summary_store.count(),
+            "data_version": data_version,
+            "inflight_summaries": len(inflight_summaries), "pwsid_index": pwsid_index_stats,
+            "map_points": len(map_grid) if map_grid is not None else 0, "reload": reload_status,
+            "prompt_sizes": prompt_size_stats,
+            "shards": shard_store.report() if shard_store is not None else None}
 
 # To run this application:
 # 1. Place 'main.py' and 'index.html' in your project root.
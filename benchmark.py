@@ -0,0 +1,202 @@
+"""
+Benchmarks the app against a data directory with a stubbed LLM and writes
+the results as JSON, so runs can be compared across changes.
+
+    python synthesize_sdwis.py --scale 10 --output-dir data_x10
+    python benchmark.py --data-dir data_x10 --output bench_x10.json
+    python benchmark.py --data-dir data_x10 --baseline bench_x10.json   # later: compare with that run
+
+Measured:
+  cold_start           load_all_data in a fresh process, parsing the CSVs and then from the snapshot
+  get_data_for_pwsid   per-call latency over every PWSID (or --sample of them)
+  water_quality        /water_quality throughput and latency under --concurrency clients, with
+                       every summary generated (stub LLM) and then again served from the cache
+Peak RSS is recorded per phase.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """Peak resident set size in MiB (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / 2**20 if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def latency_stats(seconds: List[float]) -> Dict[str, Any]:
+    values = np.array(seconds) * 1000
+    if not len(values):
+        return {"count": 0}
+    return {"count": len(values), "mean_ms": round(float(values.mean()), 3),
+            **{f"p{q}_ms": round(float(np.percentile(values, q)), 3) for q in (50, 90, 99)},
+            "max_ms": round(float(values.max()), 3)}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cold_start(data_dir: str, snapshot_dir: str) -> Dict[str, Any]:
+    """Runs load_all_data in this (fresh) process; the caller runs it in a subprocess."""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+    import_seconds = time.perf_counter() - started
+    app.DATA_DIR, app.SNAPSHOT_DIR = data_dir, snapshot_dir
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.load_all_data()
+    return {"seconds": round(time.perf_counter() - started, 3), "import_seconds": round(import_seconds, 3),
+            "peak_rss_mb": peak_rss_mb(), "tables": len(app.dataframes),
+            "rows": sum(len(df) for df in app.dataframes.values())}
+
+
+def run_cold_start(data_dir: str, snapshot_dir: str) -> Dict[str, Any]:
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--cold-start", "--data-dir", data_dir,
+                             "--snapshot-dir", snapshot_dir], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def bench_get_data(app, pwsids: List[str]) -> Dict[str, Any]:
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for pwsid in pwsids:
+            started = time.perf_counter()
+            app.get_data_for_pwsid(pwsid)
+            timings.append(time.perf_counter() - started)
+    return {**latency_stats(timings), "total_seconds": round(sum(timings), 3), "peak_rss_mb": peak_rss_mb()}
+
+
+async def bench_water_quality(app, pwsids: List[str], concurrency: int) -> Dict[str, Any]:
+    """Requests /water_quality for each PWSID with `concurrency` clients in flight."""
+    import httpx
+
+    queue = list(reversed(pwsids))
+    timings, statuses = [], {}
+
+    async def client_loop(client):
+        while queue:
+            pwsid = queue.pop()
+            started = time.perf_counter()
+            response = await client.get(f"/water_quality/{pwsid}")
+            timings.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {**latency_stats(timings), "requests_per_second": round(len(timings) / elapsed, 2),
+            "statuses": {str(status): count for status, count in sorted(statuses.items())},
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    """Prints each timing, throughput and memory figure next to the baseline run's."""
+    current, previous = flatten(results), flatten(baseline)
+    for key in current:
+        if key in previous and key.endswith(("_ms", "seconds", "_per_second", "rss_mb")) and previous[key]:
+            change = (current[key] - previous[key]) / previous[key] * 100
+            print(f"{key:55} {previous[key]:>12} -> {current[key]:>12} ({change:+.1f}%)", file=sys.stderr)
+
+
+def main(args) -> Dict[str, Any]:
+    data_dir = os.path.abspath(args.data_dir)
+    snapshot_dir = args.snapshot_dir or tempfile.mkdtemp(prefix="benchmark-snapshot-")
+    results: Dict[str, Any] = {"run": {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "commit": git_commit(), "python": platform.python_version(),
+        "platform": platform.platform(), "data_dir": data_dir, "stub_latency": args.stub_latency,
+        "stub_token_delay": args.stub_token_delay, "concurrency": args.concurrency}}
+
+    print("Cold start (CSV, then snapshot)...", file=sys.stderr)
+    results["cold_start"] = {"csv": run_cold_start(data_dir, snapshot_dir),
+                             "snapshot": run_cold_start(data_dir, snapshot_dir)}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+        from llm_stub import StubAsyncAnthropic
+        app.DATA_DIR, app.SNAPSHOT_DIR = data_dir, snapshot_dir
+        app.SUMMARY_DB = os.path.join(tempfile.mkdtemp(prefix="benchmark-summaries-"), "summaries.sqlite3")
+        app.client = StubAsyncAnthropic(latency=args.stub_latency, token_delay=args.stub_token_delay)
+        app.load_all_data()
+        app.open_summary_store()
+    pwsids = sorted(app.pwsid_fingerprints)
+    systems = app.dataframes['SDWA_PUB_WATER_SYSTEMS']
+    results["run"].update(systems=len(systems), pwsids=len(pwsids),
+                          table_rows={name: len(df) for name, df in sorted(app.dataframes.items())},
+                          llm_max_concurrency=app.LLM_MAX_CONCURRENCY)
+
+    sample = pwsids
+    if args.sample and args.sample < len(pwsids):
+        sample = [pwsids[i] for i in np.linspace(0, len(pwsids) - 1, args.sample).astype(int)]
+    print(f"get_data_for_pwsid over {len(sample)} systems...", file=sys.stderr)
+    results["get_data_for_pwsid"] = bench_get_data(app, sample)
+
+    requested = systems['PWSID'].drop_duplicates().sample(
+        n=min(args.requests, systems['PWSID'].nunique()), random_state=0).tolist()
+    print(f"/water_quality: {len(requested)} systems, {args.concurrency} concurrent clients...", file=sys.stderr)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results["water_quality"] = {
+            "generated": asyncio.run(bench_water_quality(app, requested, args.concurrency)),
+            "cached": asyncio.run(bench_water_quality(app, requested, args.concurrency)),
+        }
+    results["peak_rss_mb"] = max(peak_rss_mb(), *(run["peak_rss_mb"] for run in results["cold_start"].values()))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark data loading, lookups and /water_quality.")
+    parser.add_argument("--data-dir", default="data", help="Directory holding the SDWIS CSVs.")
+    parser.add_argument("--snapshot-dir", default=None, help="Snapshot directory (default: a fresh temporary one).")
+    parser.add_argument("--sample", type=int, default=None,
+                        help="Time get_data_for_pwsid for this many evenly spaced PWSIDs instead of all of them.")
+    parser.add_argument("--requests", type=int, default=200, help="/water_quality requests (distinct systems).")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent /water_quality clients.")
+    parser.add_argument("--stub-latency", type=float, default=0.5, help="Stub LLM seconds to the first word.")
+    parser.add_argument("--stub-token-delay", type=float, default=0.0, help="Stub LLM seconds per further word.")
+    parser.add_argument("--output", default=None, help="Write the results JSON here (default: stdout).")
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to compare this run against.")
+    parser.add_argument("--cold-start", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_start:
+        print(json.dumps(cold_start(args.data_dir, args.snapshot_dir)))
+        sys.exit(0)
+    results = main(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
@@ -1,3 +1,6 @@
+import os
+import sys
+
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -5,6 +8,13 @@ import io
 import plotly.figure_factory as ff
 import altair as alt  # Keep altair for other potential charts if needed
 
+# Shared modules (search index, ...) live in the project root, one level up.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sdwis_codes
+import sdwis_index
+import sdwis_rollups
+import search_index
+
 # --- Configuration and Page Setup ---
 st.set_page_config(
     page_title="Georgia Water Quality Dashboard",
@@ -72,24 +82,176 @@ if not data:
     st.stop()
 
 
+@st.cache_resource
+def load_search_index():
+    """Builds the system search index once per process; it is shared by every session."""
+    return search_index.SearchIndex(data['SDWA_PUB_WATER_SYSTEMS'], data.get('SDWA_GEOGRAPHIC_AREAS'))
+
+
+system_search = load_search_index()
+
+
+@st.cache_resource
+def load_code_decoder():
+    """Per-VALUE_TYPE code lookups, built once from SDWA_REF_CODE_VALUES."""
+    return sdwis_codes.CodeDecoder(data['SDWA_REF_CODE_VALUES'])
+
+
+code_decoder = load_code_decoder()
+
+
+@st.cache_resource
+def load_system_store():
+    """
+    PWSID-sorted copies of the tables plus their per-PWSID row ranges, built
+    once per process so one system's rows are a slice, not a full-table scan.
+    """
+    frames, indexes, _ = sdwis_index.index_all(data)
+    return frames, indexes
+
+
+@st.cache_resource
+def load_county_systems():
+    """County name -> the systems serving it, precomputed for the Tab 4 lookup."""
+    geo_df = data['SDWA_GEOGRAPHIC_AREAS']
+    county_areas = geo_df.loc[geo_df['AREA_TYPE_CODE'] == 'CN', ['COUNTY_SERVED', 'PWSID']].dropna()
+    systems = county_areas.merge(
+        data['SDWA_PUB_WATER_SYSTEMS'][['PWS_NAME', 'PWSID', 'POPULATION_SERVED_COUNT', 'CITY_NAME']],
+        on='PWSID').drop_duplicates(['COUNTY_SERVED', 'PWSID'])
+    columns = ['PWS_NAME', 'PWSID', 'POPULATION_SERVED_COUNT', 'CITY_NAME']
+    return {county: group[columns].reset_index(drop=True) for county, group in systems.groupby('COUNTY_SERVED')}
+
+
+@st.cache_resource
+def load_rollups():
+    """Statewide and per-county metrics, aggregated once per process instead of per selection."""
+    frames, indexes = load_system_store()
+    return sdwis_rollups.Rollups.build(frames, indexes)
+
+
 # --- Helper Functions ---
 def get_pws_name(pwsid):
     """Returns the name of a PWS from its ID."""
-    if pwsid and pwsid in data['SDWA_PUB_WATER_SYSTEMS']['PWSID'].values:
-        return data['SDWA_PUB_WATER_SYSTEMS'].loc[data['SDWA_PUB_WATER_SYSTEMS']['PWSID'] == pwsid, 'PWS_NAME'].iloc[0]
-    return "Unknown System"
+    system = system_rows('SDWA_PUB_WATER_SYSTEMS', pwsid) if pwsid else pd.DataFrame()
+    return system['PWS_NAME'].iloc[0] if not system.empty else "Unknown System"
 
 
 def get_code_description(value_type, value_code):
     """Looks up a description for a given code from the reference table."""
-    # Ensure value_code is not NaN before query
-    if pd.isna(value_code):
-        return "N/A"
-    ref_df = data['SDWA_REF_CODE_VALUES']
-    desc = ref_df[(ref_df['VALUE_TYPE'] == value_type) & (ref_df['VALUE_CODE'] == str(value_code))]
-    if not desc.empty:
-        return desc['VALUE_DESCRIPTION'].iloc[0]
-    return str(value_code)
+    return code_decoder.describe(value_type, value_code, missing="N/A")
+
+
+def decode_codes(series, value_type):
+    """Vectorized get_code_description over a whole column."""
+    return code_decoder.decode(series, value_type, missing="N/A")
+
+
+def parse_dates(series):
+    return pd.to_datetime(series, format='%m/%d/%Y', errors='coerce')
+
+
+def system_rows(name, pwsid):
+    """All rows of one table for a PWSID, sliced from the indexed store."""
+    frames, indexes = load_system_store()
+    if name not in indexes:
+        return pd.DataFrame()
+    return sdwis_index.slice_partition(frames[name], indexes[name], pwsid).copy()
+
+
+def violation_annotations(timeline):
+    """Gantt bar labels ("Value: x (Limit: y)") for violations with a measured value, built column-wise."""
+    measure = pd.to_numeric(timeline['VIOL_MEASURE'], errors='coerce')
+    limit = pd.to_numeric(timeline['FEDERAL_MCL'], errors='coerce')
+    labelled = measure.notna()
+    if not labelled.any():
+        return []
+    text = "Value: " + measure[labelled].map('{:.3f}'.format) + np.where(
+        limit[labelled].notna(), " (Limit: " + limit[labelled].astype(str) + ")", "")
+    start, finish = timeline.loc[labelled, 'Start'], timeline.loc[labelled, 'Finish']
+    midpoint = start + (finish - start) / 2
+    return [dict(x=x, y=y, text=t, showarrow=False, font=dict(color='white', size=10), align='center')
+            for x, y, t in zip(midpoint, timeline.loc[labelled, 'Task'], text)]
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_system_bundle(pwsid):
+    """
+    Everything the tabs render for one system, with dates parsed and codes
+    decoded once. Cached per PWSID, so widget clicks and returning to a
+    system skip all of this.
+    """
+    info = system_rows('SDWA_PUB_WATER_SYSTEMS', pwsid).iloc[0]
+
+    # Violations: every row for the report card, plus the dated timeline for the Gantt chart
+    violations = system_rows('SDWA_VIOLATIONS_ENFORCEMENT', pwsid)
+    violations['Start'] = parse_dates(violations['NON_COMPL_PER_BEGIN_DATE'])
+    latest_date = violations['Start'].max()
+    if pd.isna(latest_date):
+        latest_date = pd.Timestamp.now()
+    violations['Finish'] = parse_dates(violations['NON_COMPL_PER_END_DATE']).fillna(latest_date)
+    violations['Task'] = decode_codes(violations['CONTAMINANT_CODE'], 'CONTAMINANT_CODE')
+    violations['Resource'] = np.where(violations['IS_HEALTH_BASED_IND'] == 'Y', 'Health-Based', 'Non-Health-Based')
+    violations['Violation'] = decode_codes(violations['VIOLATION_CODE'], 'VIOLATION_CODE')
+    timeline = violations.dropna(subset=['Start', 'Finish'])
+
+    # Unified compliance event table: violations and LCR samples
+    violation_events = pd.DataFrame({
+        'Date': timeline['Start'],
+        'Event Type': 'Violation',
+        'Contaminant': timeline['Task'],
+        'Details': "Violation: " + timeline['Violation'] + " | Status: " + timeline['VIOLATION_STATUS'].astype(str),
+        'Health Based': timeline['Resource'],
+    })
+    lcr = system_rows('SDWA_LCR_SAMPLES', pwsid)
+    lcr_events = pd.DataFrame()
+    if not lcr.empty:
+        lcr_events = pd.DataFrame({
+            'Date': parse_dates(lcr['SAMPLING_END_DATE']),
+            'Event Type': 'LCR Sample',
+            'Contaminant': decode_codes(lcr['CONTAMINANT_CODE'], 'CONTAMINANT_CODE'),
+            'Details': "90th Percentile Result: " + lcr['SAMPLE_MEASURE'].astype(str) + " " +
+                       lcr['UNIT_OF_MEASURE'].astype(str),
+            'Health Based': 'N/A',
+        }).dropna(subset=['Date'])
+    details = pd.concat([violation_events, lcr_events], ignore_index=True)
+    if not details.empty:
+        details = details.sort_values(by='Date', ascending=False)
+
+    enforcement = violations[violations['ENFORCEMENT_ID'].notna()]
+    enforcement = pd.DataFrame({
+        'ENFORCEMENT_DATE': enforcement['ENFORCEMENT_DATE'],
+        'Action Type': decode_codes(enforcement['ENFORCEMENT_ACTION_TYPE_CODE'], 'ENFORCEMENT_ACTION_TYPE_CODE'),
+        'Related Violation': enforcement['Violation'],
+    })
+
+    visits = system_rows('SDWA_SITE_VISITS', pwsid)
+    if not visits.empty:
+        visits['Reason'] = decode_codes(visits['VISIT_REASON_CODE'], 'VISIT_REASON_CODE')
+
+    facilities = system_rows('SDWA_FACILITIES', pwsid)
+    if not facilities.empty:
+        facilities = facilities[facilities['IS_SOURCE_IND'] == 'Y']
+
+    geo = system_rows('SDWA_GEOGRAPHIC_AREAS', pwsid)
+    cities_served, counties_served = [], []
+    if not geo.empty:
+        cities_served = geo.loc[geo['AREA_TYPE_CODE'] == 'CT', 'CITY_SERVED'].dropna().unique().tolist()
+        counties_served = geo.loc[geo['AREA_TYPE_CODE'] == 'CN', 'COUNTY_SERVED'].dropna().unique().tolist()
+
+    return {
+        "info": info,
+        "system_type": get_code_description('PWS_TYPE_CODE', info['PWS_TYPE_CODE']),
+        "primary_source": get_code_description('PRIMARY_SOURCE_CODE', info['PRIMARY_SOURCE_CODE']),
+        "violations": violations,
+        "timeline": timeline[['Task', 'Start', 'Finish', 'Resource']],
+        "annotations": violation_annotations(timeline),
+        "details": details,
+        "enforcement": enforcement,
+        "visits": visits,
+        "source_facilities": facilities,
+        "cities_served": cities_served,
+        "counties_served": counties_served,
+    }
 
 
 # --- Main App ---
@@ -98,28 +260,33 @@ st.markdown("Insights from the Q1 2025 SDWIS Data Export for the State of Georgi
 
 # --- Sidebar Filters ---
 st.sidebar.header("Filter by Water System")
-# Create a mapping from PWSID to a more descriptive name for the selectbox
-pws_options = data['SDWA_PUB_WATER_SYSTEMS'][['PWSID', 'PWS_NAME', 'CITY_NAME']].copy()
-pws_options.dropna(subset=['PWS_NAME', 'CITY_NAME'], inplace=True)
-pws_options['display_name'] = pws_options['PWS_NAME'] + " (" + pws_options['CITY_NAME'].astype(str) + ", " + \
-                              pws_options['PWSID'] + ")"
-pws_display_map = pd.Series(pws_options.PWSID.values, index=pws_options.display_name).to_dict()
+# The search index narrows the picker to the best matches; with no query it offers the largest systems.
+search_query = st.sidebar.text_input("Search by name, PWSID or city:", "")
+if search_query:
+    matches = system_search.search(search_query, limit=50)
+else:
+    matches = system_search.largest(limit=50)
+if not matches:
+    st.sidebar.warning(f"No water systems match '{search_query}'.")
+    st.stop()
+pws_display_map = {f"{m['name']} ({m['city'] or 'N/A'}, {m['pwsid']})": m['pwsid'] for m in matches}
 
 selected_pws_display = st.sidebar.selectbox(
     "Select a Public Water System:",
-    options=sorted(pws_display_map.keys()),
+    options=list(pws_display_map.keys()),
     index=0
 )
 selected_pwsid = pws_display_map[selected_pws_display]
+bundle = load_system_bundle(selected_pwsid)
 
 # Display high-level info for the selected system in the sidebar
-pws_info = data['SDWA_PUB_WATER_SYSTEMS'].loc[data['SDWA_PUB_WATER_SYSTEMS']['PWSID'] == selected_pwsid].iloc[0]
+pws_info = bundle['info']
 st.sidebar.markdown("---")
 st.sidebar.markdown(f"**System Name:** {pws_info['PWS_NAME']}")
 st.sidebar.markdown(f"**PWSID:** {pws_info['PWSID']}")
 st.sidebar.markdown(f"**Location:** {pws_info['CITY_NAME']}, GA")
 st.sidebar.markdown(f"**Population Served:** {int(pws_info['POPULATION_SERVED_COUNT']):,}")
-st.sidebar.markdown(f"**System Type:** {get_code_description('PWS_TYPE_CODE', pws_info['PWS_TYPE_CODE'])}")
+st.sidebar.markdown(f"**System Type:** {bundle['system_type']}")
 st.sidebar.markdown("---")
 
 # --- Tabbed Interface ---
@@ -137,26 +304,7 @@ with tab1:
     st.markdown(
         "This Gantt chart shows the duration of non-compliance for each violation. Hover over bars for details.")
 
-    # --- Data Preparation for Gantt Chart ---
-    pws_violations = data['SDWA_VIOLATIONS_ENFORCEMENT'][
-        data['SDWA_VIOLATIONS_ENFORCEMENT']['PWSID'] == selected_pwsid].copy()
-    pws_violations['Start'] = pd.to_datetime(pws_violations['NON_COMPL_PER_BEGIN_DATE'], errors='coerce')
-
-    latest_date = pws_violations['Start'].max()
-    if pd.isna(latest_date):
-        latest_date = pd.Timestamp.now()
-
-    pws_violations['Finish'] = pd.to_datetime(pws_violations['NON_COMPL_PER_END_DATE'], errors='coerce').fillna(
-        latest_date)
-    pws_violations.dropna(subset=['Start', 'Finish'], inplace=True)
-
-    gantt_data = []
-    if not pws_violations.empty:
-        pws_violations['Task'] = pws_violations['CONTAMINANT_CODE'].apply(
-            lambda x: get_code_description('CONTAMINANT_CODE', str(int(x))))
-        pws_violations['Resource'] = np.where(pws_violations['IS_HEALTH_BASED_IND'] == 'Y', 'Health-Based',
-                                              'Non-Health-Based')
-        gantt_data = pws_violations[['Task', 'Start', 'Finish', 'Resource']].to_dict('records')
+    gantt_data = bundle['timeline'].to_dict('records')
 
     if not gantt_data:
         st.info("No historical violations found in this dataset for the selected water system.")
@@ -172,71 +320,19 @@ with tab1:
                               title='Violation Timeline by Type')
 
         # --- Add Annotations ---
-        annotations = []
-        for index, row in pws_violations.iterrows():
-            viol_measure = pd.to_numeric(row.get('VIOL_MEASURE'), errors='coerce')
-            federal_mcl = pd.to_numeric(row.get('FEDERAL_MCL'), errors='coerce')
-
-            if pd.notna(viol_measure):
-                # Build annotation text
-                annotation_text = f"Value: {viol_measure:.3f}"
-                if pd.notna(federal_mcl):
-                    annotation_text += f" (Limit: {federal_mcl})"
-
-                # Calculate position for the annotation
-                midpoint_date = row['Start'] + (row['Finish'] - row['Start']) / 2
-
-                # Add annotation to the figure
-                fig.add_annotation(
-                    x=midpoint_date,
-                    y=row['Task'],
-                    text=annotation_text,
-                    showarrow=False,
-                    font=dict(color='white', size=10),
-                    align='center'
-                )
+        fig.update_layout(annotations=list(fig.layout.annotations) + bundle['annotations'])
 
         fig.update_layout(xaxis_title='Date', yaxis_title='Contaminant / Rule')
         st.plotly_chart(fig, use_container_width=True)
 
     # --- LCR and Details Table ---
     st.markdown("### Compliance Event Details")
-    pws_lcr = data['SDWA_LCR_SAMPLES'][data['SDWA_LCR_SAMPLES']['PWSID'] == selected_pwsid].copy()
-
-    # Prepare violation data for the table
-    violations_table = pws_violations.copy()
-    violations_table['Date'] = violations_table['Start']
-    violations_table['Event Type'] = 'Violation'
-    violations_table['Details'] = "Violation: " + violations_table['VIOLATION_CODE'].apply(
-        lambda x: get_code_description('VIOLATION_CODE', x)) + " | Status: " + violations_table[
-                                      'VIOLATION_STATUS'].astype(str)
-    violations_table['Health Based'] = violations_table['Resource']
-
-    # Prepare LCR data for the table
-    if not pws_lcr.empty:
-        pws_lcr['Date'] = pd.to_datetime(pws_lcr['SAMPLING_END_DATE'], errors='coerce')
-        pws_lcr.dropna(subset=['Date'], inplace=True)
-        pws_lcr['Event Type'] = 'LCR Sample'
-        pws_lcr['Contaminant'] = pws_lcr['CONTAMINANT_CODE'].apply(
-            lambda x: get_code_description('CONTAMINANT_CODE', str(x)))
-        pws_lcr['Details'] = "90th Percentile Result: " + pws_lcr['SAMPLE_MEASURE'].astype(str) + " " + pws_lcr[
-            'UNIT_OF_MEASURE'].astype(str)
-        pws_lcr['Health Based'] = 'N/A'
-    else:
-        pws_lcr = pd.DataFrame()
-
-    # Combine for a unified table
-    details_data = pd.concat([
-        violations_table[['Date', 'Event Type', 'Task', 'Details', 'Health Based']].rename(
-            columns={'Task': 'Contaminant'}),
-        pws_lcr[
-            ['Date', 'Event Type', 'Contaminant', 'Details', 'Health Based']] if not pws_lcr.empty else pd.DataFrame()
-    ], ignore_index=True)
+    details_data = bundle['details']
 
     if details_data.empty:
         st.info("No detailed compliance events to display.")
     else:
-        st.dataframe(details_data.sort_values(by='Date', ascending=False), use_container_width=True)
+        st.dataframe(details_data, use_container_width=True)
 
 # --- Tab 2: System Performance ---
 with tab2:
@@ -244,9 +340,8 @@ with tab2:
     st.markdown("A summary of compliance status, enforcement actions, and recent site visits.")
 
     # Data for selected PWS
-    pws_violations_perf = data['SDWA_VIOLATIONS_ENFORCEMENT'][
-        data['SDWA_VIOLATIONS_ENFORCEMENT']['PWSID'] == selected_pwsid]
-    pws_visits = data['SDWA_SITE_VISITS'][data['SDWA_SITE_VISITS']['PWSID'] == selected_pwsid]
+    pws_violations_perf = bundle['violations']
+    pws_visits = bundle['visits']
 
     # Report Card Metrics
     col1, col2, col3 = st.columns(3)
@@ -254,34 +349,24 @@ with tab2:
         st.metric("Total Violations (in this dataset)", value=len(pws_violations_perf))
     with col2:
         st.metric("Health-Based Violations",
-                  value=len(pws_violations_perf[pws_violations_perf['IS_HEALTH_BASED_IND'] == 'Y']))
+                  value=int((pws_violations_perf['IS_HEALTH_BASED_IND'] == 'Y').sum()))
     with col3:
         st.metric("Site Visits (in this dataset)", value=len(pws_visits))
 
     st.subheader("Enforcement Actions")
-    pws_enforcement = pws_violations_perf[pws_violations_perf['ENFORCEMENT_ID'].notna()]
-    if pws_enforcement.empty:
+    if bundle['enforcement'].empty:
         st.success("No enforcement actions found for this system in this dataset.")
     else:
-        display_enforcement = pws_enforcement.copy()
-        display_enforcement['Action Type'] = display_enforcement['ENFORCEMENT_ACTION_TYPE_CODE'].apply(
-            lambda x: get_code_description('ENFORCEMENT_ACTION_TYPE_CODE', x))
-        display_enforcement['Related Violation'] = display_enforcement['VIOLATION_CODE'].apply(
-            lambda x: get_code_description('VIOLATION_CODE', x))
-        st.dataframe(display_enforcement[['ENFORCEMENT_DATE', 'Action Type', 'Related Violation']],
-                     use_container_width=True)
+        st.dataframe(bundle['enforcement'], use_container_width=True)
 
     st.subheader("Site Visits & Inspections")
     if pws_visits.empty:
         st.info("No site visits recorded for this system in this dataset.")
     else:
-        display_visits = pws_visits.copy()
-        display_visits['Reason'] = display_visits['VISIT_REASON_CODE'].apply(
-            lambda x: get_code_description('VISIT_REASON_CODE', x))
-        st.dataframe(display_visits[['VISIT_DATE', 'Reason']], use_container_width=True)
+        st.dataframe(pws_visits[['VISIT_DATE', 'Reason']], use_container_width=True)
         st.write(
             "Inspectors evaluate key areas during a visit. (N=No Deficiencies, R=Recommendations, M=Minor Deficiencies, S=Significant Deficiencies)")
-        st.dataframe(display_visits[
+        st.dataframe(pws_visits[
                          ['VISIT_DATE', 'MANAGEMENT_OPS_EVAL_CODE', 'SOURCE_WATER_EVAL_CODE', 'TREATMENT_EVAL_CODE',
                           'DISTRIBUTION_EVAL_CODE']], use_container_width=True)
 
@@ -290,12 +375,11 @@ with tab3:
     st.header(f"Water Source Profile for: {pws_info['PWS_NAME']}")
 
     primary_source_code = pws_info['PRIMARY_SOURCE_CODE']
-    primary_source_desc = get_code_description('PRIMARY_SOURCE_CODE', primary_source_code)
+    primary_source_desc = bundle['primary_source']
 
     st.info(f"**Primary Water Source:** {primary_source_desc} (`{primary_source_code}`)", icon="🚰")
 
-    pws_facilities = data['SDWA_FACILITIES'][data['SDWA_FACILITIES']['PWSID'] == selected_pwsid]
-    source_facilities = pws_facilities[pws_facilities['IS_SOURCE_IND'] == 'Y']
+    source_facilities = bundle['source_facilities']
 
     st.subheader("Source Facilities")
     if source_facilities.empty:
@@ -323,10 +407,8 @@ with tab3:
 with tab4:
     st.header(f"Community Profile for: {pws_info['PWS_NAME']}")
 
-    pws_geo = data['SDWA_GEOGRAPHIC_AREAS'][data['SDWA_GEOGRAPHIC_AREAS']['PWSID'] == selected_pwsid]
-
-    cities_served = pws_geo[pws_geo['AREA_TYPE_CODE'] == 'CT']['CITY_SERVED'].dropna().unique().tolist()
-    counties_served = pws_geo[pws_geo['AREA_TYPE_CODE'] == 'CN']['COUNTY_SERVED'].dropna().unique().tolist()
+    cities_served = bundle['cities_served']
+    counties_served = bundle['counties_served']
 
     st.subheader("Service Area")
     st.markdown(f"This water system primarily serves the following areas:")
@@ -347,19 +429,26 @@ with tab4:
         st.info("This system is not primarily designated as serving a school or daycare facility.", icon="🏢")
 
     st.subheader("Find Systems by County")
-    all_counties = sorted(data['SDWA_GEOGRAPHIC_AREAS']['COUNTY_SERVED'].dropna().unique())
+    county_systems_map = load_county_systems()
+    all_counties = sorted(county_systems_map)
     selected_county = st.selectbox("Select a county to see which water systems operate there:", all_counties)
 
     if selected_county:
-        geo_df = data['SDWA_GEOGRAPHIC_AREAS']
-        pws_df = data['SDWA_PUB_WATER_SYSTEMS']
-
-        county_pwsids = geo_df[(geo_df['COUNTY_SERVED'] == selected_county) & (geo_df['AREA_TYPE_CODE'] == 'CN')][
-            'PWSID']
-
-        if not county_pwsids.empty:
-            county_systems = pws_df[pws_df['PWSID'].isin(county_pwsids)][
-                ['PWS_NAME', 'PWSID', 'POPULATION_SERVED_COUNT', 'CITY_NAME']]
+        county_systems = county_systems_map.get(selected_county, pd.DataFrame())
+
+        county_rollups = load_rollups().groups['county']
+        if selected_county in county_rollups.index:
+            metrics = county_rollups.loc[selected_county]
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Active Systems", f"{int(metrics['systems']):,}")
+            m2.metric("Health-Based Violations", f"{int(metrics['health_based_violations']):,}",
+                      help=f"{int(metrics['violations']):,} violations in total")
+            m3.metric("People Served by Systems with Open Health Violations", f"{int(metrics['population_affected']):,}")
+            rate = metrics['deficiency_rate']
+            m4.metric("Sanitary Survey Deficiency Rate", "N/A" if pd.isna(rate) else f"{rate:.0%}",
+                      help="Share of surveyed systems whose latest sanitary survey found a significant deficiency")
+
+        if not county_systems.empty:
             st.write(f"Water Systems in {selected_county} County:")
             st.dataframe(county_systems, use_container_width=True)
         else:
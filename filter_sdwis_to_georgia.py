@@ -1,8 +1,248 @@
 import pandas as pd
+import argparse
 import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+# List of all files to be processed
+FILENAMES = [
+    "SDWA_PUB_WATER_SYSTEMS.csv",
+    "SDWA_VIOLATIONS_ENFORCEMENT.csv",
+    "SDWA_LCR_SAMPLES.csv",
+    "SDWA_SITE_VISITS.csv",
+    "SDWA_FACILITIES.csv",
+    "SDWA_GEOGRAPHIC_AREAS.csv",
+    "SDWA_REF_CODE_VALUES.csv",
+    "SDWA_EVENTS_MILESTONES.csv",
+    "SDWA_PN_VIOLATION_ASSOC.csv",
+    "SDWA_REF_ANSI_AREAS.csv",
+    "SDWA_SERVICE_AREAS.csv"
+]
 
-def filter_sdwis_for_georgia():
+# Rows per chunk in streaming mode; peak memory per worker is bounded by this.
+DEFAULT_CHUNK_SIZE = 200_000
+
+# In partitioned output, national reference data is written once under this key
+# instead of being copied into every state directory.
+SHARED_PARTITION = "_shared"
+# Reference files the app needs besides the SDWIS export (ZIP centroids for the map and lookups).
+REFERENCE_FILENAMES = ["zipCodeToLatLong.csv"]
+# Files copied into SHARED_PARTITION whole rather than split by state.
+SHARED_FILENAMES = ("SDWA_REF_CODE_VALUES.csv", *REFERENCE_FILENAMES)
+
+
+def stream_filter_file(input_path, output_path, state_code, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Filters one national CSV to a state in fixed-size chunks, appending each
+    filtered chunk to the output as it goes. Every value is read and written
+    back as a string, so codes such as '001' keep their leading zeros.
+    Returns per-file statistics for the throughput report.
+    """
+    filename = os.path.basename(input_path)
+    started = time.perf_counter()
+    input_bytes = os.path.getsize(input_path)
+    rows_in = rows_out = 0
+
+    if filename == "SDWA_REF_CODE_VALUES.csv":
+        # National reference file: copy the bytes over without parsing.
+        shutil.copyfile(input_path, output_path)
+        rows_in = rows_out = None
+    else:
+        reader = pd.read_csv(input_path, dtype=str, keep_default_na=False, chunksize=chunk_size)
+        tmp_path = f"{output_path}.partial"
+        header_written = False
+        try:
+            for chunk in reader:
+                rows_in += len(chunk)
+                if 'PWSID' in chunk.columns:
+                    chunk = chunk[chunk['PWSID'].str.startswith(state_code)]
+                elif 'STATE_CODE' in chunk.columns:
+                    chunk = chunk[chunk['STATE_CODE'] == state_code]
+                rows_out += len(chunk)
+                chunk.to_csv(tmp_path, mode='a' if header_written else 'w', header=not header_written, index=False)
+                header_written = True
+            if not header_written:
+                # Empty input: still produce an (empty) output file.
+                open(tmp_path, 'w').close()
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            # A half-written file must not be left behind (or picked up as the output).
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    seconds = time.perf_counter() - started
+    return {
+        "filename": filename,
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "input_bytes": input_bytes,
+        "seconds": seconds,
+    }
+
+
+def partition_file_by_state(input_path, output_dir, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Splits one national CSV into per-state files in a single pass: each chunk
+    is grouped by the two-character PWSID prefix (or STATE_CODE for the ANSI
+    reference file) and appended to output_dir/<STATE>/<filename>.
+    Returns per-file statistics, including the number of states written and
+    the rows skipped for having no state key.
+    """
+    filename = os.path.basename(input_path)
+    started = time.perf_counter()
+    input_bytes = os.path.getsize(input_path)
+    rows_in = rows_out = rows_skipped = 0
+
+    if filename in SHARED_FILENAMES:
+        shared_dir = os.path.join(output_dir, SHARED_PARTITION)
+        os.makedirs(shared_dir, exist_ok=True)
+        shutil.copyfile(input_path, os.path.join(shared_dir, filename))
+        return {"filename": filename, "rows_in": None, "rows_out": None, "rows_skipped": None, "states": 0,
+                "state_codes": [], "input_bytes": input_bytes, "seconds": time.perf_counter() - started}
+
+    header = pd.read_csv(input_path, dtype=str, nrows=0).columns
+    key_column = next((column for column in ('PWSID', 'STATE_CODE') if column in header), None)
+    if key_column is None:
+        print(f"Warning: No 'PWSID' or 'STATE_CODE' column in '{filename}'. Skipped.")
+
+    partial_paths = {}
+    try:
+        for chunk in pd.read_csv(input_path, dtype=str, keep_default_na=False, chunksize=chunk_size):
+            rows_in += len(chunk)
+            if key_column is None:
+                rows_skipped += len(chunk)
+                continue
+            keys = chunk['PWSID'].str[:2] if key_column == 'PWSID' else chunk['STATE_CODE']
+            for state, part in chunk.groupby(keys, sort=False):
+                if not state:
+                    rows_skipped += len(part)
+                    continue
+                rows_out += len(part)
+                if state not in partial_paths:
+                    state_dir = os.path.join(output_dir, state)
+                    os.makedirs(state_dir, exist_ok=True)
+                    partial_paths[state] = os.path.join(state_dir, f"{filename}.partial")
+                    part.to_csv(partial_paths[state], mode='w', header=True, index=False)
+                else:
+                    part.to_csv(partial_paths[state], mode='a', header=False, index=False)
+
+        for partial_path in partial_paths.values():
+            os.replace(partial_path, partial_path[:-len(".partial")])
+    except BaseException:
+        for partial_path in partial_paths.values():
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        raise
+
+    return {"filename": filename, "rows_in": rows_in, "rows_out": rows_out, "rows_skipped": rows_skipped,
+            "states": len(partial_paths), "state_codes": sorted(partial_paths), "input_bytes": input_bytes,
+            "seconds": time.perf_counter() - started}
+
+
+def partition_sdwis_by_state(input_dir, output_dir, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """
+    Reads every national file once and writes per-state partitions, so all
+    states come out of one ingest run. Layout:
+        <output_dir>/<STATE>/SDWA_*.csv
+        <output_dir>/_shared/SDWA_REF_CODE_VALUES.csv, zipCodeToLatLong.csv
+    The partitions are written to a fresh tree that replaces output_dir once
+    every file succeeded, so no state keeps files from an earlier run. If a
+    file fails, output_dir is left as it was.
+    """
+    output_dir = os.path.normpath(output_dir)
+    staging_dir = f"{output_dir}.partial"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    jobs = {}
+    states = set()
+    failed = []
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for filename in FILENAMES + REFERENCE_FILENAMES:
+                input_path = os.path.join(input_dir, filename)
+                if not os.path.exists(input_path):
+                    print(f"Error: Could not find '{input_path}'. Please make sure it exists.")
+                    continue
+                jobs[pool.submit(partition_file_by_state, input_path, staging_dir, chunk_size)] = filename
+
+            for future in as_completed(jobs):
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    print(f"An error occurred while processing '{jobs[future]}': {e}")
+                    failed.append(jobs[future])
+                    continue
+                states.update(stats["state_codes"])
+                print_throughput(stats)
+        if failed:
+            print(f"\nPartitioning failed for {', '.join(sorted(failed))}; '{output_dir}' was left unchanged.")
+            return
+        swap_tree(staging_dir, output_dir)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    print(f"\nPartitioned {len(jobs)} files into {len(states)} states in {time.perf_counter() - started:.1f}s.")
+    print(f"Per-state files are located in '{output_dir}/<STATE>/', shared reference data in "
+          f"'{output_dir}/{SHARED_PARTITION}/'.")
+
+
+def swap_tree(new_dir, target_dir):
+    """Replaces target_dir with new_dir; target_dir is briefly missing between the two renames."""
+    old_dir = f"{target_dir}.old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(target_dir):
+        os.replace(target_dir, old_dir)
+    os.replace(new_dir, target_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def print_throughput(stats):
+    """Prints a one-line throughput report for a file processed in streaming mode."""
+    seconds = max(stats["seconds"], 1e-9)
+    mb_per_s = stats["input_bytes"] / 2**20 / seconds
+    if stats["rows_in"] is None:
+        print(f"{stats['filename']}: copied as-is (national reference file) "
+              f"in {stats['seconds']:.1f}s, {mb_per_s:.1f} MB/s")
+        return
+    if "states" in stats:
+        skipped = f" ({stats['rows_skipped']} without a state skipped)" if stats["rows_skipped"] else ""
+        print(f"{stats['filename']}: split {stats['rows_out']} of {stats['rows_in']} rows into {stats['states']} "
+              f"states{skipped} in {stats['seconds']:.1f}s, {stats['rows_in'] / seconds:,.0f} rows/s, "
+              f"{mb_per_s:.1f} MB/s")
+        return
+    print(f"{stats['filename']}: kept {stats['rows_out']} of {stats['rows_in']} rows "
+          f"in {stats['seconds']:.1f}s, {stats['rows_in'] / seconds:,.0f} rows/s, {mb_per_s:.1f} MB/s")
+
+
+def filter_sdwis_streaming(input_dir, output_dir, state_code, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """
+    Streaming variant of filter_sdwis_for_georgia: files are processed in
+    parallel in a process pool, each one in bounded-memory chunks.
+    """
+    jobs = {}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for filename in FILENAMES:
+            input_path = os.path.join(input_dir, filename)
+            if not os.path.exists(input_path):
+                print(f"Error: Could not find '{input_path}'. Please make sure it exists.")
+                continue
+            output_path = os.path.join(output_dir, filename)
+            jobs[pool.submit(stream_filter_file, input_path, output_path, state_code, chunk_size)] = filename
+
+        for future in as_completed(jobs):
+            try:
+                print_throughput(future.result())
+            except Exception as e:
+                print(f"An error occurred while processing '{jobs[future]}': {e}")
+
+    print(f"\nProcessed {len(jobs)} files in {time.perf_counter() - started:.1f}s.")
+
+
+def filter_sdwis_for_georgia(stream=False, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
     """
     Reads national SDWIS CSV files from an 'input_national' directory,
     filters the data to include only records for the state of Georgia,
@@ -21,25 +261,15 @@ def filter_sdwis_for_georgia():
         os.makedirs(output_dir)
         print(f"Created output directory: {output_dir}")
 
-    # List of all files to be processed
-    filenames = [
-        "SDWA_PUB_WATER_SYSTEMS.csv",
-        "SDWA_VIOLATIONS_ENFORCEMENT.csv",
-        "SDWA_LCR_SAMPLES.csv",
-        "SDWA_SITE_VISITS.csv",
-        "SDWA_FACILITIES.csv",
-        "SDWA_GEOGRAPHIC_AREAS.csv",
-        "SDWA_REF_CODE_VALUES.csv",
-        "SDWA_EVENTS_MILESTONES.csv",
-        "SDWA_PN_VIOLATION_ASSOC.csv",
-        "SDWA_REF_ANSI_AREAS.csv",
-        "SDWA_SERVICE_AREAS.csv"
-    ]
-
     print(f"Starting the filtering process for state: {state_code}")
 
+    if stream:
+        filter_sdwis_streaming(input_dir, output_dir, state_code, chunk_size=chunk_size, workers=workers)
+        print(f"Your Georgia-specific files are located in the '{output_dir}' directory.")
+        return
+
     # --- Processing Loop ---
-    for filename in filenames:
+    for filename in FILENAMES:
         input_path = os.path.join(input_dir, filename)
         output_path = os.path.join(output_dir, filename)
 
@@ -97,6 +327,22 @@ if __name__ == "__main__":
     # Instructions:
     # 1. Create a folder named 'input_national' in the same directory as this script.
     # 2. Place all your national SDWIS CSV files inside the 'input_national' folder.
-    # 3. Run this script.
+    # 3. Run this script (add --stream for national-size files that do not fit in memory).
     # 4. The filtered files for Georgia will appear in a new 'output_georgia' folder.
-    filter_sdwis_for_georgia()
+    #    With --partition, every state is written instead, one folder per PWSID prefix.
+    parser = argparse.ArgumentParser(description="Filter the national SDWIS export down to Georgia.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Process files in parallel, in bounded-memory chunks.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Rows per chunk in streaming mode.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes in streaming mode (default: one per CPU).")
+    parser.add_argument("--partition", action="store_true",
+                        help="Write per-state partitions of every file in a single pass instead of filtering to GA.")
+    parser.add_argument("--output-dir", default="data_by_state",
+                        help="Output root for --partition.")
+    args = parser.parse_args()
+    if args.partition:
+        partition_sdwis_by_state("input_national", args.output_dir, chunk_size=args.chunk_size, workers=args.workers)
+    else:
+        filter_sdwis_for_georgia(stream=args.stream, chunk_size=args.chunk_size, workers=args.workers)
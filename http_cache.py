@@ -0,0 +1,290 @@
+"""
+HTTP caching and compression: strong ETags with If-None-Match revalidation,
+Accept-Encoding negotiation, precompressed variants of the static datasets
+and on-the-fly compression of JSON responses.
+
+Brotli is used when the optional `brotli` package is installed; gzip is
+always available.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+import snapshot
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred first when a client accepts several at the same q-value.
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+# Bodies smaller than this are sent as they are; compression would save less than the headers cost.
+MINIMUM_COMPRESS_BYTES = 1000
+# Static files worth compressing ahead of time.
+PRECOMPRESS_SUFFIXES = ('.csv', '.json', '.geojson', '.md', '.txt', '.html')
+# `?v=<version>` URLs name one content version, so they can be cached for good.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Plain URLs: cache, but revalidate every use (a 304 when nothing changed).
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def compress(payload: bytes, encoding: str, best: bool = False) -> bytes:
+    """`best` spends the extra CPU on the smallest output, for variants compressed once and served many times."""
+    if encoding == "br":
+        return brotli.compress(payload, quality=11 if best else 5)
+    # mtime=0 keeps the output (and so its size and hash) the same for the same input.
+    return gzip.compress(payload, compresslevel=9 if best else 6, mtime=0)
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available: Iterable[str]) -> Optional[str]:
+    """
+    The content coding to send for an Accept-Encoding header, out of
+    `available` (in order of preference), or None for the identity coding.
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        if params.strip().startswith("q="):
+            try:
+                weight = float(params.strip()[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether If-None-Match names `etag` (weak comparison, as RFC 9110 requires for this header)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def not_modified_since(if_modified_since: Optional[str], mtime: float) -> bool:
+    """Whether If-Modified-Since is at or after `mtime` (to the second, as HTTP dates go)."""
+    if not if_modified_since:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def variant_etag(etag: str, encoding: Optional[str]) -> str:
+    """Each coding of a resource is its own representation, with its own strong ETag."""
+    return etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+
+
+class StaticAsset:
+    """One static file, its content version and its precompressed variants (encoding -> path)."""
+
+    def __init__(self, path: str, size: int, mtime_ns: int, sha256: str, variants: Dict[str, str]):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.sha256 = sha256
+        self.variants = variants
+
+    @property
+    def version(self) -> str:
+        return self.sha256[:16]
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.version}"'
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves the precompressed variant of a file matching the
+    client's Accept-Encoding, with a strong content-hash ETag and 304s for
+    If-None-Match. Variants are written by `build` (at data-load time) under
+    `cache_dir`, named by content hash; files `build` has not seen are
+    served as StaticFiles would.
+    """
+
+    def __init__(self, *args, cache_dir: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_dir = cache_dir
+        # Real path of each file -> its asset; replaced whole by `build`.
+        self.assets: Dict[str, StaticAsset] = {}
+
+    def _precompress(self, path: str, sha256: str) -> Dict[str, str]:
+        """Writes the missing compressed variants of one file version; returns them by encoding."""
+        variants = {}
+        name = os.path.basename(path)
+        for encoding in ENCODINGS:
+            target = os.path.join(self.cache_dir, f"{name}.{sha256[:16]}.{encoding}")
+            if not os.path.exists(target):
+                with open(path, 'rb') as f:
+                    payload = compress(f.read(), encoding, best=True)
+                tmp_path = f"{target}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(payload)
+                os.replace(tmp_path, target)
+            variants[encoding] = target
+        return variants
+
+    def _remove_stale_variants(self, keep: Iterable[str]):
+        keep = set(keep)
+        for filename in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, filename)
+            if path not in keep and filename.endswith(tuple(f".{encoding}" for encoding in ENCODINGS)):
+                os.remove(path)
+
+    def build(self) -> Dict[str, Any]:
+        """
+        Hashes the compressible files in the directory (re-hashing only those
+        whose size or mtime moved) and precompresses each new version.
+        Safe to run from several workers at once.
+        """
+        started = time.perf_counter()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        assets: Dict[str, StaticAsset] = {}
+        compressed = 0
+        with snapshot.file_lock(os.path.join(self.cache_dir, "build.lock")):
+            for filename in sorted(os.listdir(self.directory)):
+                path = os.path.realpath(os.path.join(self.directory, filename))
+                if not filename.endswith(PRECOMPRESS_SUFFIXES) or not os.path.isfile(path):
+                    continue
+                stat = os.stat(path)
+                if stat.st_size < MINIMUM_COMPRESS_BYTES:
+                    continue
+                previous = self.assets.get(path)
+                if previous is not None and (previous.size, previous.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                    assets[path] = previous
+                    continue
+                sha256 = snapshot.file_sha256(path)
+                missing = sum(not os.path.exists(os.path.join(self.cache_dir, f"{filename}.{sha256[:16]}.{encoding}"))
+                              for encoding in ENCODINGS)
+                assets[path] = StaticAsset(path, stat.st_size, stat.st_mtime_ns, sha256,
+                                           self._precompress(path, sha256))
+                compressed += missing
+            self._remove_stale_variants(variant for asset in assets.values() for variant in asset.variants.values())
+        self.assets = assets
+        stats = {"files": len(assets), "variants_written": compressed, "encodings": list(ENCODINGS),
+                 "bytes": sum(asset.size for asset in assets.values()),
+                 "compressed_bytes": {encoding: sum(os.path.getsize(asset.variants[encoding])
+                                                    for asset in assets.values()) for encoding in ENCODINGS},
+                 "build_seconds": round(time.perf_counter() - started, 3)}
+        return stats
+
+    def versioned_urls(self, prefix: str) -> List[Dict[str, Any]]:
+        """`?v=`-versioned URL (cacheable for good) and sizes of every precompressed file."""
+        return [{"name": os.path.basename(path), "url": f"{prefix}/{os.path.basename(path)}?v={asset.version}",
+                 "bytes": asset.size,
+                 **{f"{encoding}_bytes": os.path.getsize(variant) for encoding, variant in asset.variants.items()}}
+                for path, asset in sorted(self.assets.items())]
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        asset = self.assets.get(os.path.realpath(full_path))
+        if asset is None or (stat_result.st_size, stat_result.st_mtime_ns) != (asset.size, asset.mtime_ns):
+            return super().file_response(full_path, stat_result, scope, status_code)
+        request_headers = Headers(scope=scope)
+        encoding = negotiate_encoding(request_headers.get("accept-encoding"), asset.variants)
+        versioned = f"v={asset.version}".encode() in scope.get("query_string", b"").split(b"&")
+        # Validators come from the source file, so every coding of it carries the same Last-Modified
+        # (a variant's own mtime is when it happened to be compressed).
+        headers = {"ETag": variant_etag(asset.etag, encoding), "Vary": "Accept-Encoding",
+                   "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+                   "Cache-Control": IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL}
+        if_none_match = request_headers.get("if-none-match")
+        if etag_matches(if_none_match, headers["ETag"]) or \
+                (if_none_match is None and not_modified_since(request_headers.get("if-modified-since"),
+                                                              stat_result.st_mtime)):
+            return Response(status_code=304, headers=headers)
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+        if encoding is None:
+            return FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers,
+                                media_type=media_type)
+        headers["Content-Encoding"] = encoding
+        return FileResponse(asset.variants[encoding], status_code=status_code, headers=headers, media_type=media_type)
+
+
+class HTTPCacheMiddleware:
+    """
+    ASGI middleware for complete JSON responses to GET requests: adds a
+    strong ETag (the data version plus a hash of the body), answers a
+    matching If-None-Match with an empty 304, and compresses the body when
+    the client accepts it. Streaming and non-JSON responses, and responses
+    that already carry an ETag or Content-Encoding, pass through unchanged.
+    """
+
+    def __init__(self, app, version: Callable[[], Optional[str]], minimum_size: int = MINIMUM_COMPRESS_BYTES):
+        self.app = app
+        self.version = version
+        self.minimum_size = minimum_size
+
+    @staticmethod
+    def _eligible(start: Dict[str, Any]) -> bool:
+        headers = Headers(raw=start["headers"])
+        return start["status"] == 200 and headers.get("content-type", "").startswith("application/json") \
+            and "etag" not in headers and "content-encoding" not in headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        start: Optional[Dict[str, Any]] = None
+        body: List[bytes] = []
+        passthrough = False
+
+        async def buffered_send(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                start = message
+                if not self._eligible(start):
+                    passthrough = True
+                    await send(start)
+            elif message["type"] == "http.response.body":
+                body.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    await self._finish(start, b"".join(body), request_headers, send)
+            else:
+                await send(message)
+
+        await self.app(scope, receive, buffered_send)
+
+    async def _finish(self, start: Dict[str, Any], payload: bytes, request_headers: Headers, send):
+        encoding = negotiate_encoding(request_headers.get("accept-encoding"), ENCODINGS) \
+            if len(payload) >= self.minimum_size else None
+        etag = f'"{self.version() or "0"}-{hashlib.sha256(payload).hexdigest()[:16]}"'
+        headers = MutableHeaders(raw=list(start["headers"]))
+        headers["ETag"] = variant_etag(etag, encoding)
+        headers.add_vary_header("Accept-Encoding")
+        if "cache-control" not in headers:
+            headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+        if etag_matches(request_headers.get("if-none-match"), headers["ETag"]):
+            del headers["content-length"]
+            del headers["content-type"]
+            await send({**start, "status": 304, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        if encoding is not None:
+            payload = compress(payload, encoding)
+            headers["Content-Encoding"] = encoding
+        headers["Content-Length"] = str(len(payload))
+        await send({**start, "headers": headers.raw})
+        await send({"type": "http.response.body", "body": payload})
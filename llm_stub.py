@@ -0,0 +1,88 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+
+def stub_text(prompt: str) -> str:
+    return f"Stub summary generated from a {len(prompt)}-character prompt."
+
+
+def stub_message(model: str, prompt: str, text: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        content=[SimpleNamespace(type="text", text=text)],
+        model=model,
+        usage=SimpleNamespace(input_tokens=len(prompt) // 4, output_tokens=len(text) // 4),
+    )
+
+
+class StubStream:
+    """
+    Async stand-in for the `messages.stream(...)` context manager: the first
+    word arrives after `latency` seconds and each further word `token_delay`
+    seconds after the previous one.
+    """
+
+    def __init__(self, messages: "StubMessages", model: str, prompt: str):
+        self.messages = messages
+        self.model = model
+        self.prompt = prompt
+        self.text = stub_text(prompt)
+        self.text_stream = self._words()
+
+    async def _words(self):
+        await asyncio.sleep(self.messages.latency)
+        if self.messages.failure_rate and random.random() < self.messages.failure_rate:
+            raise RuntimeError("stub LLM: simulated overload")
+        words = self.text.split(" ")
+        for position, word in enumerate(words):
+            if position:
+                await asyncio.sleep(self.messages.token_delay)
+            yield word if position == 0 else " " + word
+
+    async def get_final_message(self):
+        async for _ in self.text_stream:
+            pass
+        return stub_message(self.model, self.prompt, self.text)
+
+    async def get_final_text(self) -> str:
+        return (await self.get_final_message()).content[0].text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.text_stream.aclose()
+
+
+class StubMessages:
+    """Async stand-in for `AsyncAnthropic().messages` that sleeps instead of calling the API."""
+
+    def __init__(self, latency: float, failure_rate: float, token_delay: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.token_delay = token_delay
+        self.calls = 0
+
+    async def create(self, model, max_tokens, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise RuntimeError("stub LLM: simulated overload")
+        prompt = messages[-1]["content"]
+        return stub_message(model, prompt, stub_text(prompt))
+
+    def stream(self, model, max_tokens, messages, **kwargs) -> StubStream:
+        self.calls += 1
+        return StubStream(self, model, messages[-1]["content"])
+
+
+class StubAsyncAnthropic:
+    """
+    Drop-in replacement for `anthropic.AsyncAnthropic` for local runs, load tests
+    and pre-warming dry runs. Every call takes `latency` seconds (to the
+    first word, when streaming, then `token_delay` per word) and fails with
+    probability `failure_rate`.
+    """
+
+    def __init__(self, latency: float = 1.0, failure_rate: float = 0.0, token_delay: float = 0.0):
+        self.messages = StubMessages(latency, failure_rate, token_delay)
@@ -0,0 +1,243 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format, and
+per-request stage timings for `Server-Timing` response headers.
+
+Metrics are created once at import time and register themselves in
+REGISTRY; `/metrics` serves `REGISTRY.render()`. Updates are thread-safe,
+since the pandas stages run in the thread pool.
+"""
+import bisect
+import contextlib
+import contextvars
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds, from a cache read to a slow LLM call.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Bytes, around the prompt budget.
+SIZE_BUCKETS = (1000, 2500, 5000, 10000, 20000, 40000, 80000, 160000)
+
+# Stages timed during the current request, as (stage, seconds); None outside a request.
+request_stages: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = \
+    contextvars.ContextVar("request_stages", default=None)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List["Metric"] = []
+
+    def register(self, metric: "Metric"):
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        return "".join(line + "\n" for metric in self.metrics for line in metric.render())
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """(suffix, label names, label values, value) for every series."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}"
+                  for suffix, names, values, value in self.samples()]
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [("", self.labelnames, key, value) for key, value in sorted(self.values.items())]
+
+
+class Gauge(Metric):
+    """A value that goes up and down; with `function`, read from it at render time (no labels)."""
+    kind = "gauge"
+
+    def __init__(self, *args, function: Optional[Callable[[], float]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[LabelValues, float] = {}
+        self.function = function
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextlib.contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        """Counts the block as in progress while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self):
+        if self.function is not None:
+            return [("", (), (), self.function())]
+        with self.lock:
+            return [("", self.labelnames, key, value) for key, value in sorted(self.values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: the count in each bucket (not cumulative, last one +Inf), the sum and the count.
+        self.series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[position] += 1
+            total[0] += value
+
+    def samples(self):
+        names = self.labelnames + ("le",)
+        samples = []
+        with self.lock:
+            for key, (counts, total) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += count
+                    samples.append(("_bucket", names, key + (_format_value(bound),), cumulative))
+                samples.append(("_sum", self.labelnames, key, total[0]))
+                samples.append(("_count", self.labelnames, key, cumulative))
+        return samples
+
+
+@contextlib.contextmanager
+def stage(histogram: Histogram, name: str) -> Iterator[None]:
+    """
+    Times a block as one stage: observed in `histogram` (labelled
+    stage=name) and added to the current request's Server-Timing entries.
+    Failed stages are timed too.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        histogram.observe(seconds, stage=name)
+        stages = request_stages.get()
+        if stages is not None:
+            stages.append((name, seconds))
+
+
+def server_timing(stages: List[Tuple[str, float]], total_seconds: float) -> str:
+    """A Server-Timing header value: each stage, then the whole request as `total`, in milliseconds."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages + [("total", total_seconds)])
+
+
+def route_label(scope, root_path: str) -> str:
+    """
+    The route template a request matched; for a mounted app (e.g. the static
+    /data files) the mount path, which routing appended to `root_path`.
+    """
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    mount_path = scope.get("root_path", "")[len(root_path):]
+    return mount_path or "unmatched"
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware that collects the stages timed while serving a request
+    into a Server-Timing header, and observes each request's duration in
+    `histogram` by route template and status. Streaming responses carry
+    the stages finished before their headers were sent.
+    """
+
+    def __init__(self, app, histogram: Histogram):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stages: List[Tuple[str, float]] = []
+        token = request_stages.set(stages)
+        started = time.perf_counter()
+        status = 500
+        # Routing extends root_path in place when a Mount matches; keep the value it started from.
+        root_path = scope.get("root_path", "")
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing",
+                                                     server_timing(stages, time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            self.histogram.observe(time.perf_counter() - started, route=route_label(scope, root_path), status=status)
+            request_stages.reset(token)
@@ -0,0 +1,187 @@
+"""
+Pre-generates water quality summaries for every active system, largest
+population first, so the public rarely waits on a cold LLM call.
+
+    python prewarm.py --concurrency 4 --rate 50
+    python prewarm.py --stub-latency 0.5 --limit 100   # dry run, no API calls
+
+Systems already in the summary store are always skipped, so a killed run
+picks up where it stopped. PREWARM_CHECKPOINT only records the systems that
+failed or have no data, saved every CHECKPOINT_EVERY systems and on exit.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List
+
+from fastapi import HTTPException
+
+import app
+from llm_stub import StubAsyncAnthropic
+
+PREWARM_CHECKPOINT = "prewarm_checkpoint.json"
+# Stub runs default to their own store and checkpoint so fake summaries never
+# end up in the real cache.
+STUB_SUMMARY_DB = "prewarm_stub.sqlite3"
+STUB_CHECKPOINT = "prewarm_checkpoint.stub.json"
+# Systems processed between checkpoint saves.
+CHECKPOINT_EVERY = 100
+
+
+class RateLimiter:
+    """Token bucket allowing `rate_per_minute` acquisitions per minute, with bursts up to `burst`."""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.interval = 60.0 / rate_per_minute
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.interval)
+
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    """Failed and no-data systems from earlier runs; completed ones are found in the summary store instead."""
+    if not os.path.exists(path):
+        return {"failed": {}, "no_data": []}
+    with open(path, 'r') as f:
+        checkpoint = json.load(f)
+    checkpoint.pop("completed", None)  # written by older versions
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def pending_pwsids(checkpoint: Dict[str, Any], retry_failed: bool) -> List[str]:
+    """Active systems ordered by population served, minus those already summarized or recorded in the checkpoint."""
+    systems = app.all_systems()
+    if systems is None:
+        return []
+    active = systems[systems['PWS_ACTIVITY_CODE'] == 'A']
+    ordered = active.sort_values('POPULATION_SERVED_COUNT', ascending=False, kind='mergesort')['PWSID']
+    skip = set(checkpoint["no_data"])
+    if not retry_failed:
+        skip |= set(checkpoint["failed"])
+    return [pwsid for pwsid in dict.fromkeys(ordered)
+            if pwsid not in skip and app.cached_summary(pwsid) is None]
+
+
+async def generate_with_retry(pwsid: str, limiter: RateLimiter, max_attempts: int, base_delay: float) -> str:
+    """
+    Generates one summary, retrying LLM failures with exponential backoff and
+    jitter. A missing-data 404 is not retried.
+    """
+    for attempt in range(1, max_attempts + 1):
+        await limiter.acquire()
+        try:
+            return await app.generate_and_cache_summary(pwsid)
+        except HTTPException as e:
+            if e.status_code == 404 or attempt == max_attempts:
+                raise
+            delay = base_delay * 2 ** (attempt - 1) * (0.5 + random.random())
+            print(f"{pwsid}: attempt {attempt} failed ({e.detail}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def prewarm(concurrency: int, rate_per_minute: float, max_attempts: int, base_delay: float,
+                  checkpoint_path: str, retry_failed: bool, limit: int = None):
+    checkpoint = load_checkpoint(checkpoint_path)
+    pwsids = pending_pwsids(checkpoint, retry_failed)
+    if limit:
+        pwsids = pwsids[:limit]
+    total = len(pwsids)
+    print(f"Pre-warming {total} summaries with concurrency {concurrency} at up to {rate_per_minute:g}/min.")
+    if not total:
+        return
+
+    # The app-wide cap must not be lower than the concurrency asked for here.
+    app.llm_semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate_per_minute, burst=concurrency)
+    queue: asyncio.Queue = asyncio.Queue()
+    for pwsid in pwsids:
+        queue.put_nowait(pwsid)
+    started = time.monotonic()
+    done = completed = 0
+
+    def report():
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0.0
+        eta = (total - done) / rate if rate else float('inf')
+        print(f"[{done}/{total}] {rate * 60:.1f} summaries/min, elapsed {elapsed:.0f}s, ETA {eta:.0f}s")
+
+    async def worker():
+        nonlocal done, completed
+        while not queue.empty():
+            pwsid = queue.get_nowait()
+            try:
+                await generate_with_retry(pwsid, limiter, max_attempts, base_delay)
+                completed += 1
+                checkpoint["failed"].pop(pwsid, None)
+            except HTTPException as e:
+                if e.status_code == 404:
+                    checkpoint["no_data"].append(pwsid)
+                else:
+                    checkpoint["failed"][pwsid] = str(e.detail)
+            except Exception as e:
+                # Anything else (a bad row, a store error) fails this system only; the run carries on.
+                print(f"{pwsid}: failed with {type(e).__name__}: {e}")
+                checkpoint["failed"][pwsid] = f"{type(e).__name__}: {e}"
+            done += 1
+            if done % CHECKPOINT_EVERY == 0:
+                save_checkpoint(checkpoint_path, checkpoint)
+            if done % 10 == 0 or done == total:
+                report()
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        save_checkpoint(checkpoint_path, checkpoint)
+    print(f"Done: {completed} completed, {len(checkpoint['failed'])} failed, "
+          f"{len(checkpoint['no_data'])} without data (checkpoint: {checkpoint_path}).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate missing water quality summaries.")
+    parser.add_argument("--concurrency", type=int, default=app.LLM_MAX_CONCURRENCY,
+                        help="LLM calls in flight at once.")
+    parser.add_argument("--rate", type=float, default=50.0, help="Maximum LLM requests per minute.")
+    parser.add_argument("--max-attempts", type=int, default=5, help="Attempts per system before giving up.")
+    parser.add_argument("--backoff", type=float, default=2.0, help="Base retry delay in seconds (doubles per attempt).")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file used to resume.")
+    parser.add_argument("--summary-db", default=None, help="Summary store to fill (default: the app's store).")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry systems that failed in earlier runs.")
+    parser.add_argument("--limit", type=int, default=None, help="Only process the first N pending systems.")
+    parser.add_argument("--stub-latency", type=float, default=None,
+                        help="Use a local stub LLM with this latency (seconds) instead of the Anthropic API.")
+    parser.add_argument("--stub-failure-rate", type=float, default=0.0,
+                        help="Probability that a stub call fails (exercises retries).")
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or PREWARM_CHECKPOINT
+    app.SUMMARY_DB = args.summary_db or app.SUMMARY_DB
+    if args.stub_latency is not None:
+        app.client = StubAsyncAnthropic(latency=args.stub_latency, failure_rate=args.stub_failure_rate)
+        checkpoint_path = args.checkpoint or STUB_CHECKPOINT
+        app.SUMMARY_DB = args.summary_db or STUB_SUMMARY_DB
+    app.load_all_data()
+    app.open_summary_store()
+    asyncio.run(prewarm(args.concurrency, args.rate, args.max_attempts, args.backoff,
+                        checkpoint_path, args.retry_failed, limit=args.limit))
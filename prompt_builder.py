@@ -0,0 +1,147 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import sdwis_schema
+from sdwis_codes import CodeDecoder, normalize_code, value_type_for
+from sdwis_index import EVENT_DATE_COLUMNS
+
+# Columns that never help the model: bookkeeping, internal IDs and contact details.
+EXCLUDED_COLUMNS = {
+    'SUBMISSIONYEARQUARTER', 'PWSID',
+    'ADMIN_NAME', 'ORG_NAME', 'EMAIL_ADDR', 'PHONE_NUMBER', 'PHONE_EXT_NUMBER', 'FAX_NUMBER',
+    'ALT_PHONE_NUMBER', 'ADDRESS_LINE1', 'ADDRESS_LINE2',
+}
+EXCLUDED_SUFFIXES = ('_ID', '_REPORTED_DATE')
+
+# Per-code value counts list at most this many distinct values per column.
+MAX_COUNTED_VALUES = 6
+# Free-text values in the latest-records section are cut to this length.
+MAX_TEXT_CHARS = 200
+
+
+def _is_code_column(column: str, codes: CodeDecoder) -> bool:
+    return value_type_for(column) in codes or column.endswith(('_CODE', '_IND', '_STATUS', '_CATEGORY'))
+
+
+def _is_date_column(column: str) -> bool:
+    return column.endswith('_DATE')
+
+
+def _as_dates(series: pd.Series) -> pd.Series:
+    if sdwis_schema.is_date(series):
+        return series
+    return pd.to_datetime(series, format='%m/%d/%Y', errors='coerce')
+
+
+def _describe(column: str, value: Any, codes: CodeDecoder) -> str:
+    code = normalize_code(value)
+    description = codes.lookup.get(value_type_for(column), {}).get(code)
+    return f"{code} ({description})" if description and description != code else code
+
+
+def _format_value(column: str, value: Any, codes: CodeDecoder) -> str:
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d')
+    if _is_code_column(column, codes):
+        return _describe(column, value, codes)
+    text = normalize_code(value)
+    return text if len(text) <= MAX_TEXT_CHARS else text[:MAX_TEXT_CHARS] + '...'
+
+
+def split_columns(df: pd.DataFrame) -> Tuple[List[str], List[str]]:
+    """
+    Splits the non-excluded, not-entirely-null columns into those that vary
+    between rows and those holding one value on every row. Constant columns
+    are stated once per table instead of being repeated on each record.
+    """
+    varying, constant = [], []
+    for column in df.columns:
+        if column in EXCLUDED_COLUMNS or column.endswith(EXCLUDED_SUFFIXES):
+            continue
+        non_null = df[column].dropna()
+        if non_null.empty:
+            continue
+        if len(df) > 1 and len(non_null) == len(df) and non_null.nunique() == 1:
+            constant.append(column)
+        else:
+            varying.append(column)
+    return varying, constant
+
+
+def build_table_digest(name: str, title: str, df: pd.DataFrame, latest: pd.DataFrame, codes: CodeDecoder,
+                       budget_chars: int, latest_n: int) -> str:
+    """
+    Condenses one table's rows for a system into a compact text digest:
+    record count, date ranges, decoded per-code counts over all rows, and the
+    `latest` records (at most `latest_n`, newest first) with null columns
+    left out and constant columns stated once.
+    Lines are dropped from the end (latest records first) until the digest
+    fits in `budget_chars`.
+    """
+    columns, constant_columns = split_columns(df)
+    event_column: Optional[str] = EVENT_DATE_COLUMNS.get(name)
+    if event_column not in df.columns:
+        event_column = None
+    header = [f"## {title} ({len(df)} records)"]
+    if constant_columns:
+        first = df.iloc[0]
+        header.append("All records: " + " | ".join(
+            f"{column}={_format_value(column, first[column], codes)}" for column in constant_columns))
+
+    date_lines = []
+    for column in columns if len(df) > latest_n else []:
+        if _is_date_column(column):
+            dates = _as_dates(df[column]).dropna()
+            if not dates.empty:
+                date_lines.append(f"{column}: {dates.min():%Y-%m-%d} to {dates.max():%Y-%m-%d}")
+    if date_lines:
+        header.append("Date ranges: " + "; ".join(date_lines))
+
+    count_lines = []
+    if len(df) > latest_n:
+        for column in columns:
+            if _is_date_column(column) or not _is_code_column(column, codes):
+                continue
+            counts = df[column].dropna().astype(object).map(normalize_code).value_counts()
+            shown = [f"{_describe(column, code, codes)} x{count}"
+                     for code, count in counts.head(MAX_COUNTED_VALUES).items()]
+            if len(counts) > MAX_COUNTED_VALUES:
+                shown.append(f"+{len(counts) - MAX_COUNTED_VALUES} more")
+            count_lines.append(f"- {column}: " + "; ".join(shown))
+    if count_lines:
+        header.append("Counts:")
+        header.extend(count_lines)
+
+    record_lines = []
+    for record in latest.head(latest_n)[columns].to_dict(orient='records'):
+        fields = [f"{column}={_format_value(column, value, codes)}"
+                  for column, value in record.items() if not pd.isna(value)]
+        record_lines.append("- " + " | ".join(fields))
+    if record_lines:
+        header.append(f"Latest {len(record_lines)} by {event_column}:" if event_column else "Records:")
+
+    lines = header + record_lines
+    while len(lines) > 1 and len("\n".join(lines)) > budget_chars:
+        lines.pop()
+    if len(lines) > 1 and lines[-1].endswith(':'):
+        lines.pop()  # a section label whose lines were all dropped
+    digest = "\n".join(lines)
+    if len(digest) > budget_chars:
+        digest = digest[:budget_chars - 3] + '...'
+    return digest
+
+
+def build_data_digest(frames: Dict[str, pd.DataFrame], latest: Dict[str, pd.DataFrame], codes: CodeDecoder,
+                      budget_chars: int, latest_n: int) -> str:
+    """
+    Digest of every non-empty table for a system, one section per table;
+    `latest` holds each table's most recent rows, newest first.
+    """
+    sections = []
+    for name, df in frames.items():
+        if df.empty:
+            continue
+        title = name.replace("SDWA_", "").replace("_", " ").title()
+        sections.append(build_table_digest(name, title, df, latest[name], codes, budget_chars, latest_n))
+    return "\n\n".join(sections)
@@ -0,0 +1,289 @@
+import sqlite3
+import threading
+import time
+from typing import Any, Collection, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+import sdwis_schema
+from sdwis_codes import EVAL_COLUMNS, OPEN_VIOLATION_STATUSES, SANITARY_SURVEY_REASON, SIGNIFICANT_DEFICIENCY
+
+# Indexes created on each materialized table, beyond the PWSID index every
+# PWSID-keyed table gets. Each entry is one (possibly composite) index.
+TABLE_INDEXES: Dict[str, List[Tuple[str, ...]]] = {
+    'SDWA_PUB_WATER_SYSTEMS': [('PWS_ACTIVITY_CODE', 'PWS_TYPE_CODE'), ('CITY_NAME',)],
+    'SDWA_GEOGRAPHIC_AREAS': [('COUNTY_SERVED', 'PWSID'), ('CITY_SERVED', 'PWSID'), ('ZIP_CODE_SERVED',)],
+    'SDWA_VIOLATIONS_ENFORCEMENT': [('PWSID', 'IS_HEALTH_BASED_IND', 'VIOLATION_STATUS'),
+                                    ('NON_COMPL_PER_BEGIN_DATE',), ('CONTAMINANT_CODE',)],
+    'SDWA_SITE_VISITS': [('PWSID', 'VISIT_REASON_CODE', 'VISIT_DATE'), ('VISIT_DATE',)],
+    'SDWA_FACILITIES': [('PWSID', 'IS_SOURCE_IND', 'WATER_TYPE_CODE')],
+    'SDWA_LCR_SAMPLES': [('SAMPLING_END_DATE',)],
+    'SDWA_EVENTS_MILESTONES': [('EVENT_ACTUAL_DATE',)],
+    'SDWA_REF_CODE_VALUES': [('VALUE_TYPE', 'VALUE_CODE')],
+}
+# Case-insensitive text filters; their indexes are built with the same collation.
+NOCASE_COLUMNS = {'COUNTY_SERVED', 'CITY_SERVED', 'CITY_NAME'}
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+INSERT_CHUNK_ROWS = 50000
+FETCH_ROWS = 500
+
+META_SCHEMA = """
+CREATE TABLE IF NOT EXISTS _tables (
+    name TEXT PRIMARY KEY,
+    version TEXT,
+    rows INTEGER NOT NULL,
+    built_at REAL NOT NULL
+);
+"""
+
+# One row per system matching the filters, with the facts regulators filter on.
+SYSTEM_COLUMNS = """
+    s.PWSID AS pwsid, s.PWS_NAME AS name, s.CITY_NAME AS city, s.PWS_TYPE_CODE AS system_type,
+    s.POPULATION_SERVED_COUNT AS population
+"""
+OPEN_HEALTH_VIOLATIONS_COLUMN = f"""
+    (SELECT COUNT(DISTINCT v.VIOLATION_ID) FROM SDWA_VIOLATIONS_ENFORCEMENT v
+     WHERE v.PWSID = s.PWSID AND v.IS_HEALTH_BASED_IND = 'Y'
+       AND v.VIOLATION_STATUS IN {OPEN_VIOLATION_STATUSES!r})
+"""
+LAST_SANITARY_SURVEY_COLUMN = f"""
+    (SELECT MAX(sv.VISIT_DATE) FROM SDWA_SITE_VISITS sv
+     WHERE sv.PWSID = s.PWSID AND sv.VISIT_REASON_CODE = '{SANITARY_SURVEY_REASON}')
+"""
+LAST_SURVEY_SIGNIFICANT = f"""
+    EXISTS (SELECT 1 FROM SDWA_SITE_VISITS sv
+            WHERE sv.PWSID = s.PWSID AND sv.VISIT_REASON_CODE = '{SANITARY_SURVEY_REASON}'
+              AND sv.VISIT_DATE = (SELECT MAX(last.VISIT_DATE) FROM SDWA_SITE_VISITS last
+                                   WHERE last.PWSID = s.PWSID
+                                     AND last.VISIT_REASON_CODE = '{SANITARY_SURVEY_REASON}')
+              AND '{SIGNIFICANT_DEFICIENCY}' IN ({', '.join('sv.' + column for column in EVAL_COLUMNS)}))
+"""
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def to_sql_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Copy of a table with SQLite-friendly columns: dates as sortable YYYY-MM-DD text, categoricals as values."""
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if sdwis_schema.is_date(series):
+            series = series.dt.strftime('%Y-%m-%d')
+        elif sdwis_schema.is_categorical(series):
+            series = series.astype(object)
+        columns[column] = series
+    return pd.DataFrame(columns)
+
+
+def system_columns(tables: Collection[str]) -> str:
+    """SELECT list for a systems query; facts from tables that were never loaded are NULL."""
+    violations = OPEN_HEALTH_VIOLATIONS_COLUMN if 'SDWA_VIOLATIONS_ENFORCEMENT' in tables else "NULL"
+    survey = LAST_SANITARY_SURVEY_COLUMN if 'SDWA_SITE_VISITS' in tables else "NULL"
+    return f"{SYSTEM_COLUMNS}, {violations} AS open_health_violations, {survey} AS last_sanitary_survey"
+
+
+def system_filters(tables: Collection[str], county: Optional[str] = None, city: Optional[str] = None, system_type: Optional[str] = None,
+                   active_only: bool = True, min_population: Optional[int] = None,
+                   open_health_violations: bool = False, violation_since: Optional[str] = None,
+                   contaminant_code: Optional[str] = None, significant_deficiency: bool = False,
+                   source_water_type: Optional[str] = None) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    WHERE clauses (over `s`, the systems table) and their parameters for the
+    common regulator filters. Every join is an indexed EXISTS on PWSID. A
+    filter on a table that is not in `tables` matches no system.
+    """
+    clauses, params = [], {}
+
+    def exists(table: str, clause: str) -> str:
+        return clause if table in tables else "0"
+
+    if active_only:
+        clauses.append("s.PWS_ACTIVITY_CODE = 'A'")
+    if system_type:
+        clauses.append("s.PWS_TYPE_CODE = :system_type")
+        params["system_type"] = system_type
+    if min_population is not None:
+        clauses.append("s.POPULATION_SERVED_COUNT >= :min_population")
+        params["min_population"] = min_population
+    if county:
+        clauses.append(exists('SDWA_GEOGRAPHIC_AREAS', "EXISTS (SELECT 1 FROM SDWA_GEOGRAPHIC_AREAS g "
+                              "WHERE g.COUNTY_SERVED = :county COLLATE NOCASE AND g.PWSID = s.PWSID)"))
+        params["county"] = county
+    if city:
+        served = exists('SDWA_GEOGRAPHIC_AREAS', "EXISTS (SELECT 1 FROM SDWA_GEOGRAPHIC_AREAS g "
+                        "WHERE g.CITY_SERVED = :city COLLATE NOCASE AND g.PWSID = s.PWSID)")
+        clauses.append(f"(s.CITY_NAME = :city COLLATE NOCASE OR {served})")
+        params["city"] = city
+    if open_health_violations or violation_since or contaminant_code:
+        conditions = ["v.PWSID = s.PWSID"]
+        if open_health_violations:
+            conditions.append(f"v.IS_HEALTH_BASED_IND = 'Y' AND v.VIOLATION_STATUS IN {OPEN_VIOLATION_STATUSES!r}")
+        if violation_since:
+            conditions.append("v.NON_COMPL_PER_BEGIN_DATE >= :violation_since")
+            params["violation_since"] = violation_since
+        if contaminant_code:
+            conditions.append("v.CONTAMINANT_CODE = :contaminant_code")
+            params["contaminant_code"] = contaminant_code
+        clauses.append(exists('SDWA_VIOLATIONS_ENFORCEMENT',
+                              f"EXISTS (SELECT 1 FROM SDWA_VIOLATIONS_ENFORCEMENT v WHERE {' AND '.join(conditions)})"))
+    if significant_deficiency:
+        clauses.append(exists('SDWA_SITE_VISITS', LAST_SURVEY_SIGNIFICANT))
+    if source_water_type:
+        clauses.append(exists('SDWA_FACILITIES', "EXISTS (SELECT 1 FROM SDWA_FACILITIES f WHERE f.PWSID = s.PWSID "
+                              "AND f.IS_SOURCE_IND = 'Y' AND f.WATER_TYPE_CODE = :source_water_type)"))
+        params["source_water_type"] = source_water_type
+    return clauses, params
+
+
+class RegulatorDB:
+    """
+    The loaded tables materialized into SQLite, indexed on PWSID, county,
+    city and the event-date columns, for cross-table regulator queries.
+
+    Tables are rebuilt only when their source version changes. A rebuilt
+    table is written and indexed under a temporary name and renamed into
+    place in one transaction, so queries (WAL readers) keep using the old
+    copy until the new one is complete.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(META_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite3 connections must not be shared across threads."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def versions(self) -> Dict[str, Optional[str]]:
+        return {row["name"]: row["version"] for row in self._conn().execute("SELECT name, version FROM _tables")}
+
+    def has_table(self, name: str) -> bool:
+        return name in self.versions()
+
+    def materialize(self, name: str, df: pd.DataFrame, version: Optional[str]):
+        """Writes (or replaces) one table and its indexes."""
+        conn = self._conn()
+        building = f"{name}__building"
+        conn.execute(f"DROP TABLE IF EXISTS {_quote(building)}")
+        frame = to_sql_frame(df)
+        for start in range(0, max(len(frame), 1), INSERT_CHUNK_ROWS):
+            with conn:
+                conn.execute("BEGIN")
+                frame.iloc[start:start + INSERT_CHUNK_ROWS].to_sql(building, conn, index=False, if_exists='append')
+        # Index names carry the build time so they never clash with the live table's.
+        suffix = f"{int(time.time() * 1000)}"
+        indexes = ([('PWSID',)] if 'PWSID' in frame.columns else []) + TABLE_INDEXES.get(name, [])
+        for number, columns in enumerate(indexes):
+            if not all(column in frame.columns for column in columns):
+                continue
+            spec = ", ".join(_quote(column) + (" COLLATE NOCASE" if column in NOCASE_COLUMNS else "")
+                             for column in columns)
+            conn.execute(f"CREATE INDEX {_quote(f'ix_{name}_{number}_{suffix}')} ON {_quote(building)} ({spec})")
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(f"DROP TABLE IF EXISTS {_quote(name)}")
+            conn.execute(f"ALTER TABLE {_quote(building)} RENAME TO {_quote(name)}")
+            conn.execute("INSERT OR REPLACE INTO _tables (name, version, rows, built_at) VALUES (?, ?, ?, ?)",
+                         (name, version, len(frame), time.time()))
+        conn.execute("ANALYZE")
+
+    def drop(self, name: str):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(f"DROP TABLE IF EXISTS {_quote(name)}")
+            conn.execute("DELETE FROM _tables WHERE name = ?", (name,))
+
+    def sync(self, frames: Dict[str, pd.DataFrame], deferred: Dict[str, pa.Table],
+             versions: Dict[str, str]) -> List[str]:
+        """
+        Brings the database in line with the loaded tables: tables whose
+        version changed are rebuilt (deferred columns included) and tables no
+        longer loaded are dropped. Returns the names rebuilt.
+        """
+        stored = self.versions()
+        rebuilt = []
+        for name, df in frames.items():
+            if name in stored and stored[name] == versions.get(name):
+                continue
+            if name in deferred:
+                extra = deferred[name].to_pandas()
+                extra.index = df.index
+                df = df.join(extra)
+            started = time.perf_counter()
+            self.materialize(name, df, versions.get(name))
+            print(f"Regulator DB: materialized {name} ({len(df)} rows) in {time.perf_counter() - started:.2f}s.")
+            rebuilt.append(name)
+        for name in stored.keys() - frames.keys():
+            self.drop(name)
+        return rebuilt
+
+    def systems(self, after: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+                **filters: Any) -> List[Dict[str, Any]]:
+        """One page of systems matching `filters`, ordered by PWSID and starting after the `after` PWSID."""
+        return list(self.iter_systems(after=after, limit=limit, **filters))
+
+    def systems_query(self, after: Optional[str] = None, limit: Optional[int] = None,
+                      **filters: Any) -> Tuple[str, Dict[str, Any]]:
+        """SQL and parameters selecting the systems matching `filters`, over the tables materialized so far."""
+        tables = self.versions().keys()
+        clauses, params = system_filters(tables, **filters)
+        if after:
+            clauses.append("s.PWSID > :after")
+            params["after"] = after
+        sql = f"SELECT {system_columns(tables)} FROM SDWA_PUB_WATER_SYSTEMS s"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY s.PWSID"
+        if limit is not None:
+            sql += " LIMIT :limit"
+            params["limit"] = limit
+        return sql, params
+
+    def iter_systems(self, after: Optional[str] = None, limit: Optional[int] = None,
+                     **filters: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Streams the systems matching `filters` in PWSID order, reading rows
+        from the cursor in batches. The query is run before this returns, so
+        SQL errors are raised here rather than mid-stream. It gets its own
+        read-only connection, so the iterator may be advanced from any thread.
+        """
+        sql, params = self.systems_query(after=after, limit=limit, **filters)
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.execute(sql, params)
+        except Exception:
+            conn.close()
+            raise
+        return self._fetch_rows(conn, cursor)
+
+    @staticmethod
+    def _fetch_rows(conn: sqlite3.Connection, cursor: sqlite3.Cursor) -> Iterator[Dict[str, Any]]:
+        try:
+            while True:
+                rows = cursor.fetchmany(FETCH_ROWS)
+                if not rows:
+                    return
+                yield from (dict(row) for row in rows)
+        finally:
+            conn.close()
+
+    def explain(self, **filters: Any) -> List[str]:
+        """SQLite's query plan for a systems query, to check that it uses the indexes."""
+        sql, params = self.systems_query(**filters)
+        return [row["detail"] for row in self._conn().execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
@@ -0,0 +1,83 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Violations still open, and the site-visit reason and evaluation codes for a sanitary survey.
+OPEN_VIOLATION_STATUSES = ('Unaddressed', 'Addressed')
+SANITARY_SURVEY_REASON = 'SNSV'
+SIGNIFICANT_DEFICIENCY = 'S'
+EVAL_COLUMNS = (
+    'MANAGEMENT_OPS_EVAL_CODE', 'SOURCE_WATER_EVAL_CODE', 'SECURITY_EVAL_CODE', 'PUMPS_EVAL_CODE',
+    'OTHER_EVAL_CODE', 'COMPLIANCE_EVAL_CODE', 'DATA_VERIFICATION_EVAL_CODE', 'TREATMENT_EVAL_CODE',
+    'FINISHED_WATER_STOR_EVAL_CODE', 'DISTRIBUTION_EVAL_CODE', 'FINANCIAL_EVAL_CODE',
+)
+
+
+def value_type_for(column: str) -> str:
+    """SDWA_REF_CODE_VALUES.VALUE_TYPE describing a column (site-visit evaluations share one type)."""
+    if column.endswith('_EVAL_CODE'):
+        return 'SITE_VISIT_EVAL_TYPE_CODE'
+    return column
+
+
+def normalize_code(value: Any) -> str:
+    """Renders a code the way the reference table spells it (e.g. 3100.0 -> '3100')."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def build_code_lookup(ref_df: pd.DataFrame) -> Dict[str, Dict[str, str]]:
+    """Groups SDWA_REF_CODE_VALUES into {VALUE_TYPE: {VALUE_CODE: VALUE_DESCRIPTION}}."""
+    lookup: Dict[str, Dict[str, str]] = {}
+    for value_type, code, description in ref_df[['VALUE_TYPE', 'VALUE_CODE', 'VALUE_DESCRIPTION']].itertuples(
+            index=False):
+        lookup.setdefault(str(value_type), {}).setdefault(normalize_code(code), description)
+    return lookup
+
+
+class CodeDecoder:
+    """
+    Code -> description decoding over per-VALUE_TYPE dicts built once from
+    SDWA_REF_CODE_VALUES.
+
+    `decode` works on whole columns: it factorizes the column and looks up
+    each distinct code once, so decoding costs one dict probe per distinct
+    code rather than a reference-table scan per row.
+    """
+
+    def __init__(self, ref_df: Optional[pd.DataFrame] = None):
+        self.lookup: Dict[str, Dict[str, str]] = build_code_lookup(ref_df) if ref_df is not None else {}
+
+    def __contains__(self, value_type: str) -> bool:
+        return value_type in self.lookup
+
+    def describe(self, value_type: str, code: Any, missing: Optional[str] = None) -> Optional[str]:
+        """Description of one code, falling back to the code itself (or `missing` for null codes)."""
+        if code is None or pd.isna(code):
+            return missing
+        normalized = normalize_code(code)
+        return self.lookup.get(value_type, {}).get(normalized, normalized)
+
+    def describe_many(self, value_type: str, codes: Iterable[Any], missing: Optional[str] = None) -> List[Optional[str]]:
+        return [self.describe(value_type, code, missing) for code in codes]
+
+    def decode(self, series: pd.Series, value_type: Optional[str] = None, missing: Optional[str] = None) -> pd.Series:
+        """
+        Decodes a column of codes (object, numeric or categorical) into
+        descriptions. `value_type` defaults to the one for the column name.
+        """
+        value_type = value_type or value_type_for(str(series.name))
+        codes, uniques = pd.factorize(series)
+        described = np.array(self.describe_many(value_type, uniques) + [missing], dtype=object)
+        return pd.Series(described[codes], index=series.index, name=series.name)
+
+    def decode_columns(self, df: pd.DataFrame, columns: Dict[str, Optional[str]],
+                       missing: Optional[str] = None) -> pd.DataFrame:
+        """Copy of `df` with each of `columns` ({column: value_type or None}) decoded in place."""
+        decoded = df.copy()
+        for column, value_type in columns.items():
+            if column in decoded.columns:
+                decoded[column] = self.decode(decoded[column], value_type, missing)
+        return decoded
@@ -0,0 +1,199 @@
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import sdwis_schema
+
+# A partition index maps each PWSID to the [start, stop) row range it occupies
+# in a frame that has been sorted by PWSID. Looking a system up is then a dict
+# hit plus an iloc slice, instead of a boolean mask over the whole table.
+PartitionIndex = Dict[str, Tuple[int, int]]
+
+# The column that dates each record of an event-style table. Tables not listed
+# here (systems, facilities, service/geographic areas) describe entities.
+EVENT_DATE_COLUMNS = {
+    'SDWA_VIOLATIONS_ENFORCEMENT': 'NON_COMPL_PER_BEGIN_DATE',
+    'SDWA_LCR_SAMPLES': 'SAMPLING_END_DATE',
+    'SDWA_SITE_VISITS': 'VISIT_DATE',
+    'SDWA_EVENTS_MILESTONES': 'EVENT_ACTUAL_DATE',
+    'SDWA_PN_VIOLATION_ASSOC': 'NON_COMPL_PER_BEGIN_DATE',
+}
+
+
+# Event dates as int64 nanoseconds, with missing dates mapped after every real one.
+# Within a system's row range the keys ascend, so a time window is two binary searches.
+EventKeys = np.ndarray
+NO_EVENT_DATE = np.iinfo(np.int64).max
+
+# Mixes a second row hash into the first when fingerprinting (any odd 64-bit constant).
+FINGERPRINT_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def sort_by_pwsid(df: pd.DataFrame, date_column: Optional[str] = None) -> pd.DataFrame:
+    """
+    Returns the frame stably sorted by PWSID with a fresh RangeIndex. With a
+    `date_column`, each system's rows are also put in date order (missing last).
+    """
+    if date_column is not None and date_column not in df.columns:
+        date_column = None
+    if df['PWSID'].is_monotonic_increasing and isinstance(df.index, pd.RangeIndex):
+        if date_column is None or _dates_ascend_per_pwsid(df, date_column):
+            return df
+    if date_column is None:
+        return df.sort_values('PWSID', kind='mergesort').reset_index(drop=True)
+    # Sort on the parsed keys so MM/DD/YYYY text columns order by date too.
+    df = df.assign(_event_key=build_event_keys(df, date_column))
+    df = df.sort_values(['PWSID', '_event_key'], kind='mergesort').reset_index(drop=True)
+    return df.drop(columns='_event_key')
+
+
+def _dates_ascend_per_pwsid(df: pd.DataFrame, date_column: str) -> bool:
+    """Whether a PWSID-sorted frame already has each system's rows in date order."""
+    keys = build_event_keys(df, date_column)
+    pwsids = df['PWSID'].to_numpy()
+    return bool(np.all((keys[1:] >= keys[:-1]) | (pwsids[1:] != pwsids[:-1])))
+
+
+def build_partition_index(df: pd.DataFrame) -> PartitionIndex:
+    """
+    Builds the PWSID -> (start, stop) row-range index for a PWSID-sorted frame.
+    Rows with a missing PWSID are left out of the index.
+    """
+    pwsids = df['PWSID'].to_numpy()
+    if len(pwsids) == 0:
+        return {}
+    # Group boundaries are where the sorted key changes value.
+    boundaries = np.flatnonzero(pwsids[1:] != pwsids[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    stops = np.concatenate((boundaries, [len(pwsids)]))
+    return {
+        pwsids[start]: (int(start), int(stop))
+        for start, stop in zip(starts, stops)
+        if isinstance(pwsids[start], str)
+    }
+
+
+def slice_partition(df: pd.DataFrame, index: PartitionIndex, pwsid: str) -> pd.DataFrame:
+    """Returns the rows for a PWSID (empty frame if the system is not present)."""
+    bounds = index.get(pwsid)
+    if bounds is None:
+        return df.iloc[0:0]
+    return df.iloc[bounds[0]:bounds[1]]
+
+
+def build_event_keys(df: pd.DataFrame, date_column: str) -> EventKeys:
+    """Event-date keys for a frame sorted by `sort_by_pwsid(df, date_column)`."""
+    dates = df[date_column]
+    if not sdwis_schema.is_date(dates):
+        dates = pd.to_datetime(dates, format='%m/%d/%Y', errors='coerce')
+    keys = dates.to_numpy(dtype='datetime64[ns]').view(np.int64).copy()
+    keys[dates.isna().to_numpy()] = NO_EVENT_DATE
+    return keys
+
+
+def window_bounds(keys: EventKeys, bounds: Tuple[int, int], start: Optional[pd.Timestamp] = None,
+                  end: Optional[pd.Timestamp] = None) -> Tuple[int, int]:
+    """
+    Row range, inside a system's `bounds`, of the events dated from `start`
+    through `end` (both inclusive; either may be None for an open end).
+    Undated events are only included when neither end is given.
+    """
+    lo, hi = bounds
+    if start is None and end is None:
+        return lo, hi
+    span = keys[lo:hi]
+    first = 0 if start is None else int(np.searchsorted(span, start.value, side='left'))
+    if end is None:
+        last = int(np.searchsorted(span, NO_EVENT_DATE, side='left'))
+    else:
+        last = int(np.searchsorted(span, end.value, side='right'))
+    return lo + first, lo + max(first, last)
+
+
+def dated_stop(keys: EventKeys, bounds: Tuple[int, int]) -> int:
+    """End of the dated rows in a system's `bounds`; its undated rows, sorted last, start here."""
+    lo, hi = bounds
+    return lo + int(np.searchsorted(keys[lo:hi], NO_EVENT_DATE, side='left'))
+
+
+def slice_window(df: pd.DataFrame, index: PartitionIndex, keys: EventKeys, pwsid: str,
+                 start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """A system's rows dated within [start, end], in date order."""
+    bounds = index.get(pwsid)
+    if bounds is None:
+        return df.iloc[0:0]
+    lo, hi = window_bounds(keys, bounds, start, end)
+    return df.iloc[lo:hi]
+
+
+def partition_index_nbytes(index: PartitionIndex) -> int:
+    """Approximate memory held by a partition index (dict, keys and range tuples)."""
+    total = sys.getsizeof(index)
+    for key, bounds in index.items():
+        total += sys.getsizeof(key) + sys.getsizeof(bounds) + sum(sys.getsizeof(b) for b in bounds)
+    return total
+
+
+def index_all(frames: Dict[str, pd.DataFrame]) -> Tuple[Dict[str, pd.DataFrame], Dict[str, PartitionIndex], Dict[str, float]]:
+    """
+    Sorts every PWSID-keyed frame (event tables by date within each system)
+    and builds its partition index.
+    Returns the (possibly re-ordered) frames, the indexes and build statistics.
+    """
+    started = time.perf_counter()
+    sorted_frames: Dict[str, pd.DataFrame] = {}
+    indexes: Dict[str, PartitionIndex] = {}
+    for name, df in frames.items():
+        if 'PWSID' in df.columns:
+            df = sort_by_pwsid(df, EVENT_DATE_COLUMNS.get(name))
+            indexes[name] = build_partition_index(df)
+        sorted_frames[name] = df
+    return sorted_frames, indexes, partition_stats(indexes, time.perf_counter() - started)
+
+
+def partition_stats(indexes: Dict[str, PartitionIndex], build_seconds: float) -> Dict[str, float]:
+    return {
+        "build_seconds": round(build_seconds, 4),
+        "memory_bytes": sum(partition_index_nbytes(index) for index in indexes.values()),
+        "indexed_tables": len(indexes),
+        "indexed_systems": len(set().union(*indexes.values())) if indexes else 0,
+    }
+
+
+def build_event_index(frames: Dict[str, pd.DataFrame]) -> Dict[str, EventKeys]:
+    """Event-date keys for every event table in `frames` (as sorted by `index_all`)."""
+    return {name: build_event_keys(frames[name], column) for name, column in EVENT_DATE_COLUMNS.items()
+            if name in frames and column in frames[name].columns}
+
+
+def partition_fingerprints(df: pd.DataFrame, index: PartitionIndex,
+                           extra: Optional[pd.DataFrame] = None) -> Dict[str, int]:
+    """
+    Content fingerprint of each system's rows in a PWSID-sorted frame: the
+    wrapping sum of per-row hashes over its partition, so it changes when any
+    of the system's rows is added, removed or edited but not when rows are
+    merely reordered. `extra` holds more columns of the same rows (e.g. ones
+    kept out of the frame).
+    """
+    if not index:
+        return {}
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    if extra is not None:
+        hashes = hashes * FINGERPRINT_MULTIPLIER + pd.util.hash_pandas_object(extra, index=False).to_numpy()
+    totals = np.concatenate((np.zeros(1, dtype=np.uint64), np.cumsum(hashes, dtype=np.uint64)))
+    bounds = np.array(list(index.values()), dtype=np.int64)
+    return dict(zip(index.keys(), (totals[bounds[:, 1]] - totals[bounds[:, 0]]).tolist()))
+
+
+def combine_fingerprints(table_fingerprints: Dict[str, Dict[str, int]]) -> Dict[str, str]:
+    """One hex fingerprint per PWSID over its per-table fingerprints (missing tables count as empty)."""
+    parts = {name: pd.Series(fingerprints, dtype='uint64') for name, fingerprints in table_fingerprints.items()
+             if fingerprints}
+    if not parts:
+        return {}
+    wide = pd.concat(parts, names=['table', 'PWSID']).unstack('table', fill_value=0).sort_index(axis=1)
+    combined = pd.util.hash_pandas_object(wide, index=True).to_numpy()
+    return dict(zip(wide.index, (f"{value:016x}" for value in combined.tolist())))
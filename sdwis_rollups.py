@@ -0,0 +1,224 @@
+"""
+Statewide rollups of active water systems, overall and grouped by county
+served, system type, source water and owner type.
+
+Rollups are computed once at ingest from one row of facts per system. When a
+reload changes some systems, only their facts are recomputed, and only the
+groups those systems belonged to (before or after the change) are
+re-aggregated.
+"""
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import sdwis_index
+import sdwis_schema
+from sdwis_codes import (CodeDecoder, EVAL_COLUMNS, OPEN_VIOLATION_STATUSES, SANITARY_SURVEY_REASON,
+                         SIGNIFICANT_DEFICIENCY)
+
+# Rollup dimension -> the column grouping it. A system serving several
+# counties counts toward each of them.
+DIMENSIONS: Dict[str, str] = {
+    'county': 'COUNTY_SERVED',
+    'system_type': 'PWS_TYPE_CODE',
+    'source': 'GW_SW_CODE',
+    'owner_type': 'OWNER_TYPE_CODE',
+}
+# Group for systems with no code (or no county) on file.
+UNKNOWN = 'UNKNOWN'
+# Tables the facts are drawn from; a reload touching none of them leaves the rollups as they are.
+SOURCE_TABLES = ('SDWA_PUB_WATER_SYSTEMS', 'SDWA_VIOLATIONS_ENFORCEMENT', 'SDWA_SITE_VISITS',
+                 'SDWA_GEOGRAPHIC_AREAS')
+
+FACT_COLUMNS = ['population', 'violations', 'health_based_violations', 'open_violations',
+                'open_health_violations', 'surveyed', 'significant_deficiency']
+
+
+def _rows(df: pd.DataFrame, index: sdwis_index.PartitionIndex, pwsids: Optional[Iterable[str]]) -> pd.DataFrame:
+    """The rows of a PWSID-sorted frame for `pwsids` (all rows when None), gathered from their row ranges."""
+    if pwsids is None:
+        return df
+    ranges = [index[pwsid] for pwsid in pwsids if pwsid in index]
+    if not ranges:
+        return df.iloc[:0]
+    return df.iloc[np.concatenate([np.arange(start, stop) for start, stop in ranges])]
+
+
+def _codes(series: pd.Series) -> pd.Series:
+    """Codes as plain strings, with missing ones grouped under UNKNOWN."""
+    return series.astype(object).where(series.notna(), UNKNOWN).astype(str)
+
+
+def system_facts(frames: Dict[str, pd.DataFrame], indexes: Dict[str, sdwis_index.PartitionIndex],
+                 pwsids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    One row per active system (of `pwsids`, or all of them), indexed by
+    PWSID: its dimension codes, population served, distinct violations and
+    health-based violations, whether any (health-based) violation is still
+    open, and whether its latest sanitary survey found a significant
+    deficiency.
+    """
+    pwsids = None if pwsids is None else list(pwsids)
+    systems = _rows(frames['SDWA_PUB_WATER_SYSTEMS'], indexes.get('SDWA_PUB_WATER_SYSTEMS', {}), pwsids)
+    systems = systems[systems['PWS_ACTIVITY_CODE'] == 'A'].drop_duplicates('PWSID')
+    facts = pd.DataFrame({column: _codes(systems[column]).to_numpy()
+                          for column in DIMENSIONS.values() if column in systems},
+                         index=pd.Index(systems['PWSID'].to_numpy(), name='PWSID'))
+    facts['population'] = pd.to_numeric(systems['POPULATION_SERVED_COUNT'], errors='coerce').fillna(0) \
+        .astype(np.int64).to_numpy()
+
+    violations = frames.get('SDWA_VIOLATIONS_ENFORCEMENT')
+    if violations is not None:
+        violations = _rows(violations, indexes.get('SDWA_VIOLATIONS_ENFORCEMENT', {}), pwsids)
+        violations = violations[violations['PWSID'].isin(facts.index)]
+        violations = violations[['PWSID', 'VIOLATION_ID', 'IS_HEALTH_BASED_IND', 'VIOLATION_STATUS']] \
+            .drop_duplicates(['PWSID', 'VIOLATION_ID'])
+        health = (violations['IS_HEALTH_BASED_IND'] == 'Y').to_numpy()
+        open_ = violations['VIOLATION_STATUS'].isin(OPEN_VIOLATION_STATUSES).to_numpy()
+        per_system = pd.DataFrame({'violations': 1, 'health_based_violations': health,
+                                   'open_violations': open_, 'open_health_violations': health & open_},
+                                  index=violations['PWSID'].to_numpy()).groupby(level=0).sum()
+        facts = facts.join(per_system)
+
+    visits = frames.get('SDWA_SITE_VISITS')
+    if visits is not None:
+        visits = _rows(visits, indexes.get('SDWA_SITE_VISITS', {}), pwsids)
+        surveys = visits[(visits['VISIT_REASON_CODE'] == SANITARY_SURVEY_REASON) & visits['PWSID'].isin(facts.index)]
+        dates = surveys['VISIT_DATE']
+        if not sdwis_schema.is_date(dates):
+            dates = pd.to_datetime(dates, format=sdwis_schema.DATE_FORMAT, errors='coerce')
+        latest = surveys.assign(_date=dates)[dates.notna()].sort_values(['PWSID', '_date'], kind='mergesort') \
+            .drop_duplicates('PWSID', keep='last')
+        columns = [column for column in EVAL_COLUMNS if column in latest.columns]
+        deficient = (latest[columns] == SIGNIFICANT_DEFICIENCY).any(axis=1).to_numpy()
+        facts = facts.join(pd.DataFrame({'surveyed': True, 'significant_deficiency': deficient},
+                                        index=latest['PWSID'].to_numpy()))
+
+    for column in FACT_COLUMNS:
+        if column not in facts:
+            facts[column] = 0
+    facts[FACT_COLUMNS] = facts[FACT_COLUMNS].fillna(0).astype(np.int64)
+    facts[['open_violations', 'open_health_violations']] = facts[['open_violations', 'open_health_violations']] > 0
+    facts[['surveyed', 'significant_deficiency']] = facts[['surveyed', 'significant_deficiency']].astype(bool)
+    return facts
+
+
+def county_members(frames: Dict[str, pd.DataFrame], indexes: Dict[str, sdwis_index.PartitionIndex],
+                   facts: pd.DataFrame, pwsids: Optional[Iterable[str]] = None) -> pd.Series:
+    """County served by each system in `facts`, one entry per (PWSID, county); UNKNOWN when none is on file."""
+    areas = frames.get('SDWA_GEOGRAPHIC_AREAS')
+    pairs = pd.Series([], dtype=object, index=pd.Index([], dtype=object, name='PWSID'))
+    if areas is not None:
+        areas = _rows(areas, indexes.get('SDWA_GEOGRAPHIC_AREAS', {}), pwsids)
+        areas = areas[(areas['AREA_TYPE_CODE'] == 'CN') & areas['COUNTY_SERVED'].notna()]
+        areas = areas[areas['PWSID'].isin(facts.index)].drop_duplicates(['PWSID', 'COUNTY_SERVED'])
+        pairs = pd.Series(areas['COUNTY_SERVED'].astype(str).to_numpy(),
+                          index=pd.Index(areas['PWSID'].to_numpy(), name='PWSID'))
+    missing = facts.index.difference(pairs.index)
+    return pd.concat([pairs, pd.Series(UNKNOWN, index=missing)]).sort_index(kind='mergesort')
+
+
+def aggregate(facts: pd.DataFrame, groups: pd.Series) -> pd.DataFrame:
+    """Rollup metrics of `facts` per group; `groups` maps PWSID to group (a PWSID may repeat)."""
+    rows = facts.reindex(groups.index)
+    by = groups.to_numpy()
+    affected = rows['population'].where(rows['open_health_violations'], 0)
+    grouped = rows.assign(population_affected=affected).groupby(by, sort=True)
+    metrics = pd.DataFrame({
+        'systems': grouped.size(),
+        'population': grouped['population'].sum(),
+        'violations': grouped['violations'].sum(),
+        'health_based_violations': grouped['health_based_violations'].sum(),
+        'systems_with_open_violations': grouped['open_violations'].sum(),
+        'systems_with_open_health_violations': grouped['open_health_violations'].sum(),
+        'population_affected': grouped['population_affected'].sum(),
+        'surveyed_systems': grouped['surveyed'].sum(),
+        'significant_deficiency_systems': grouped['significant_deficiency'].sum(),
+    }).astype(np.int64)
+    metrics['deficiency_rate'] = (metrics['significant_deficiency_systems']
+                                  / metrics['surveyed_systems'].where(metrics['surveyed_systems'] > 0)).round(4)
+    metrics.index.name = 'code'
+    return metrics
+
+
+def _records(metrics: pd.DataFrame) -> List[Dict[str, Any]]:
+    records = metrics.reset_index().to_dict('records')
+    for record in records:
+        if pd.isna(record['deficiency_rate']):
+            record['deficiency_rate'] = None
+    return records
+
+
+class Rollups:
+    """
+    Materialized rollups: per-system facts, each system's group in every
+    dimension, and the aggregated metrics per group and statewide. Instances
+    are not modified once built; `updated` returns a new one, so the live
+    copy can keep serving requests during a reload.
+    """
+
+    def __init__(self, facts: pd.DataFrame, members: Dict[str, pd.Series], groups: Dict[str, pd.DataFrame],
+                 build_seconds: float):
+        self.facts = facts
+        self.members = members
+        self.groups = groups
+        self.state = aggregate(facts, pd.Series('STATE', index=facts.index))
+        self.stats = {"systems": len(facts), "groups": {dimension: len(frame) for dimension, frame in groups.items()},
+                      "build_seconds": round(build_seconds, 4)}
+
+    @staticmethod
+    def _members(frames: Dict[str, pd.DataFrame], indexes: Dict[str, sdwis_index.PartitionIndex],
+                 facts: pd.DataFrame, pwsids: Optional[List[str]] = None) -> Dict[str, pd.Series]:
+        members = {dimension: facts[column] for dimension, column in DIMENSIONS.items() if column in facts}
+        members['county'] = county_members(frames, indexes, facts, pwsids)
+        return members
+
+    @classmethod
+    def build(cls, frames: Dict[str, pd.DataFrame], indexes: Dict[str, sdwis_index.PartitionIndex]) -> 'Rollups':
+        started = time.perf_counter()
+        facts = system_facts(frames, indexes)
+        members = cls._members(frames, indexes, facts)
+        groups = {dimension: aggregate(facts, groups) for dimension, groups in members.items()}
+        return cls(facts, members, groups, time.perf_counter() - started)
+
+    def updated(self, frames: Dict[str, pd.DataFrame], indexes: Dict[str, sdwis_index.PartitionIndex],
+                pwsids: Iterable[str]) -> 'Rollups':
+        """
+        Rollups after the rows of `pwsids` changed: their facts are rebuilt
+        and only the groups they left or joined are re-aggregated.
+        """
+        started = time.perf_counter()
+        pwsids = sorted(set(pwsids))
+        changed = system_facts(frames, indexes, pwsids)
+        facts = pd.concat([self.facts.drop(pwsids, errors='ignore'), changed]).sort_index(kind='mergesort')
+        changed_members = self._members(frames, indexes, changed, pwsids)
+        members, groups, regrouped = {}, {}, {}
+        for dimension, old in self.members.items():
+            new = changed_members.get(dimension, pd.Series([], dtype=object))
+            affected = set(old[old.index.isin(pwsids)]) | set(new)
+            members[dimension] = pd.concat([old[~old.index.isin(pwsids)], new]).sort_index(kind='mergesort')
+            subset = members[dimension][members[dimension].isin(affected)]
+            kept = self.groups[dimension].drop(list(affected), errors='ignore')
+            groups[dimension] = pd.concat([kept, aggregate(facts, subset)]).sort_index()
+            regrouped[dimension] = len(affected)
+        rollups = Rollups(facts, members, groups, time.perf_counter() - started)
+        rollups.stats["regrouped"] = regrouped
+        return rollups
+
+    def totals(self) -> Dict[str, Any]:
+        """Statewide metrics."""
+        record = _records(self.state)[0]
+        record.pop('code')
+        return record
+
+    def records(self, dimension: str, decoder: Optional[CodeDecoder] = None) -> List[Dict[str, Any]]:
+        """One record per group of `dimension`, with the code's description as `label` when a decoder is given."""
+        metrics = self.groups[dimension]
+        records = _records(metrics)
+        if decoder is not None:
+            labels = decoder.describe_many(DIMENSIONS[dimension], metrics.index)
+            for record, label in zip(records, labels):
+                record['label'] = label
+        return records
@@ -0,0 +1,114 @@
+from typing import Any, Dict, List
+
+import pandas as pd
+import pyarrow as pa
+
+# Column kinds. Name rules in `column_kind` cover the SDWIS exports; COLUMN_KINDS
+# overrides them where a name is misleading.
+KEY = "key"            # looked up by value; stays a plain string column
+DATE = "date"          # MM/DD/YYYY, parsed once to datetime64
+CODE = "code"          # low-cardinality code or flag; categorical
+INTEGER = "integer"    # IDs and counts; downcast to the smallest integer type
+AUTO = "auto"          # left as read
+
+DATE_FORMAT = "%m/%d/%Y"
+
+COLUMN_KINDS: Dict[str, str] = {
+    'PWSID': KEY,
+    'SEASON_BEGIN_DATE': CODE,  # 'MM-DD' without a year
+    'SEASON_END_DATE': CODE,
+    'SUBMISSIONYEARQUARTER': CODE,
+    'UNIT_OF_MEASURE': CODE,
+    'PRIMACY_TYPE': CODE,
+}
+CODE_SUFFIXES = ('_CODE', '_IND', '_STATUS', '_CATEGORY', '_TIER')
+INTEGER_SUFFIXES = ('_ID', '_COUNT', '_CNT')
+
+# Remaining text columns whose distinct-value ratio is at or below this become categoricals.
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+# Columns no endpoint reads on the hot path. They are left out of the in-memory
+# frames and read per system from the memory-mapped snapshot when needed.
+DEFERRED_COLUMNS: Dict[str, List[str]] = {
+    'SDWA_PUB_WATER_SYSTEMS': ['ORG_NAME', 'ADMIN_NAME', 'EMAIL_ADDR', 'PHONE_NUMBER', 'PHONE_EXT_NUMBER',
+                               'FAX_NUMBER', 'ALT_PHONE_NUMBER', 'ADDRESS_LINE1', 'ADDRESS_LINE2'],
+    'SDWA_EVENTS_MILESTONES': ['EVENT_COMMENTS_TEXT'],
+    'SDWA_SITE_VISITS': ['VISIT_COMMENTS'],
+}
+
+
+def is_date(series: pd.Series) -> bool:
+    """Parsed date column: datetime64, or an Arrow timestamp when tables are Arrow-backed (SHARED_TABLES)."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.ArrowDtype):
+        return pa.types.is_timestamp(dtype.pyarrow_dtype) or pa.types.is_date(dtype.pyarrow_dtype)
+    return pd.api.types.is_datetime64_any_dtype(dtype)
+
+
+def is_categorical(series: pd.Series) -> bool:
+    """Categorical column, or its Arrow counterpart (a dictionary-encoded column)."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.ArrowDtype):
+        return pa.types.is_dictionary(dtype.pyarrow_dtype)
+    return isinstance(dtype, pd.CategoricalDtype)
+
+
+def column_kind(column: str) -> str:
+    if column in COLUMN_KINDS:
+        return COLUMN_KINDS[column]
+    if column.endswith('_DATE'):
+        return DATE
+    if column.endswith(CODE_SUFFIXES):
+        return CODE
+    if column.endswith(INTEGER_SUFFIXES):
+        return INTEGER
+    return AUTO
+
+
+def _downcast_integer(series: pd.Series) -> pd.Series:
+    """Smallest integer dtype for whole-number columns; anything else is returned unchanged."""
+    if not pd.api.types.is_numeric_dtype(series) or series.isna().any():
+        return series
+    if pd.api.types.is_float_dtype(series) and not (series % 1 == 0).all():
+        return series
+    return pd.to_numeric(series, downcast='integer')
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts each column to the dtype its kind calls for: dates to datetime64
+    (parsed once with DATE_FORMAT), codes to categoricals, whole-number IDs
+    and counts to the smallest integer type, and repetitive text to
+    categoricals. Values that fail to parse as dates are reported.
+    """
+    if df.empty:
+        return df
+    for column in df.columns:
+        kind = column_kind(column)
+        series = df[column]
+        if kind == DATE and not pd.api.types.is_datetime64_any_dtype(series):
+            parsed = pd.to_datetime(series, format=DATE_FORMAT, errors='coerce')
+            lost = series[series.notna() & parsed.isna()]
+            if len(lost):
+                print(f"Warning: {len(lost)} values in {column} are not {DATE_FORMAT} dates and were dropped "
+                      f"(e.g. {lost.iloc[0]!r}).")
+            df[column] = parsed
+        elif kind == CODE and series.notna().any():
+            df[column] = series.astype('category')
+        elif kind == INTEGER:
+            df[column] = _downcast_integer(series)
+        # Text left over (including alphanumeric IDs) is stored as a categorical when repetitive enough.
+        if kind != KEY and df[column].dtype == object:
+            if df[column].nunique(dropna=True) / len(df) <= CATEGORY_MAX_UNIQUE_RATIO:
+                df[column] = df[column].astype('category')
+    return df
+
+
+def memory_report(df: pd.DataFrame) -> Dict[str, Any]:
+    """Deep in-memory size of a frame, in total and per column (with dtypes)."""
+    usage = df.memory_usage(deep=True, index=True)
+    return {
+        "rows": len(df),
+        "bytes": int(usage.sum()),
+        "columns": {column: {"dtype": str(df[column].dtype), "bytes": int(usage[column])} for column in df.columns},
+    }
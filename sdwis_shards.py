@@ -0,0 +1,301 @@
+"""
+Per-state shards of the PWSID-keyed tables, so a national deployment never
+has to hold every state in memory.
+
+The layout is the one `filter_sdwis_to_georgia.py --partition` writes: one
+directory of CSVs per PWSID state prefix, plus national reference data under
+SHARED_PARTITION. A state's tables are loaded (from their columnar snapshots
+when fresh) the first time one of its systems is requested, and the least
+recently used states are evicted once the loaded shards exceed the memory
+budget. Per-system fingerprints outlive eviction, so checking whether a
+cached summary is still current does not reload the state.
+
+The statewide lookups (search, map, service areas) need every system, so
+each state's systems and served areas, plus its violation count per system,
+are kept resident as the national directory.
+"""
+import functools
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+import sdwis_index
+import sdwis_schema
+import snapshot
+from filter_sdwis_to_georgia import SHARED_PARTITION
+
+# PWSIDs start with a two-character state (or EPA region) code; anything else names no shard.
+STATE_PATTERN = re.compile(r'^[A-Z0-9]{2}$')
+# Tables every state contributes to the national directory in full; of the violations, only per-system counts.
+DIRECTORY_TABLES = ('SDWA_PUB_WATER_SYSTEMS', 'SDWA_GEOGRAPHIC_AREAS')
+VIOLATIONS_TABLE = 'SDWA_VIOLATIONS_ENFORCEMENT'
+
+
+def state_of(pwsid: str) -> str:
+    return pwsid[:2]
+
+
+class Shard:
+    """One state's tables, with the same per-table lookup structures the app keeps for its global tables."""
+
+    def __init__(self, state: str, dataframes: Dict[str, pd.DataFrame], deferred_columns: Dict[str, pa.Table],
+                 pwsid_index: Dict[str, sdwis_index.PartitionIndex], event_keys: Dict[str, sdwis_index.EventKeys],
+                 pwsid_fingerprints: Dict[str, str], versions: Optional[Dict[str, str]] = None,
+                 load_seconds: float = 0.0):
+        self.state = state
+        self.dataframes = dataframes
+        self.deferred_columns = deferred_columns
+        self.pwsid_index = pwsid_index
+        self.event_keys = event_keys
+        self.pwsid_fingerprints = pwsid_fingerprints
+        self.versions = versions or {}
+        self.load_seconds = load_seconds
+        self.nbytes = 0
+
+    def measure(self) -> int:
+        """In-memory size of the frames and lookup structures (deferred columns are memory-mapped, not counted)."""
+        self.nbytes = sum(int(df.memory_usage(deep=True).sum()) for df in self.dataframes.values()) \
+            + sum(sdwis_index.partition_index_nbytes(index) for index in self.pwsid_index.values()) \
+            + sum(keys.nbytes for keys in self.event_keys.values())
+        return self.nbytes
+
+
+EMPTY_SHARD = Shard("", {}, {}, {}, {}, {})
+
+
+def load_shard(state: str, data_dir: str, snapshot_dir: str, prepare: Callable[[str, pd.DataFrame], pd.DataFrame],
+               arrow_backed: bool = False) -> Shard:
+    """Loads every CSV in a state's directory and builds its partition indexes, event keys and fingerprints."""
+    started = time.perf_counter()
+    frames: Dict[str, pd.DataFrame] = {}
+    deferred: Dict[str, pa.Table] = {}
+    versions: Dict[str, str] = {}
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith(".csv"):
+            continue
+        name = os.path.splitext(filename)[0]
+        df, _, deferred_table = snapshot.load_table(snapshot_dir, name, os.path.join(data_dir, filename),
+                                                    functools.partial(prepare, name),
+                                                    defer=sdwis_schema.DEFERRED_COLUMNS.get(name, ()),
+                                                    arrow_backed=arrow_backed)
+        frames[name] = df
+        versions[name] = snapshot.read_manifest(snapshot_dir, name).get("csv_sha256")
+        if deferred_table is not None:
+            deferred[name] = deferred_table
+    sorted_frames, indexes, _ = sdwis_index.index_all(frames)
+    frames.update(sorted_frames)
+    fingerprints = {name: sdwis_index.partition_fingerprints(
+        frames[name], index, deferred[name].to_pandas() if name in deferred else None)
+        for name, index in indexes.items()}
+    shard = Shard(state, frames, deferred, indexes, sdwis_index.build_event_index(frames),
+                  sdwis_index.combine_fingerprints(fingerprints), versions, time.perf_counter() - started)
+    shard.measure()
+    return shard
+
+
+class DirectoryPart:
+    """One state's share of the national directory, with the CSV sizes and mtimes it was read from."""
+
+    def __init__(self, files: Dict[str, Tuple[int, int]], frames: Dict[str, pd.DataFrame],
+                 violation_counts: pd.Series):
+        self.files = files
+        self.frames = frames
+        self.violation_counts = violation_counts
+
+
+def _file_stats(data_dir: str, names) -> Dict[str, Tuple[int, int]]:
+    stats = {}
+    for name in names:
+        path = os.path.join(data_dir, f"{name}.csv")
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            stats[name] = (stat.st_size, stat.st_mtime_ns)
+    return stats
+
+
+class ShardStore:
+    """
+    Loads state shards on first access and keeps the most recently used ones
+    within `memory_budget_bytes`. The shard being returned is never evicted,
+    so one state larger than the budget still loads. Thread-safe: concurrent
+    requests for a state that is not loaded wait for a single load.
+    """
+
+    def __init__(self, root: str, snapshot_root: str, prepare: Callable[[str, pd.DataFrame], pd.DataFrame],
+                 memory_budget_bytes: int, arrow_backed: bool = False):
+        self.root = root
+        self.snapshot_root = snapshot_root
+        self.prepare = prepare
+        self.memory_budget_bytes = memory_budget_bytes
+        self.arrow_backed = arrow_backed
+        self.shards: "OrderedDict[str, Shard]" = OrderedDict()
+        # Per state: the table versions and per-system fingerprints last loaded, kept after eviction.
+        self.versions: Dict[str, Dict[str, str]] = {}
+        self.fingerprints: Dict[str, Dict[str, str]] = {}
+        self.directory_parts: Dict[str, DirectoryPart] = {}
+        self.lock = threading.Lock()
+        self.loading: Dict[str, threading.Lock] = {}
+        self.stats: Dict[str, Any] = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "load_seconds": 0.0,
+                                      "last_load": None}
+
+    def states(self) -> List[str]:
+        """States with a shard directory under the root."""
+        return sorted(entry for entry in os.listdir(self.root)
+                      if STATE_PATTERN.match(entry) and os.path.isdir(os.path.join(self.root, entry)))
+
+    def _resident(self, state: str) -> Optional[Shard]:
+        """The loaded shard for a state, marked most recently used (call with the lock held)."""
+        shard = self.shards.get(state)
+        if shard is not None:
+            self.shards.move_to_end(state)
+            self.stats["hits"] += 1
+        return shard
+
+    def has_state(self, state: str) -> bool:
+        return bool(STATE_PATTERN.match(state)) and os.path.isdir(os.path.join(self.root, state))
+
+    def get(self, state: str) -> Shard:
+        """A state's shard, loading it if needed; EMPTY_SHARD for a state with no data."""
+        if not self.has_state(state):
+            return EMPTY_SHARD
+        with self.lock:
+            shard = self._resident(state)
+            if shard is not None:
+                return shard
+            state_lock = self.loading.setdefault(state, threading.Lock())
+        with state_lock:
+            with self.lock:
+                shard = self._resident(state)
+                if shard is not None:
+                    return shard
+                self.stats["misses"] += 1
+            shard = load_shard(state, os.path.join(self.root, state), os.path.join(self.snapshot_root, state), self.prepare,
+                               self.arrow_backed)
+            with self.lock:
+                self.shards[state] = shard
+                self.versions[state] = shard.versions
+                self.fingerprints[state] = shard.pwsid_fingerprints
+                self.stats["loads"] += 1
+                self.stats["load_seconds"] += shard.load_seconds
+                self.stats["last_load"] = {"state": state, "seconds": round(shard.load_seconds, 3),
+                                           "bytes": shard.nbytes, "systems": len(shard.pwsid_fingerprints)}
+                self._evict(keep=state)
+            print(f"Shard {state} loaded in {shard.load_seconds:.2f}s ({shard.nbytes / 2**20:.0f} MiB, "
+                  f"{len(shard.pwsid_fingerprints)} systems); {len(self.shards)} shards resident, "
+                  f"{self.resident_bytes() / 2**20:.0f} of {self.memory_budget_bytes / 2**20:.0f} MiB.")
+            return shard
+
+    def resident_bytes(self) -> int:
+        return sum(shard.nbytes for shard in self.shards.values())
+
+    def _evict(self, keep: str):
+        """Drops least recently used shards until the resident ones fit the budget (call with the lock held)."""
+        while self.resident_bytes() > self.memory_budget_bytes and len(self.shards) > 1:
+            state = next(iter(self.shards))
+            if state == keep:
+                self.shards.move_to_end(state)
+                continue
+            evicted = self.shards.pop(state)
+            self.stats["evictions"] += 1
+            print(f"Shard {state} evicted ({evicted.nbytes / 2**20:.0f} MiB).")
+
+    def fingerprint(self, pwsid: str) -> Optional[str]:
+        """A system's content fingerprint; loads its state only if it was never loaded before."""
+        state = state_of(pwsid)
+        if not self.has_state(state):
+            return None
+        with self.lock:
+            fingerprints = self.fingerprints.get(state)
+        if fingerprints is None:
+            fingerprints = self.get(state).pwsid_fingerprints
+        return fingerprints.get(pwsid)
+
+    def stale_states(self) -> List[str]:
+        """Previously loaded states whose CSVs were added, removed or changed since."""
+        with self.lock:
+            versions = dict(self.versions)
+        stale = []
+        for state, loaded in versions.items():
+            data_dir = os.path.join(self.root, state)
+            files = {os.path.splitext(filename)[0]: os.path.join(data_dir, filename)
+                     for filename in (os.listdir(data_dir) if os.path.isdir(data_dir) else [])
+                     if filename.endswith(".csv")}
+            snapshot_dir = os.path.join(self.snapshot_root, state)
+            if files.keys() != loaded.keys() or not all(
+                    snapshot.is_current(snapshot_dir, name, path, loaded[name]) for name, path in files.items()):
+                stale.append(state)
+        return stale
+
+    def refresh(self) -> List[str]:
+        """Forgets every stale state, so its next request reloads it. Returns those states."""
+        stale = self.stale_states()
+        with self.lock:
+            for state in stale:
+                self.shards.pop(state, None)
+                self.versions.pop(state, None)
+                self.fingerprints.pop(state, None)
+        return stale
+
+    def _directory_files(self, state: str) -> Dict[str, Tuple[int, int]]:
+        return _file_stats(os.path.join(self.root, state), DIRECTORY_TABLES + (VIOLATIONS_TABLE,))
+
+    def _load_directory_part(self, state: str, files: Dict[str, Tuple[int, int]]) -> DirectoryPart:
+        """Reads a state's directory tables through its snapshots (which its shard load then reuses)."""
+        data_dir, snapshot_dir = os.path.join(self.root, state), os.path.join(self.snapshot_root, state)
+        frames = {name: snapshot.load_table(snapshot_dir, name, os.path.join(data_dir, f"{name}.csv"),
+                                            functools.partial(self.prepare, name), arrow_backed=self.arrow_backed)[0]
+                  for name in DIRECTORY_TABLES if name in files}
+        counts = pd.Series(dtype='int64')
+        if VIOLATIONS_TABLE in files:
+            pwsids = snapshot.read_column(snapshot_dir, VIOLATIONS_TABLE,
+                                          os.path.join(data_dir, f"{VIOLATIONS_TABLE}.csv"), 'PWSID')
+            counts = pwsids.astype(str).value_counts().astype('int64')
+        return DirectoryPart(files, frames, counts)
+
+    def directory_changed(self) -> bool:
+        """Whether a state was added or removed, or one of its directory CSVs changed, since the last refresh."""
+        states = self.states()
+        return set(states) != set(self.directory_parts) or any(
+            self._directory_files(state) != self.directory_parts[state].files for state in states)
+
+    def refresh_directory(self) -> List[str]:
+        """Re-reads the directory tables of new and changed states and forgets removed ones. Returns those states."""
+        states = self.states()
+        changed = sorted(set(self.directory_parts) - set(states))
+        for state in changed:
+            del self.directory_parts[state]
+        for state in states:
+            files = self._directory_files(state)
+            part = self.directory_parts.get(state)
+            if part is None or part.files != files:
+                self.directory_parts[state] = self._load_directory_part(state, files)
+                changed.append(state)
+        return changed
+
+    def directory(self) -> Tuple[Dict[str, pd.DataFrame], pd.Series]:
+        """Every state's directory tables concatenated, and the violation count per system."""
+        parts = [self.directory_parts[state] for state in sorted(self.directory_parts)]
+        frames = {}
+        for name in DIRECTORY_TABLES:
+            pieces = [part.frames[name] for part in parts if name in part.frames]
+            if pieces:
+                frames[name] = pd.concat(pieces, ignore_index=True)
+        counts = [part.violation_counts for part in parts if len(part.violation_counts)]
+        return frames, pd.concat(counts) if counts else pd.Series(dtype='int64')
+
+    def report(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counts, load times and the resident shards, most recently used last."""
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {**self.stats, "load_seconds": round(self.stats["load_seconds"], 3),
+                    "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                    "memory_budget_bytes": self.memory_budget_bytes, "resident_bytes": self.resident_bytes(),
+                    "resident": [{"state": state, "bytes": shard.nbytes, "systems": len(shard.pwsid_fingerprints)}
+                                 for state, shard in self.shards.items()],
+                    "known_states": len(self.fingerprints), "available_states": len(self.states())}
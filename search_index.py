@@ -0,0 +1,161 @@
+"""
+Typeahead search over water systems by name, PWSID, city and the cities and
+counties they serve.
+
+    python search_index.py --systems 150000   # latency benchmark on a synthetic national-size index
+"""
+import argparse
+import bisect
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Where a query term matched, best first; a result's quality is the sum over its terms.
+FIELD_PWSID = 0
+FIELD_NAME_START = 0
+FIELD_NAME = 1
+FIELD_CITY = 2
+FIELD_SERVED = 3
+NO_MATCH = 255
+# Inactive systems rank after every active one with the same terms matched.
+INACTIVE_PENALTY = 16
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+_NON_ALNUM = re.compile(r'[^0-9A-Z]+')
+
+
+def tokenize(text: Any) -> List[str]:
+    """Upper-cased alphanumeric words; punctuation separates words."""
+    if not isinstance(text, str):
+        return []
+    return _NON_ALNUM.sub(' ', text.upper()).split()
+
+
+class SearchIndex:
+    """
+    Prefix index over system search terms. The vocabulary is one sorted list
+    of words; each word owns a contiguous slice of the (system, field)
+    postings, so every word starting with a prefix is one bisect range and
+    one array slice. Results are ranked by where the terms matched (PWSID or
+    leading name word, then name, city, served area) and population served.
+    """
+
+    def __init__(self, systems: pd.DataFrame, areas: Optional[pd.DataFrame] = None):
+        started = time.perf_counter()
+        systems = systems.drop_duplicates('PWSID').reset_index(drop=True)
+        self.pwsids = systems['PWSID'].to_numpy()
+        self.names = systems['PWS_NAME'].astype(object).to_numpy()
+        self.cities = systems['CITY_NAME'].astype(object).to_numpy()
+        self.population = pd.to_numeric(systems['POPULATION_SERVED_COUNT'], errors='coerce').fillna(0).to_numpy()
+        self.active = (systems['PWS_ACTIVITY_CODE'] == 'A').to_numpy()
+
+        terms: List[tuple] = []
+        for doc, (pwsid, name, city) in enumerate(zip(self.pwsids, self.names, self.cities)):
+            terms.append((pwsid, doc, FIELD_PWSID))
+            for position, word in enumerate(tokenize(name)):
+                terms.append((word, doc, FIELD_NAME_START if position == 0 else FIELD_NAME))
+            terms.extend((word, doc, FIELD_CITY) for word in tokenize(city))
+        if areas is not None:
+            doc_of = {pwsid: doc for doc, pwsid in enumerate(self.pwsids)}
+            for column in ('CITY_SERVED', 'COUNTY_SERVED'):
+                served = areas[['PWSID', column]].dropna().drop_duplicates()
+                for pwsid, place in served.itertuples(index=False):
+                    if pwsid in doc_of:
+                        terms.extend((word, doc_of[pwsid], FIELD_SERVED) for word in tokenize(place))
+
+        postings = pd.DataFrame(terms, columns=['term', 'doc', 'field'])
+        postings = postings.groupby(['term', 'doc'], sort=True)['field'].min().reset_index()
+        terms_column = postings['term'].to_numpy()
+        boundaries = np.flatnonzero(terms_column[1:] != terms_column[:-1]) + 1
+        self.vocabulary: List[str] = terms_column[np.concatenate(([0], boundaries))].tolist() if len(postings) else []
+        self.offsets = np.concatenate(([0], boundaries, [len(postings)])).astype(np.int64)
+        self.docs = postings['doc'].to_numpy(dtype=np.int32)
+        self.fields = postings['field'].to_numpy(dtype=np.uint8)
+        self.stats = {"systems": len(self.pwsids), "terms": len(self.vocabulary), "postings": len(postings),
+                      "build_seconds": round(time.perf_counter() - started, 4),
+                      "memory_bytes": int(self.docs.nbytes + self.fields.nbytes + self.offsets.nbytes)}
+
+    def _match(self, prefix: str) -> np.ndarray:
+        """Best field per system for any word starting with `prefix` (NO_MATCH where none does)."""
+        lo = bisect.bisect_left(self.vocabulary, prefix)
+        hi = bisect.bisect_left(self.vocabulary, prefix + '\uffff', lo)
+        start, stop = self.offsets[lo], self.offsets[hi]
+        best = np.full(len(self.pwsids), NO_MATCH, dtype=np.uint8)
+        if hi - lo == 1:
+            best[self.docs[start:stop]] = self.fields[start:stop]  # one word: each system appears once
+        else:
+            np.minimum.at(best, self.docs[start:stop], self.fields[start:stop])
+        return best
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT, active_only: bool = False) -> List[Dict[str, Any]]:
+        """
+        Systems matching every word of `query` as a word prefix, best first.
+        Matches are ranked by match quality, then by population served.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        quality = np.zeros(len(self.pwsids), dtype=np.int32)
+        matched = np.ones(len(self.pwsids), dtype=bool)
+        for word in dict.fromkeys(words):
+            best = self._match(word)
+            matched &= best != NO_MATCH
+            quality += best
+        candidates = np.flatnonzero(matched)
+        if active_only:
+            candidates = candidates[self.active[candidates]]
+        if not len(candidates):
+            return []
+        quality = quality[candidates] + np.where(self.active[candidates], 0, INACTIVE_PENALTY)
+        order = np.lexsort((-self.population[candidates], quality))[:limit]
+        return self._results(candidates[order])
+
+    def largest(self, limit: int = DEFAULT_LIMIT, active_only: bool = False) -> List[Dict[str, Any]]:
+        """The systems serving the most people, as default suggestions before anything is typed."""
+        candidates = np.flatnonzero(self.active) if active_only else np.arange(len(self.pwsids))
+        return self._results(candidates[np.argsort(-self.population[candidates], kind='stable')[:limit]])
+
+    def _results(self, docs: np.ndarray) -> List[Dict[str, Any]]:
+        return [{"pwsid": self.pwsids[doc], "name": self.names[doc] if isinstance(self.names[doc], str) else None,
+                 "city": self.cities[doc] if isinstance(self.cities[doc], str) else None,
+                 "population": int(self.population[doc]), "active": bool(self.active[doc])}
+                for doc in docs]
+
+
+def synthetic_systems(systems: pd.DataFrame, target: int) -> pd.DataFrame:
+    """Repeats `systems` with fresh PWSIDs until it has `target` rows, for benchmarking."""
+    copies = -(-target // len(systems))
+    frames = []
+    for copy in range(copies):
+        frame = systems.copy()
+        frame['PWSID'] = frame['PWSID'].str[:2] + f"{copy:02d}" + frame['PWSID'].str[2:]
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True).head(target)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the system search index.")
+    parser.add_argument("--data-dir", default="data", help="Directory holding the SDWIS CSVs.")
+    parser.add_argument("--systems", type=int, default=None, help="Scale the systems table up to this many rows.")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed runs per query.")
+    parser.add_argument("queries", nargs="*", default=["a", "atl", "city of", "GA0", "macon water", "appling"])
+    args = parser.parse_args()
+
+    systems_df = pd.read_csv(f"{args.data_dir}/SDWA_PUB_WATER_SYSTEMS.csv", low_memory=False)
+    areas_df = pd.read_csv(f"{args.data_dir}/SDWA_GEOGRAPHIC_AREAS.csv", low_memory=False)
+    if args.systems:
+        systems_df = synthetic_systems(systems_df, args.systems)
+    index = SearchIndex(systems_df, areas_df)
+    print(f"Index: {index.stats}")
+    for query in args.queries:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            results = index.search(query, limit=DEFAULT_LIMIT)
+        elapsed_ms = (time.perf_counter() - started) / args.repeat * 1000
+        top = results[0]["name"] if results else "-"
+        print(f"{query!r}: {elapsed_ms:.3f} ms/query, {len(results)} results, top: {top}")
@@ -0,0 +1,101 @@
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+import spatial
+
+# How many systems a nearest-neighbour fallback returns by default.
+DEFAULT_NEAREST = 5
+# ...and never suggests a system further away than this.
+NEAREST_MAX_KM = 80.0
+
+
+def normalize_place(value: Any) -> str:
+    """Case- and whitespace-insensitive key for city and county names."""
+    return " ".join(str(value).upper().split())
+
+
+def normalize_zip(value: Any) -> str:
+    """Five-digit ZIP key (ZIP+4 and numeric ZIPs such as 601.0 normalised)."""
+    text = str(value).strip()
+    if text.endswith('.0'):
+        text = text[:-2]
+    return text[:5].zfill(5)
+
+
+def _invert(keys: pd.Series, pwsids: pd.Series, normalize: Callable[[Any], str]) -> Dict[str, List[str]]:
+    """{normalized key: [PWSID, ...]} with each PWSID listed once per key, in input order."""
+    present = keys.notna().to_numpy()
+    frame = pd.DataFrame({'key': keys[present].astype(object).map(normalize).to_numpy(),
+                          'pwsid': pwsids[present].to_numpy()}).drop_duplicates()
+    return {key: group.tolist() for key, group in frame.groupby('key', sort=False)['pwsid']}
+
+
+class ServiceAreaIndex:
+    """
+    Answers "which systems serve this place" from dictionaries built once at
+    load time, so a lookup is a few hash probes and never scans a table.
+
+    ZIP_CODE_SERVED, CITY_SERVED and COUNTY_SERVED from SDWA_GEOGRAPHIC_AREAS
+    are inverted to PWSIDs, as is each system's own address ZIP. A ZIP with no
+    match falls back to the nearest systems around its centroid.
+    """
+
+    def __init__(self, areas: pd.DataFrame, systems: pd.DataFrame, points: pd.DataFrame,
+                 zip_coords: Dict[str, Any]):
+        active = systems[systems['PWS_ACTIVITY_CODE'] == 'A']
+        active = active.sort_values('POPULATION_SERVED_COUNT', ascending=False, kind='mergesort')
+        self.systems: Dict[str, Dict[str, Any]] = {
+            pwsid: {"pwsid": pwsid, "name": name if isinstance(name, str) else None,
+                    "city": city if isinstance(city, str) else None,
+                    "population": None if pd.isna(population) else int(population)}
+            for pwsid, name, city, population in active[
+                ['PWSID', 'PWS_NAME', 'CITY_NAME', 'POPULATION_SERVED_COUNT']].itertuples(index=False)
+        }
+        # Rank every list by population served, largest first.
+        rank = {pwsid: i for i, pwsid in enumerate(self.systems)}
+        areas = areas[areas['PWSID'].isin(rank)]
+        areas = areas.iloc[areas['PWSID'].map(rank).argsort(kind='stable')]
+
+        self.by_zip = _invert(areas['ZIP_CODE_SERVED'], areas['PWSID'], normalize_zip)
+        self.by_city = _invert(areas['CITY_SERVED'], areas['PWSID'], normalize_place)
+        self.by_county = _invert(areas['COUNTY_SERVED'], areas['PWSID'], normalize_place)
+        self.by_address_zip = _invert(active['ZIP_CODE'], active['PWSID'], normalize_zip)
+        self.zip_coords = zip_coords
+        self.grid = spatial.PointGrid(points[points['pwsid'].isin(rank)])
+        self.grid_pwsids = self.grid.points['pwsid'].to_numpy()
+
+    def _describe(self, pwsids: List[str], match: str) -> List[Dict[str, Any]]:
+        return [{**self.systems[pwsid], "match": match} for pwsid in pwsids]
+
+    def lookup_zip(self, zip_code: str, k: int = DEFAULT_NEAREST) -> Optional[Dict[str, Any]]:
+        """
+        Systems serving a ZIP code: listed service areas first, then systems
+        headquartered there, else the `k` nearest. None if the ZIP is unknown.
+        """
+        zip_code = normalize_zip(zip_code)
+        served = self.by_zip.get(zip_code, [])
+        address = [pwsid for pwsid in self.by_address_zip.get(zip_code, []) if pwsid not in served]
+        if served or address:
+            return {"zip": zip_code, "method": "index",
+                    "systems": self._describe(served, "zip_served") + self._describe(address, "system_address")}
+        coords = self.zip_coords.get(zip_code)
+        if coords is None:
+            return None
+        positions, distances = self.grid.nearest(coords[0], coords[1], k, max_km=NEAREST_MAX_KM)
+        nearest = self.grid_pwsids[positions]
+        return {"zip": zip_code, "method": "nearest",
+                "systems": [{**self.systems[pwsid], "match": "nearest", "distance_km": round(float(distance), 1)}
+                            for pwsid, distance in zip(nearest, distances)]}
+
+    def lookup_place(self, city: Optional[str] = None, county: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Systems whose service area lists this city and/or county."""
+        systems = []
+        if city:
+            systems += self._describe(self.by_city.get(normalize_place(city), []), "city_served")
+        if county:
+            seen = {system["pwsid"] for system in systems}
+            systems += self._describe([pwsid for pwsid in self.by_county.get(normalize_place(county), [])
+                                       if pwsid not in seen], "county_served")
+        return systems
+
@@ -0,0 +1,203 @@
+import contextlib
+import hashlib
+import json
+import os
+import time
+from typing import Callable, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, so run a single worker there.
+    fcntl = None
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Bump when the prepare step or dtype rules change so old snapshots are rebuilt.
+SNAPSHOT_FORMAT_VERSION = 3
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Hashes a file in fixed-size chunks so large exports are never read whole."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _paths(snapshot_dir: str, name: str) -> Tuple[str, str]:
+    return os.path.join(snapshot_dir, f"{name}.feather"), os.path.join(snapshot_dir, f"{name}.json")
+
+
+@contextlib.contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """
+    Exclusive lock on `path` (created if missing) across processes, e.g. the
+    workers of `uvicorn --workers N`. Released when the block exits or the
+    process dies.
+    """
+    f = None
+    if fcntl is not None:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            f = open(path, 'a')
+        except OSError as e:
+            print(f"Warning: could not open lock file {path}, continuing without it: {e}")
+    if f is None:
+        yield
+        return
+    with f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _is_fresh(manifest: Dict[str, Any], csv_path: str, manifest_path: str) -> bool:
+    """
+    Checks a snapshot manifest against its source CSV. Size and mtime are the
+    fast path; if only the mtime moved (e.g. a re-copied file) the content hash
+    decides, and the manifest is refreshed so the next boot takes the fast path.
+    """
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        return False
+    stat = os.stat(csv_path)
+    if manifest.get("csv_size") != stat.st_size:
+        return False
+    if manifest.get("csv_mtime_ns") == stat.st_mtime_ns:
+        return True
+    if manifest.get("csv_sha256") != file_sha256(csv_path):
+        return False
+    manifest["csv_mtime_ns"] = stat.st_mtime_ns
+    _write_json(manifest_path, manifest)
+    return True
+
+
+def _write_json(path: str, payload: Dict[str, Any]):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(snapshot_dir: str, name: str) -> Dict[str, Any]:
+    """Returns the manifest for a table's snapshot, or {} if there is none."""
+    _, manifest_path = _paths(snapshot_dir, name)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+
+def write_snapshot(snapshot_dir: str, name: str, csv_path: str, df: pd.DataFrame):
+    """Writes an uncompressed Feather snapshot (so it can be memory-mapped) plus its manifest."""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    snapshot_path, manifest_path = _paths(snapshot_dir, name)
+    stat = os.stat(csv_path)
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, snapshot_path)
+    _write_json(manifest_path, {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "csv_size": stat.st_size,
+        "csv_mtime_ns": stat.st_mtime_ns,
+        "csv_sha256": file_sha256(csv_path),
+        "rows": len(df),
+        "written_at": time.time(),
+    })
+
+
+def is_current(snapshot_dir: str, name: str, csv_path: str, csv_sha256: Optional[str]) -> bool:
+    """
+    Whether a table loaded from content hashing to `csv_sha256` is still
+    current: its snapshot is fresh for the CSV and was built from that content.
+    Cheap (a stat and a manifest read) unless the CSV's mtime moved.
+    """
+    _, manifest_path = _paths(snapshot_dir, name)
+    manifest = read_manifest(snapshot_dir, name)
+    return bool(manifest) and manifest.get("csv_sha256") == csv_sha256 and os.path.exists(csv_path) \
+        and _is_fresh(manifest, csv_path, manifest_path)
+
+
+def open_snapshot(snapshot_dir: str, name: str) -> Optional[pa.Table]:
+    """The table's snapshot as a memory-mapped Arrow table (columns are paged in on access), or None."""
+    snapshot_path, _ = _paths(snapshot_dir, name)
+    if not os.path.exists(snapshot_path):
+        return None
+    return feather.read_table(snapshot_path, memory_map=True)
+
+
+def fresh_snapshot(snapshot_dir: str, name: str, csv_path: str) -> Optional[pa.Table]:
+    """The table's memory-mapped snapshot if it is fresh for `csv_path`, else None (nothing is built)."""
+    snapshot_path, manifest_path = _paths(snapshot_dir, name)
+    manifest = read_manifest(snapshot_dir, name)
+    if not manifest or not os.path.exists(snapshot_path) or not _is_fresh(manifest, csv_path, manifest_path):
+        return None
+    return open_snapshot(snapshot_dir, name)
+
+
+def read_column(snapshot_dir: str, name: str, csv_path: str, column: str) -> pd.Series:
+    """One column of a table, from its fresh snapshot (only that column is paged in) or parsed from the CSV."""
+    table = fresh_snapshot(snapshot_dir, name, csv_path)
+    if table is not None:
+        return table.column(column).to_pandas()
+    return pd.read_csv(csv_path, usecols=[column], dtype=str)[column]
+
+
+def _arrow_backed_dtype(arrow_type: pa.DataType) -> Optional[pd.ArrowDtype]:
+    """
+    Keeps a column as a view of the mapped file, except dictionary-encoded
+    ones: those become regular categoricals, whose codes are small and whose
+    shared categories keep per-system slices cheap.
+    """
+    return None if pa.types.is_dictionary(arrow_type) else pd.ArrowDtype(arrow_type)
+
+
+def load_table(snapshot_dir: str, name: str, csv_path: str, prepare: Callable[[pd.DataFrame], pd.DataFrame],
+               defer: Iterable[str] = (), arrow_backed: bool = False) -> Tuple[pd.DataFrame, str, Optional[pa.Table]]:
+    """
+    Returns the prepared table for a CSV, where it came from ('snapshot' or
+    'csv'), and its `defer` columns as a memory-mapped Arrow table.
+    A fresh snapshot is memory-mapped; otherwise the CSV is parsed, passed
+    through `prepare` and written back as the new snapshot. Deferred columns
+    are only left out of the frame when a snapshot exists to read them from.
+
+    Processes sharing `snapshot_dir` take turns per table, so a CSV is
+    parsed once and the others map the snapshot it produced. With
+    `arrow_backed`, the frame's columns are Arrow-backed views of the mapped
+    file instead of copies: the pages live in the OS page cache, shared by
+    every process that maps the same snapshot.
+    """
+    source = "snapshot"
+    with file_lock(os.path.join(snapshot_dir, f"{name}.lock")):
+        table = fresh_snapshot(snapshot_dir, name, csv_path)
+        if table is None:
+            source = "csv"
+            df = prepare(pd.read_csv(csv_path, low_memory=False))
+            try:
+                write_snapshot(snapshot_dir, name, csv_path, df)
+                table = open_snapshot(snapshot_dir, name)
+            except OSError as e:
+                print(f"Warning: could not write snapshot for {name}: {e}")
+                return df, source, None
+
+    deferred = [column for column in defer if column in table.column_names]
+    df = table.drop_columns(deferred).to_pandas(types_mapper=_arrow_backed_dtype if arrow_backed else None)
+    return df, source, table.select(deferred) if deferred else None
+
+
+def data_version(snapshot_dir: str, names) -> str:
+    """
+    Short content fingerprint of the loaded dataset, derived from the source
+    CSV hashes recorded in each table's manifest.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(names):
+        digest.update(f"{name}:{read_manifest(snapshot_dir, name).get('csv_sha256', '')}\n".encode())
+    return digest.hexdigest()[:12]
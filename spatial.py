@@ -0,0 +1,196 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Side of a spatial-index cell in degrees (~55 km of latitude).
+GRID_CELL_DEGREES = 0.5
+
+# Viewports at or above this zoom level are never clustered.
+CLUSTER_MAX_ZOOM = 11
+# Viewports with at most this many visible systems are sent as plain points.
+CLUSTER_MIN_POINTS = 300
+# Width of a cluster cell on screen; converted to degrees per zoom level.
+CLUSTER_CELL_PIXELS = 60
+TILE_PIXELS = 256
+# Deepest zoom level web map tiles go to; requests outside 0..MAX_ZOOM are rejected.
+MAX_ZOOM = 22
+
+KM_PER_DEGREE = 111.195
+# Nearest-neighbour searches give up beyond this many rings of cells (~20 degrees).
+MAX_SEARCH_RINGS = 40
+
+
+def build_map_points(systems: pd.DataFrame, zip_coords: Dict[str, Tuple[float, float]],
+                     violation_counts: pd.Series) -> pd.DataFrame:
+    """
+    Geocodes systems by the first five digits of their ZIP_CODE and attaches
+    their violation counts. Systems whose ZIP has no coordinates are dropped.
+    """
+    coords = systems['ZIP_CODE'].astype(str).str[:5].map(zip_coords)
+    located = systems[coords.notna()]
+    coords = coords[coords.notna()]
+    return pd.DataFrame({
+        'pwsid': located['PWSID'].to_numpy(),
+        'name': located['PWS_NAME'].astype(object).fillna('N/A').to_numpy(),
+        'lat': np.array([c[0] for c in coords], dtype=float),
+        'lon': np.array([c[1] for c in coords], dtype=float),
+        'violations': located['PWSID'].map(violation_counts).fillna(0).astype(int).to_numpy(),
+    })
+
+
+def color_thresholds(violations: pd.Series) -> Dict[str, int]:
+    """
+    Marker colour breakpoints: red from the 10th-highest violation count, with
+    orange and yellow at half and a fifth of that.
+    """
+    top = violations.nlargest(10)
+    red = max(1, int(top.iloc[-1]) if len(top) else 20)
+    return {"red": red, "orange": -(-red // 2), "yellow": -(-red // 5)}
+
+
+class PointGrid:
+    """
+    Uniform lat/lon grid over the map points. Points are sorted by cell and
+    each cell maps to its (start, stop) row range, so a bounding-box query
+    touches only the cells it overlaps and never scans the whole layer.
+    """
+
+    def __init__(self, points: pd.DataFrame, cell_degrees: float = GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        rows = np.floor(points['lat'].to_numpy() / cell_degrees).astype(np.int64)
+        cols = np.floor(points['lon'].to_numpy() / cell_degrees).astype(np.int64)
+        order = np.lexsort((cols, rows))
+        self.points = points.iloc[order].reset_index(drop=True)
+        self.lat = self.points['lat'].to_numpy()
+        self.lon = self.points['lon'].to_numpy()
+        rows, cols = rows[order], cols[order]
+
+        self.cells: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        if len(rows):
+            boundaries = np.flatnonzero((rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])) + 1
+            starts = np.concatenate(([0], boundaries))
+            stops = np.concatenate((boundaries, [len(rows)]))
+            for start, stop in zip(starts.tolist(), stops.tolist()):
+                self.cells[(int(rows[start]), int(cols[start]))] = (start, stop)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(np.floor(lat / self.cell_degrees)), int(np.floor(lon / self.cell_degrees))
+
+    def query(self, south: float, west: float, north: float, east: float) -> np.ndarray:
+        """Row positions of the points inside the bounding box (edges included)."""
+        (row_lo, col_lo), (row_hi, col_hi) = self._cell(south, west), self._cell(north, east)
+        if row_lo > row_hi or col_lo > col_hi:
+            return np.empty(0, dtype=np.int64)
+        if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) <= len(self.cells):
+            candidates = (self.cells.get((row, col)) for row in range(row_lo, row_hi + 1)
+                          for col in range(col_lo, col_hi + 1))
+        else:
+            # A viewport wider than the populated area: walk the occupied cells instead.
+            candidates = (span for (row, col), span in self.cells.items()
+                          if row_lo <= row <= row_hi and col_lo <= col <= col_hi)
+        spans = [np.arange(start, stop) for start, stop in filter(None, candidates)]
+        if not spans:
+            return np.empty(0, dtype=np.int64)
+        positions = np.concatenate(spans)
+        lat, lon = self.lat[positions], self.lon[positions]
+        return positions[(lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)]
+
+    def _ring(self, row: int, col: int, radius: int) -> List[Tuple[int, int]]:
+        """Occupied cells exactly `radius` cells away (Chebyshev distance) from (row, col)."""
+        if radius == 0:
+            cells = [(row, col)]
+        else:
+            cells = [(row + dr, col + dc) for dr in (-radius, radius) for dc in range(-radius, radius + 1)]
+            cells += [(row + dr, col + dc) for dc in (-radius, radius) for dr in range(-radius + 1, radius)]
+        return [self.cells[cell] for cell in cells if cell in self.cells]
+
+    def nearest(self, lat: float, lon: float, k: int,
+                max_km: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Row positions of the `k` points closest to (lat, lon) and their
+        great-circle distances in km, nearest first, optionally only those
+        within `max_km`. Rings of cells are added around the query cell until
+        no unsearched cell can hold a closer point.
+        """
+        row, col = self._cell(lat, lon)
+        spans: List[Tuple[int, int]] = []
+        for radius in range(MAX_SEARCH_RINGS + 1):
+            spans += self._ring(row, col, radius)
+            # Anything outside the searched square is at least `radius` cells away;
+            # a degree of longitude shrinks towards the poles, so bound with the smaller one.
+            edge_lat = min(89.0, abs(lat) + (radius + 1) * self.cell_degrees)
+            bound = radius * self.cell_degrees * KM_PER_DEGREE * math.cos(math.radians(edge_lat))
+            if max_km is not None and bound > max_km:
+                break
+            if sum(stop - start for start, stop in spans) < k:
+                continue
+            positions = np.concatenate([np.arange(start, stop) for start, stop in spans])
+            distances = haversine_km(lat, lon, self.lat[positions], self.lon[positions])
+            if np.partition(distances, k - 1)[k - 1] <= bound:
+                break
+        if not spans:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        positions = np.concatenate([np.arange(start, stop) for start, stop in spans])
+        distances = haversine_km(lat, lon, self.lat[positions], self.lon[positions])
+        order = np.argsort(distances, kind='stable')[:k]
+        if max_km is not None:
+            order = order[distances[order] <= max_km]
+        return positions[order], distances[order]
+
+    def within(self, bbox: Optional[Tuple[float, float, float, float]]) -> pd.DataFrame:
+        """Points inside `bbox` given as (south, west, north, east); every point when bbox is None."""
+        if bbox is None:
+            return self.points
+        return self.points.iloc[np.sort(self.query(*bbox))]
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km from one point to arrays of points."""
+    lat1, lon1, lat2, lon2 = np.radians(lat), np.radians(lon), np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    """
+    Parses Leaflet's `toBBoxString()` order, 'west,south,east,north', into
+    (south, west, north, east), clamped to valid coordinates.
+    """
+    parts = [float(part) for part in bbox.split(',')]
+    if len(parts) != 4 or not all(math.isfinite(part) for part in parts):
+        raise ValueError("bbox must be four finite numbers, 'west,south,east,north'")
+    west, south, east, north = parts
+    if south > north or west > east:
+        raise ValueError("bbox must be 'west,south,east,north' with west <= east and south <= north")
+    south, west, north, east = max(south, -90.0), max(west, -180.0), min(north, 90.0), min(east, 180.0)
+    if south > north or west > east:
+        raise ValueError("bbox lies entirely outside latitudes -90..90 and longitudes -180..180")
+    return south, west, north, east
+
+
+def should_cluster(zoom: int, visible: int) -> bool:
+    return zoom < CLUSTER_MAX_ZOOM and visible > CLUSTER_MIN_POINTS
+
+
+def cluster_points(points: pd.DataFrame, zoom: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Groups points into square cells about CLUSTER_CELL_PIXELS wide on screen
+    at `zoom`. Returns (points left on their own, clusters); each cluster has
+    its centroid, member count, total and worst per-system violation count.
+    """
+    size = CLUSTER_CELL_PIXELS * 360.0 / (TILE_PIXELS * 2 ** zoom)
+    keys = [np.floor(points['lat'].to_numpy() / size).astype(np.int64),
+            np.floor(points['lon'].to_numpy() / size).astype(np.int64)]
+    sizes = points.groupby(keys)['pwsid'].transform('size').to_numpy()
+    singles = points[sizes == 1]
+    grouped = points[sizes > 1]
+    clusters = grouped.groupby([key[sizes > 1] for key in keys]).agg(
+        lat=('lat', 'mean'), lon=('lon', 'mean'), count=('pwsid', 'size'),
+        violations=('violations', 'sum'), max_violations=('violations', 'max'),
+    ).reset_index(drop=True)
+    return singles, clusters
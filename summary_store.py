@@ -0,0 +1,139 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+# Reads refresh an entry's last_accessed at most this often, so the LRU order
+# stays roughly right without turning every cache hit into a write.
+ACCESS_TOUCH_INTERVAL = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    pwsid TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_accessed REAL NOT NULL,
+    data_version TEXT,
+    model TEXT,
+    fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS summaries_last_accessed ON summaries (last_accessed);
+"""
+
+
+class SummaryStore:
+    """
+    Persistent PWSID -> summary store backed by SQLite in WAL mode.
+
+    Each insert is a single-row upsert, so its cost does not depend on how many
+    summaries are stored, and WAL lets readers proceed while a write is in
+    progress. Entries expire after `ttl_seconds` (if set); when `max_entries`
+    is set, the least recently used entries are evicted past that size.
+    """
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+        columns = {row["name"] for row in self._conn().execute("PRAGMA table_info(summaries)")}
+        if "fingerprint" not in columns:
+            self._conn().execute("ALTER TABLE summaries ADD COLUMN fingerprint TEXT")
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite3 connections must not be shared across threads."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, pwsid: str) -> Optional[Dict[str, Any]]:
+        """Returns the entry (summary plus metadata) for a PWSID, or None if missing or expired."""
+        row = self._conn().execute("SELECT * FROM summaries WHERE pwsid = ?", (pwsid,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if self._is_expired(row["created_at"], now):
+            self.delete(pwsid)
+            return None
+        if now - row["last_accessed"] > ACCESS_TOUCH_INTERVAL:
+            self._conn().execute("UPDATE summaries SET last_accessed = ? WHERE pwsid = ?", (now, pwsid))
+        return dict(row)
+
+    def put(self, pwsid: str, summary: str, data_version: Optional[str] = None, model: Optional[str] = None,
+            created_at: Optional[float] = None, fingerprint: Optional[str] = None):
+        """Inserts or replaces the summary for a PWSID; `fingerprint` identifies the rows it was built from."""
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO summaries "
+            "(pwsid, summary, created_at, last_accessed, data_version, model, fingerprint) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (pwsid, summary, created_at or now, now, data_version, model, fingerprint),
+        )
+        if self.max_entries is not None:
+            self.evict_lru()
+
+    def delete(self, pwsid: str):
+        self._conn().execute("DELETE FROM summaries WHERE pwsid = ?", (pwsid,))
+
+    def delete_many(self, pwsids: Iterable[str]) -> int:
+        """Deletes the entries for `pwsids` in one transaction and returns how many existed."""
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            cursor = conn.executemany("DELETE FROM summaries WHERE pwsid = ?", ((pwsid,) for pwsid in pwsids))
+        return cursor.rowcount
+
+    def evict_lru(self):
+        """Drops the least recently used entries beyond max_entries."""
+        self._conn().execute(
+            "DELETE FROM summaries WHERE pwsid IN ("
+            "SELECT pwsid FROM summaries ORDER BY last_accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def purge_expired(self) -> int:
+        """Deletes every entry past its TTL and returns how many were removed."""
+        if self.ttl_seconds is None:
+            return 0
+        cursor = self._conn().execute("DELETE FROM summaries WHERE created_at < ?",
+                                      (time.time() - self.ttl_seconds,))
+        return cursor.rowcount
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def import_json(self, json_path: str) -> int:
+        """
+        One-time migration from the legacy {pwsid: summary} JSON cache file.
+        Entries already in the store are kept. Returns the number imported.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, 'r') as f:
+            try:
+                legacy = json.load(f)
+            except json.JSONDecodeError:
+                print(f"Warning: Could not decode JSON from {json_path}. Nothing imported.")
+                return 0
+        now = time.time()
+        conn = self._conn()
+        before = self.count()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR IGNORE INTO summaries (pwsid, summary, created_at, last_accessed, data_version, model) "
+                "VALUES (?, ?, ?, ?, NULL, NULL)",
+                [(pwsid, summary, now, now) for pwsid, summary in legacy.items()],
+            )
+        return self.count() - before
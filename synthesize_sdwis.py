@@ -0,0 +1,103 @@
+"""
+Synthesizes SDWIS-shaped CSVs at a multiple of a real state export, for
+benchmarking at national scale.
+
+    python synthesize_sdwis.py --scale 10 --output-dir data_x10
+    python synthesize_sdwis.py --scale 50 --output-dir data_x50   # roughly national size
+
+Copy 0 is the source export unchanged. Every further copy is the same
+systems re-keyed to another state: PWSIDs (and the state columns) take that
+state's prefix, so copies are distinct systems with realistic row counts per
+system. Reference tables (code values, ZIP coordinates) are copied once.
+"""
+import argparse
+import os
+import shutil
+import time
+from typing import Any, Dict, List
+
+import pandas as pd
+
+# State prefixes used for the synthetic copies, in order after the source state.
+STATE_CODES = [
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY',
+    'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC', 'ND', 'OH',
+    'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY', 'PR', 'VI', 'GU',
+    'AS', 'MP',
+]
+# Columns holding the state of a PWSID-keyed row, rewritten along with the PWSID prefix.
+STATE_COLUMNS = ('STATE_CODE', 'PRIMACY_AGENCY_CODE', 'STATE_SERVED')
+SELLER_COLUMNS = ('SELLER_PWSID',)
+# Tables copied once, unchanged.
+REFERENCE_FILES = ("SDWA_REF_CODE_VALUES.csv", "SDWA_REF_ANSI_AREAS.csv", "zipCodeToLatLong.csv")
+
+
+def copy_states(source_state: str, scale: int) -> List[str]:
+    """State prefixes for `scale` copies, the source state first."""
+    others = [state for state in STATE_CODES if state != source_state]
+    if scale > len(others) + 1:
+        raise ValueError(f"scale can be at most {len(others) + 1} (one copy per state prefix)")
+    return [source_state] + others[:scale - 1]
+
+
+def rekey(df: pd.DataFrame, source_state: str, state: str) -> pd.DataFrame:
+    """A copy of a PWSID-keyed table with its PWSIDs and state columns moved to `state`."""
+    if state == source_state:
+        return df
+    df = df.copy()
+    for column in ('PWSID',) + SELLER_COLUMNS:
+        if column in df.columns:
+            ids = df[column]
+            df[column] = ids.where(~ids.str.startswith(source_state), state + ids.str[len(source_state):])
+    for column in STATE_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].where(df[column] != source_state, state)
+    return df
+
+
+def synthesize_file(input_path: str, output_path: str, states: List[str]) -> Dict[str, Any]:
+    """Writes one table at scale: every copy of the source rows, re-keyed per state."""
+    started = time.perf_counter()
+    filename = os.path.basename(input_path)
+    if filename in REFERENCE_FILES:
+        shutil.copyfile(input_path, output_path)
+        return {"filename": filename, "rows": None, "seconds": round(time.perf_counter() - started, 3)}
+    # Read and written back as strings, so codes such as '001' keep their leading zeros.
+    df = pd.read_csv(input_path, dtype=str, keep_default_na=False)
+    if 'PWSID' not in df.columns:
+        shutil.copyfile(input_path, output_path)
+        return {"filename": filename, "rows": len(df), "seconds": round(time.perf_counter() - started, 3)}
+    source_state = df['PWSID'].str[:2].mode().iloc[0] if len(df) else states[0]
+    tmp_path = f"{output_path}.partial"
+    for position, state in enumerate(states):
+        rekey(df, source_state, state).to_csv(tmp_path, mode='a' if position else 'w', header=not position,
+                                              index=False)
+    os.replace(tmp_path, output_path)
+    return {"filename": filename, "rows": len(df) * len(states), "seconds": round(time.perf_counter() - started, 3)}
+
+
+def synthesize(input_dir: str, output_dir: str, scale: int) -> List[Dict[str, Any]]:
+    """Writes every CSV of `input_dir` into `output_dir` at `scale` times its systems."""
+    os.makedirs(output_dir, exist_ok=True)
+    systems = pd.read_csv(os.path.join(input_dir, "SDWA_PUB_WATER_SYSTEMS.csv"), dtype=str, usecols=['PWSID'])
+    states = copy_states(systems['PWSID'].str[:2].mode().iloc[0], scale)
+    stats = []
+    for filename in sorted(os.listdir(input_dir)):
+        if filename.endswith(".csv"):
+            stats.append(synthesize_file(os.path.join(input_dir, filename), os.path.join(output_dir, filename), states))
+            print(f"{filename}: {stats[-1]['rows'] if stats[-1]['rows'] is not None else 'copied'} rows "
+                  f"in {stats[-1]['seconds']}s")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthesize SDWIS CSVs at a multiple of a state export.")
+    parser.add_argument("--input-dir", default="data", help="Directory holding the source state's CSVs.")
+    parser.add_argument("--output-dir", required=True, help="Directory to write the synthetic CSVs to.")
+    parser.add_argument("--scale", type=int, default=10,
+                        help="Copies of the source systems (1, 10, 50 ~ national; at most one per state prefix).")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    synthesize(args.input_dir, args.output_dir, args.scale)
+    print(f"Wrote {args.scale}x data to '{args.output_dir}' in {time.perf_counter() - started:.1f}s.")
@@ -0,0 +1,50 @@
+"""
+Shared fixtures. `loaded_app` is the app module loaded from the shipped
+data/ directory, with its snapshots, summary store and regulator DB in a
+temporary directory and the stub LLM in place of the API.
+"""
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_ROOT, "data")
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("LLM_STUB_LATENCY", "0")
+os.environ.setdefault("LLM_STUB_TOKEN_DELAY", "0")
+# Every global load_all_data swaps (and the shard store), for fixtures that load the app from scratch.
+DATA_GLOBALS = {
+    "dataframes": dict, "deferred_columns": dict, "table_versions": dict, "pwsid_index": dict,
+    "pwsid_index_stats": dict, "event_keys": dict, "table_fingerprints": dict, "pwsid_fingerprints": dict,
+    "failed_tables": dict, "zip_coords": dict, "map_thresholds": dict, "data_version": lambda: None,
+    "system_search": lambda: None, "map_grid": lambda: None, "service_area_index": lambda: None,
+    "rollups": lambda: None, "shard_store": lambda: None,
+}
+
+
+@pytest.fixture(scope="session")
+def loaded_app(tmp_path_factory):
+    root = tmp_path_factory.mktemp("app")
+    # The app serves and loads ./data relative to the working directory.
+    os.chdir(REPO_ROOT)
+    import app
+
+    app.DATA_DIR = DATA_DIR
+    app.SNAPSHOT_DIR = str(root / "snapshot")
+    app.REGULATOR_DB = str(root / "regulator.sqlite3")
+    app.SUMMARY_DB = str(root / "summaries.sqlite3")
+    app.CACHE_FILE = str(root / "no_legacy_cache.json")
+    app.static_files.cache_dir = str(root / "static")
+    app.load_all_data()
+    app.open_summary_store()
+    app.sync_regulator_db()
+    return app
+
+
+@pytest.fixture(scope="session")
+def client(loaded_app):
+    from fastapi.testclient import TestClient
+
+    # Not used as a context manager: the lifespan would reload from the default paths.
+    return TestClient(loaded_app.app)
@@ -0,0 +1,80 @@
+import gzip
+import os
+from email.utils import formatdate
+
+import pytest
+
+import http_cache
+
+STATIC_PATH = "/data/SDWA_SITE_VISITS.csv"
+
+
+def test_static_variants_share_the_source_last_modified(client, loaded_app):
+    source = os.stat(os.path.join(loaded_app.DATA_DIR, "SDWA_SITE_VISITS.csv"))
+    asset = next(asset for path, asset in loaded_app.static_files.assets.items()
+                 if path.endswith("SDWA_SITE_VISITS.csv"))
+    # A variant written later than its source must not leak its own mtime.
+    os.utime(asset.variants["gzip"], (source.st_atime + 3600, source.st_mtime + 3600))
+
+    identity = client.get(STATIC_PATH, headers={"Accept-Encoding": "identity"})
+    encoded = client.get(STATIC_PATH, headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in identity.headers
+    assert encoded.headers["content-encoding"] == "gzip"
+    assert identity.headers["last-modified"] == encoded.headers["last-modified"] \
+        == formatdate(source.st_mtime, usegmt=True)
+    assert identity.headers["etag"] != encoded.headers["etag"]
+    assert encoded.content == identity.content
+
+
+@pytest.mark.parametrize("encoding", ["identity", "gzip"])
+def test_static_revalidation(client, encoding):
+    first = client.get(STATIC_PATH, headers={"Accept-Encoding": encoding})
+    assert first.headers["cache-control"] == http_cache.REVALIDATE_CACHE_CONTROL
+
+    etag = client.get(STATIC_PATH, headers={"Accept-Encoding": encoding, "If-None-Match": first.headers["etag"]})
+    assert etag.status_code == 304 and etag.content == b""
+    assert etag.headers["etag"] == first.headers["etag"]
+    assert etag.headers["last-modified"] == first.headers["last-modified"]
+
+    since = client.get(STATIC_PATH, headers={"Accept-Encoding": encoding,
+                                             "If-Modified-Since": first.headers["last-modified"]})
+    assert since.status_code == 304
+
+    # If-None-Match takes precedence over If-Modified-Since.
+    other = client.get(STATIC_PATH, headers={"Accept-Encoding": encoding, "If-None-Match": '"other"',
+                                             "If-Modified-Since": first.headers["last-modified"]})
+    assert other.status_code == 200
+
+
+def test_static_etag_names_one_coding(client):
+    identity = client.get(STATIC_PATH, headers={"Accept-Encoding": "identity"})
+    response = client.get(STATIC_PATH, headers={"Accept-Encoding": "gzip", "If-None-Match": identity.headers["etag"]})
+    assert response.status_code == 200 and response.headers["content-encoding"] == "gzip"
+
+
+def test_versioned_static_urls_are_immutable(client):
+    url = next(entry["url"] for entry in client.get("/api/datasets").json()["files"]
+               if entry["name"] == "SDWA_SITE_VISITS.csv")
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == http_cache.IMMUTABLE_CACHE_CONTROL
+
+
+@pytest.mark.parametrize("encoding", ["identity", "gzip"])
+def test_json_revalidation(client, loaded_app, encoding):
+    first = client.get("/api/rollups", headers={"Accept-Encoding": encoding})
+    assert first.status_code == 200
+    assert first.headers["etag"].startswith(f'"{loaded_app.data_version}-')
+    assert first.headers.get("content-encoding", "identity") == encoding
+
+    again = client.get("/api/rollups", headers={"Accept-Encoding": encoding, "If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == first.headers["etag"]
+    assert "content-type" not in again.headers
+
+
+def test_compression_and_negotiation():
+    assert gzip.decompress(http_cache.compress(b"x" * 5000, "gzip")) == b"x" * 5000
+    assert http_cache.negotiate_encoding("br;q=0, gzip;q=0.5, *;q=0.1", ("gzip",)) == "gzip"
+    assert http_cache.negotiate_encoding("gzip;q=0", ("gzip",)) is None
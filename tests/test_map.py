@@ -0,0 +1,30 @@
+import pytest
+
+import spatial
+
+
+@pytest.mark.parametrize("zoom", [-1, -2000, 23])
+def test_zoom_out_of_range_is_rejected(client, zoom):
+    assert client.get(f"/api/map?zoom={zoom}").status_code == 422
+
+
+@pytest.mark.parametrize("bbox", ["-84,34,-85,33", "-84,nan,-83,34", "-84,33,inf,34", "-84,33,-83", "200,33,210,34",
+                                  "-84,95,-83,99"])
+def test_invalid_bbox_is_rejected(client, bbox):
+    assert client.get(f"/api/map?bbox={bbox}&zoom=9").status_code == 400
+
+
+def test_bbox_is_clamped_to_valid_coordinates():
+    assert spatial.parse_bbox("-200,-95,-80,40") == (-90.0, -180.0, 40.0, -80.0)
+
+
+def test_viewport_points_lie_in_bbox(client):
+    response = client.get("/api/map?bbox=-85,33,-84,34&zoom=12")
+    assert response.status_code == 200
+    points = response.json()["points"]
+    assert points and all(33 <= p["lat"] <= 34 and -85 <= p["lon"] <= -84 for p in points)
+
+
+@pytest.mark.parametrize("zoom", [0, 5, 22])
+def test_zoom_bounds_are_served(client, zoom):
+    assert client.get(f"/api/map?zoom={zoom}").status_code == 200
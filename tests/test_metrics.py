@@ -0,0 +1,32 @@
+import pytest
+
+
+def request_counts(client, status):
+    """Request count per route label with `status`, from the /metrics exposition."""
+    counts = {}
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith("sdwis_http_request_seconds_count{") and f'status="{status}"' in line:
+            route = line.split('route="', 1)[1].split('"', 1)[0]
+            counts[route] = float(line.rsplit(" ", 1)[1])
+    return counts
+
+
+@pytest.mark.parametrize("path,route,status", [
+    ("/data/SDWA_SITE_VISITS.csv", "/data", 200),
+    ("/data/no-such-file.csv", "/data", 404),
+    ("/api/map?zoom=99", "/api/map", 422),
+    ("/no-such-route", "unmatched", 404),
+])
+def test_requests_are_labelled_by_route(client, path, route, status):
+    before = request_counts(client, status).get(route, 0)
+    assert client.get(path).status_code == status
+    assert request_counts(client, status).get(route, 0) == before + 1
+
+
+def test_root_path_is_not_taken_for_a_mount(loaded_app):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(loaded_app.app, root_path="/proxy")
+    before = request_counts(client, 200).get("/data", 0)
+    assert client.get("/proxy/data/SDWA_SITE_VISITS.csv").status_code == 200
+    assert request_counts(client, 200).get("/data", 0) == before + 1
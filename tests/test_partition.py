@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import filter_sdwis_to_georgia as ingest
+
+
+def test_partition_counts_written_and_skipped_rows(tmp_path):
+    input_path = tmp_path / "SDWA_SITE_VISITS.csv"
+    pd.DataFrame({'PWSID': ['GA0000001', 'AL0000002', '', 'GA0000003', ''],
+                  'VISIT_ID': ['1', '2', '3', '4', '5']}).to_csv(input_path, index=False)
+
+    stats = ingest.partition_file_by_state(str(input_path), str(tmp_path / "out"), chunk_size=2)
+
+    assert (stats["rows_in"], stats["rows_out"], stats["rows_skipped"], stats["states"]) == (5, 3, 2, 2)
+    written = sum(len(pd.read_csv(tmp_path / "out" / state / "SDWA_SITE_VISITS.csv")) for state in ('GA', 'AL'))
+    assert written == stats["rows_out"]
+    assert not any(name.endswith(".partial") for _, _, names in os.walk(tmp_path / "out") for name in names)
+
+
+def test_partition_skips_files_without_a_state_key(tmp_path):
+    input_path = tmp_path / "SDWA_SITE_VISITS.csv"
+    pd.DataFrame({'VISIT_ID': [str(number) for number in range(5)]}).to_csv(input_path, index=False)
+
+    stats = ingest.partition_file_by_state(str(input_path), str(tmp_path / "out"), chunk_size=2)
+
+    assert (stats["rows_in"], stats["rows_out"], stats["rows_skipped"], stats["states"]) == (5, 0, 5, 0)
+
+
+@pytest.fixture
+def national_dir(tmp_path, monkeypatch):
+    # Threads instead of forked workers: the test process already runs threads of its own.
+    monkeypatch.setattr(ingest, "ProcessPoolExecutor", ThreadPoolExecutor)
+    input_dir = tmp_path / "national"
+    os.makedirs(input_dir)
+
+    def write(states):
+        pd.DataFrame({'PWSID': [f"{state}0000001" for state in states], 'PWS_NAME': list(states)}) \
+            .to_csv(input_dir / "SDWA_PUB_WATER_SYSTEMS.csv", index=False)
+        pd.DataFrame({'PWSID': [f"{state}0000001" for state in states], 'VISIT_ID': list(states)}) \
+            .to_csv(input_dir / "SDWA_SITE_VISITS.csv", index=False)
+    return input_dir, write
+
+
+def test_repartition_replaces_earlier_states(national_dir, tmp_path, capsys):
+    input_dir, write = national_dir
+    output_dir = str(tmp_path / "shards")
+    write(['GA', 'AL', 'FL'])
+    ingest.partition_sdwis_by_state(str(input_dir), output_dir)
+    assert sorted(os.listdir(output_dir)) == ['AL', 'FL', 'GA']
+
+    write(['GA'])
+    ingest.partition_sdwis_by_state(str(input_dir), output_dir)
+    assert os.listdir(output_dir) == ['GA']
+    assert not os.path.exists(f"{output_dir}.partial") and not os.path.exists(f"{output_dir}.old")
+    assert "Partitioned 2 files into 1 states" in capsys.readouterr().out
+
+
+def test_failed_partition_leaves_output_unchanged(national_dir, tmp_path, capsys):
+    input_dir, write = national_dir
+    output_dir = str(tmp_path / "shards")
+    write(['GA', 'AL'])
+    ingest.partition_sdwis_by_state(str(input_dir), output_dir)
+    write(['GA'])
+    (input_dir / "SDWA_SITE_VISITS.csv").write_text('PWSID,VISIT_ID\n"GA0000001,1\n')
+
+    ingest.partition_sdwis_by_state(str(input_dir), output_dir)
+
+    assert sorted(os.listdir(output_dir)) == ['AL', 'GA']
+    assert not os.path.exists(f"{output_dir}.partial")
+    assert "left unchanged" in capsys.readouterr().out
+
+
+def test_failed_filter_leaves_no_partial_file(tmp_path):
+    input_path = tmp_path / "SDWA_SITE_VISITS.csv"
+    rows = "".join(f"GA{number:07d},{number}\n" for number in range(5))
+    input_path.write_text(f"PWSID,VISIT_ID\n{rows}\"GA0000009,9\n")
+    output_path = tmp_path / "out.csv"
+
+    with pytest.raises(Exception):
+        ingest.stream_filter_file(str(input_path), str(output_path), 'GA', chunk_size=2)
+
+    assert os.listdir(tmp_path) == ["SDWA_SITE_VISITS.csv"]
@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from fastapi import HTTPException
+
+import prewarm
+
+
+def test_worker_records_unexpected_errors_and_carries_on(loaded_app, tmp_path, monkeypatch):
+    outcomes = {'GA0000001': None, 'GA0000002': KeyError('POPULATION_SERVED_COUNT'),
+                'GA0000003': HTTPException(status_code=404, detail="No data"), 'GA0000004': None}
+
+    async def generate(pwsid):
+        if outcomes[pwsid] is not None:
+            raise outcomes[pwsid]
+        return "summary"
+
+    monkeypatch.setattr(loaded_app, "generate_and_cache_summary", generate)
+    monkeypatch.setattr(loaded_app, "llm_semaphore", loaded_app.llm_semaphore)
+    monkeypatch.setattr(prewarm, "pending_pwsids", lambda checkpoint, retry_failed: list(outcomes))
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+
+    asyncio.run(prewarm.prewarm(2, 6000, 1, 0.0, checkpoint_path, retry_failed=False))
+
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    assert "completed" not in checkpoint
+    assert checkpoint["no_data"] == ['GA0000003']
+    assert checkpoint["failed"] == {'GA0000002': "KeyError: 'POPULATION_SERVED_COUNT'"}
+
+
+def test_checkpoint_is_saved_in_batches(loaded_app, tmp_path, monkeypatch):
+    pwsids = [f"GA{number:07d}" for number in range(25)]
+    saves = []
+
+    async def generate(pwsid):
+        return "summary"
+
+    monkeypatch.setattr(loaded_app, "generate_and_cache_summary", generate)
+    monkeypatch.setattr(loaded_app, "llm_semaphore", loaded_app.llm_semaphore)
+    monkeypatch.setattr(prewarm, "pending_pwsids", lambda checkpoint, retry_failed: pwsids)
+    monkeypatch.setattr(prewarm, "CHECKPOINT_EVERY", 10)
+    monkeypatch.setattr(prewarm, "save_checkpoint", lambda path, checkpoint: saves.append(dict(checkpoint)))
+    checkpoint_path = tmp_path / "checkpoint.json"
+    checkpoint_path.write_text(json.dumps({"completed": pwsids, "failed": {pwsids[0]: "error"}, "no_data": []}))
+
+    asyncio.run(prewarm.prewarm(2, 6000, 1, 0.0, str(checkpoint_path), retry_failed=True))
+
+    # Two full batches, then once at the end.
+    assert len(saves) == 3
+    assert saves[-1] == {"failed": {}, "no_data": []}
@@ -0,0 +1,24 @@
+import pytest
+
+
+@pytest.mark.parametrize("every,audited", [(0, 0), (1, 4), (2, 2)])
+def test_prompt_size_audit_samples_generations(loaded_app, monkeypatch, every, audited):
+    calls = []
+    monkeypatch.setattr(loaded_app, "PROMPT_SIZE_AUDIT", every)
+    monkeypatch.setattr(loaded_app, "prompt_size_stats", dict.fromkeys(loaded_app.prompt_size_stats, 0))
+    monkeypatch.setattr(loaded_app, "get_data_for_pwsid", lambda pwsid: calls.append(pwsid) or {"Rows": ["x" * 50]})
+    for _ in range(4):
+        loaded_app.record_prompt_size("GA0000001", "prompt", "digest")
+
+    assert len(calls) == audited
+    assert loaded_app.prompt_size_stats["prompts"] == 4
+    assert loaded_app.prompt_size_stats["audited"] == audited
+    assert loaded_app.prompt_size_stats["audited_compact_chars"] == audited * len("digest")
+
+
+def test_summary_prompt_lists_latest_records(loaded_app):
+    pwsid = loaded_app.dataframes['SDWA_SITE_VISITS']['PWSID'].value_counts().index[0]
+    frames, latest = loaded_app.get_summary_frames(pwsid)
+    digest = loaded_app.build_summary_digest(frames, latest)
+    assert f"## Site Visits ({len(frames['SDWA_SITE_VISITS'])} records)" in digest
+    assert len(latest['SDWA_SITE_VISITS']) == min(loaded_app.PROMPT_LATEST_RECORDS, len(frames['SDWA_SITE_VISITS']))
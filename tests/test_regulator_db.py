@@ -0,0 +1,71 @@
+import json
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import regulator_db
+
+
+def test_shipped_data_has_no_violations_table(loaded_app):
+    # The regression below depends on this: data/ ships without SDWA_VIOLATIONS_ENFORCEMENT.csv.
+    assert not loaded_app.regulator.has_table('SDWA_VIOLATIONS_ENFORCEMENT')
+    assert loaded_app.regulator.has_table('SDWA_PUB_WATER_SYSTEMS')
+
+
+@pytest.mark.parametrize("query", ["county=Fulton", "significant_deficiency=true", "open_health_violations=true",
+                                   "city=Atlanta&source_water_type=GW", "violation_since=2020-01-01"])
+def test_regulator_queries_without_violations_table(client, query):
+    response = client.get(f"/api/regulator/systems?{query}")
+    assert response.status_code == 200, response.text
+    for system in response.json()["systems"]:
+        assert system["open_health_violations"] is None
+
+
+def test_violation_filters_match_nothing_without_violations_table(client):
+    assert client.get("/api/regulator/systems?open_health_violations=true").json()["systems"] == []
+
+
+def test_county_filter_matches_geographic_areas(loaded_app, client):
+    areas = loaded_app.dataframes['SDWA_GEOGRAPHIC_AREAS']
+    systems = loaded_app.dataframes['SDWA_PUB_WATER_SYSTEMS']
+    in_county = set(areas.loc[areas['COUNTY_SERVED'].astype(str).str.lower() == 'fulton', 'PWSID'].astype(str))
+    active = set(systems.loc[systems['PWS_ACTIVITY_CODE'].astype(str) == 'A', 'PWSID'].astype(str))
+    response = client.get("/api/regulator/systems?county=fulton&limit=1000").json()
+    assert {system["pwsid"] for system in response["systems"]} == in_county & active
+
+
+def test_export_streams_every_match(client):
+    page = client.get("/api/regulator/systems?county=Fulton&limit=1000").json()["systems"]
+    response = client.get("/api/regulator/systems/export?county=Fulton")
+    assert response.status_code == 200
+    assert [json.loads(line) for line in response.text.splitlines()] == page
+
+
+def test_query_errors_raise_before_streaming(tmp_path):
+    db = regulator_db.RegulatorDB(str(tmp_path / "empty.sqlite3"))
+    with pytest.raises(sqlite3.OperationalError):
+        db.iter_systems(county="Fulton")
+
+
+def test_violation_filters_and_counts(tmp_path):
+    db = regulator_db.RegulatorDB(str(tmp_path / "regulator.sqlite3"))
+    db.materialize('SDWA_PUB_WATER_SYSTEMS', pd.DataFrame({
+        'PWSID': ['GA1', 'GA2', 'GA3'], 'PWS_NAME': ['One', 'Two', 'Three'], 'CITY_NAME': ['A', 'B', 'C'],
+        'PWS_TYPE_CODE': ['CWS'] * 3, 'POPULATION_SERVED_COUNT': [10, 20, 30], 'PWS_ACTIVITY_CODE': ['A'] * 3,
+    }), "v1")
+    db.materialize('SDWA_VIOLATIONS_ENFORCEMENT', pd.DataFrame({
+        'PWSID': ['GA1', 'GA1', 'GA1', 'GA2', 'GA3'], 'VIOLATION_ID': ['v1', 'v1', 'v2', 'v3', 'v4'],
+        'IS_HEALTH_BASED_IND': ['Y', 'Y', 'Y', 'N', 'Y'],
+        'VIOLATION_STATUS': ['Unaddressed', 'Unaddressed', 'Addressed', 'Unaddressed', 'Resolved'],
+        'NON_COMPL_PER_BEGIN_DATE': ['2021-01-01', '2021-01-01', '2019-05-01', '2022-01-01', '2018-01-01'],
+        'CONTAMINANT_CODE': ['1040', '1040', '2050', '1040', '2050'],
+    }), "v1")
+    counts = {system["pwsid"]: system["open_health_violations"] for system in db.systems()}
+    assert counts == {'GA1': 2, 'GA2': 0, 'GA3': 0}
+    assert [system["pwsid"] for system in db.systems(open_health_violations=True)] == ['GA1']
+    assert [system["pwsid"] for system in db.systems(violation_since='2020-01-01')] == ['GA1', 'GA2']
+    assert [system["pwsid"] for system in db.systems(contaminant_code='2050')] == ['GA1', 'GA3']
+    # Missing tables: filters on them match nothing, and their columns are NULL.
+    assert db.systems(significant_deficiency=True) == []
+    assert {system["last_sanitary_survey"] for system in db.systems()} == {None}
@@ -0,0 +1,81 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from conftest import DATA_DIR, DATA_GLOBALS
+
+TABLES = ('SDWA_PUB_WATER_SYSTEMS', 'SDWA_GEOGRAPHIC_AREAS', 'SDWA_SITE_VISITS', 'SDWA_REF_CODE_VALUES',
+          'zipCodeToLatLong')
+
+
+@pytest.fixture
+def fresh_app(loaded_app, tmp_path, monkeypatch):
+    """The app with no data loaded, reading a private copy of some of the shipped tables."""
+    data_dir = tmp_path / "data"
+    os.makedirs(data_dir)
+    for name in TABLES:
+        shutil.copy(os.path.join(DATA_DIR, f"{name}.csv"), data_dir / f"{name}.csv")
+
+    def reset(snapshot_dir: str):
+        monkeypatch.setattr(loaded_app, "SNAPSHOT_DIR", snapshot_dir)
+        for name, empty in DATA_GLOBALS.items():
+            monkeypatch.setattr(loaded_app, name, empty())
+
+    monkeypatch.setattr(loaded_app, "DATA_DIR", str(data_dir))
+    reset(str(tmp_path / "snapshot"))
+    loaded_app.reset = reset
+    yield loaded_app
+    del loaded_app.reset
+
+
+def rewrite_site_visits(data_dir: str, pwsids):
+    """Drops the first visit of each of `pwsids` and changes a comment of one more system."""
+    path = os.path.join(data_dir, 'SDWA_SITE_VISITS.csv')
+    visits = pd.read_csv(path, dtype=str)
+    dropped = visits.index[visits['PWSID'].isin(pwsids)].to_series().groupby(visits['PWSID']).first()
+    visits = visits.drop(dropped)
+    edited = visits['PWSID'][~visits['PWSID'].isin(pwsids)].iloc[0]
+    visits.loc[visits['PWSID'] == edited, 'VISIT_COMMENTS'] = 'Re-inspected.'
+    visits.to_csv(path, index=False)
+    return set(pwsids) | {edited}
+
+
+def test_incremental_reload_matches_full_load(fresh_app, tmp_path):
+    app = fresh_app
+    app.load_all_data()
+    before = dict(app.pwsid_fingerprints)
+    visits = app.dataframes['SDWA_SITE_VISITS']
+    changed = rewrite_site_visits(app.DATA_DIR, list(visits['PWSID'].astype(str).drop_duplicates()[:3]))
+
+    result = app.load_all_data()
+    assert result["changed_tables"] == ['SDWA_SITE_VISITS']
+    incremental = {name: getattr(app, name) for name in ("pwsid_fingerprints", "pwsid_index", "data_version")}
+    rollups = app.rollups
+    # Fingerprints move for exactly the systems whose rows changed.
+    assert set(app.stale_pwsids(before, app.pwsid_fingerprints)) == changed
+
+    app.reset(str(tmp_path / "full_snapshot"))
+    app.load_all_data()
+    assert incremental["pwsid_fingerprints"] == app.pwsid_fingerprints
+    assert incremental["pwsid_index"] == app.pwsid_index
+    assert incremental["data_version"] == app.data_version
+    assert rollups.totals() == app.rollups.totals()
+    for dimension in app.sdwis_rollups.DIMENSIONS:
+        assert rollups.records(dimension) == app.rollups.records(dimension)
+
+
+def test_failed_csv_is_skipped_until_it_changes(fresh_app):
+    app = fresh_app
+    broken = os.path.join(app.DATA_DIR, 'SDWA_BROKEN.csv')
+    open(broken, 'w').close()
+    result = app.load_all_data()
+    assert result["failed_tables"] == ['SDWA_BROKEN'] and 'SDWA_BROKEN' not in app.dataframes
+    assert not app.data_files_changed()
+    assert app.load_all_data()["changed_tables"] == []
+
+    with open(broken, 'w') as f:
+        f.write("PWSID,VALUE\nGA0000001,1\n")
+    assert app.data_files_changed()
+    assert app.load_all_data()["changed_tables"] == ['SDWA_BROKEN'] and not app.failed_tables
@@ -0,0 +1,90 @@
+import pandas as pd
+
+import sdwis_index
+from sdwis_rollups import DIMENSIONS, Rollups, SANITARY_SURVEY_REASON, SIGNIFICANT_DEFICIENCY
+
+
+def source_frames(app):
+    """Copies of the rollup source tables, plus a few violations for the first systems."""
+    frames = {name: app.dataframes[name].copy()
+              for name in ('SDWA_PUB_WATER_SYSTEMS', 'SDWA_SITE_VISITS', 'SDWA_GEOGRAPHIC_AREAS')}
+    active = frames['SDWA_PUB_WATER_SYSTEMS']
+    pwsids = list(active.loc[active['PWS_ACTIVITY_CODE'] == 'A', 'PWSID'].astype(str)[:4])
+    frames['SDWA_VIOLATIONS_ENFORCEMENT'] = pd.DataFrame({
+        'PWSID': [pwsids[0], pwsids[0], pwsids[1], pwsids[2]],
+        'VIOLATION_ID': ['1', '2', '3', '4'],
+        'IS_HEALTH_BASED_IND': ['Y', 'N', 'Y', 'Y'],
+        'VIOLATION_STATUS': ['Unaddressed', 'Resolved', 'Addressed', 'Archived'],
+        'NON_COMPL_PER_BEGIN_DATE': ['01/05/2020', '03/01/2021', '07/15/2019', '02/02/2018'],
+    })
+    return frames
+
+
+def edit_systems(frames):
+    """Changes a handful of systems across every source table; returns their PWSIDs."""
+    systems = frames['SDWA_PUB_WATER_SYSTEMS']
+    active = systems.index[systems['PWS_ACTIVITY_CODE'] == 'A']
+    moved, closed, grown = (str(systems.at[row, 'PWSID']) for row in active[:3])
+    systems.loc[systems['PWSID'] == moved, 'PWS_TYPE_CODE'] = 'NTNCWS'
+    systems.loc[systems['PWSID'] == closed, 'PWS_ACTIVITY_CODE'] = 'I'
+    systems.loc[systems['PWSID'] == grown, 'POPULATION_SERVED_COUNT'] = 123456
+
+    areas = frames['SDWA_GEOGRAPHIC_AREAS']
+    areas['COUNTY_SERVED'] = areas['COUNTY_SERVED'].cat.add_categories('Nowhere')
+    counties = areas[(areas['AREA_TYPE_CODE'] == 'CN') & areas['PWSID'].isin(systems.loc[active, 'PWSID'])]
+    relocated = str(counties['PWSID'].iloc[-1])
+    areas.loc[(areas['PWSID'] == relocated) & (areas['AREA_TYPE_CODE'] == 'CN'), 'COUNTY_SERVED'] = 'Nowhere'
+
+    visits = frames['SDWA_SITE_VISITS']
+    surveys = visits.index[visits['VISIT_REASON_CODE'] == SANITARY_SURVEY_REASON]
+    deficient = str(visits.at[surveys[-1], 'PWSID'])
+    visits.loc[visits['PWSID'] == deficient, 'PUMPS_EVAL_CODE'] = SIGNIFICANT_DEFICIENCY
+
+    violations = frames['SDWA_VIOLATIONS_ENFORCEMENT']
+    resolved = violations.at[0, 'PWSID']
+    violations.loc[violations['PWSID'] == resolved, 'VIOLATION_STATUS'] = 'Resolved'
+    return {moved, closed, grown, relocated, deficient, resolved}
+
+
+def test_updated_matches_full_build(loaded_app):
+    frames, indexes, _ = sdwis_index.index_all(source_frames(loaded_app))
+    before = Rollups.build(frames, indexes)
+
+    frames = {name: df.copy() for name, df in frames.items()}
+    changed = edit_systems(frames)
+    frames, indexes, _ = sdwis_index.index_all(frames)
+    full = Rollups.build(frames, indexes)
+    incremental = before.updated(frames, indexes, changed)
+
+    assert full.totals() != before.totals()
+    assert incremental.totals() == full.totals()
+    pd.testing.assert_frame_equal(incremental.facts, full.facts, check_like=True)
+    for dimension in DIMENSIONS:
+        pd.testing.assert_series_equal(incremental.members[dimension], full.members[dimension],
+                                       check_index_type=False)
+        assert incremental.records(dimension) == full.records(dimension)
+    assert 'Nowhere' in incremental.groups['county'].index
+
+
+def test_updated_with_no_changes_keeps_groups(loaded_app):
+    frames, indexes, _ = sdwis_index.index_all(source_frames(loaded_app))
+    rollups = Rollups.build(frames, indexes)
+    updated = rollups.updated(frames, indexes, [])
+
+    assert updated.totals() == rollups.totals()
+    assert updated.stats["regrouped"] == {dimension: 0 for dimension in DIMENSIONS}
+    for dimension in DIMENSIONS:
+        assert updated.records(dimension) == rollups.records(dimension)
+
+
+def test_system_totals_match_pandas(loaded_app):
+    frames, indexes, _ = sdwis_index.index_all(source_frames(loaded_app))
+    systems = frames['SDWA_PUB_WATER_SYSTEMS']
+    active = systems[systems['PWS_ACTIVITY_CODE'] == 'A'].drop_duplicates('PWSID')
+    totals = Rollups.build(frames, indexes).totals()
+
+    assert totals['systems'] == len(active)
+    assert totals['population'] == pd.to_numeric(active['POPULATION_SERVED_COUNT'], errors='coerce').fillna(0).sum()
+    assert totals['violations'] == 4
+    assert totals['health_based_violations'] == 3
+    assert totals['systems_with_open_health_violations'] == 2
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import sdwis_index
+
+EVENT_TABLES = ('SDWA_SITE_VISITS', 'SDWA_EVENTS_MILESTONES')
+WINDOWS = [(None, None), ('2015-01-01', None), (None, '2018-06-30'), ('2016-03-01', '2020-12-31'),
+           ('2019-05-05', '2019-05-05'), ('2030-01-01', None)]
+
+
+def sample_pwsids(df, count=40):
+    """Systems with the most rows first, then a spread of the others."""
+    counts = df['PWSID'].value_counts()
+    return list(counts.index[:count // 2]) + list(counts.index[count // 2::max(1, len(counts) // count)])
+
+
+def timestamp(value):
+    return None if value is None else pd.Timestamp(value)
+
+
+@pytest.mark.parametrize("name", ['SDWA_PUB_WATER_SYSTEMS', 'SDWA_GEOGRAPHIC_AREAS', *EVENT_TABLES])
+def test_partition_ranges_match_pandas_filter(loaded_app, name):
+    df, index = loaded_app.dataframes[name], loaded_app.pwsid_index[name]
+    assert set(index) == set(df['PWSID'].dropna())
+    assert sum(stop - start for start, stop in index.values()) == df['PWSID'].notna().sum()
+    for pwsid in sample_pwsids(df):
+        expected = df[df['PWSID'] == pwsid]
+        pd.testing.assert_frame_equal(sdwis_index.slice_partition(df, index, pwsid), expected)
+    assert sdwis_index.slice_partition(df, index, 'ZZ0000000').empty
+
+
+@pytest.mark.parametrize("name", EVENT_TABLES)
+@pytest.mark.parametrize("start,end", WINDOWS)
+def test_event_windows_match_pandas_filter(loaded_app, name, start, end):
+    df, index = loaded_app.dataframes[name], loaded_app.pwsid_index[name]
+    keys = loaded_app.event_keys[name]
+    start, end = timestamp(start), timestamp(end)
+    dates = df[sdwis_index.EVENT_DATE_COLUMNS[name]]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format='%m/%d/%Y', errors='coerce')
+    for pwsid in sample_pwsids(df):
+        mask = df['PWSID'] == pwsid
+        if start is not None or end is not None:
+            mask &= dates.notna()
+        if start is not None:
+            mask &= dates >= start
+        if end is not None:
+            mask &= dates <= end
+        window = sdwis_index.slice_window(df, index, keys, pwsid, start, end)
+        pd.testing.assert_frame_equal(window.sort_index(), df[mask])
+        assert dates[window.index].dropna().is_monotonic_increasing
+
+
+def test_sort_orders_events_by_date_within_system():
+    df = pd.DataFrame({'PWSID': ['B', 'A', 'B', 'A', 'A'],
+                       'VISIT_DATE': ['03/01/2020', None, '01/15/2019', '12/31/2021', '02/02/2002']})
+    ordered = sdwis_index.sort_by_pwsid(df, 'VISIT_DATE')
+    assert list(ordered['PWSID']) == ['A', 'A', 'A', 'B', 'B']
+    assert list(ordered['VISIT_DATE']) == ['02/02/2002', '12/31/2021', None, '01/15/2019', '03/01/2020']
+    index = sdwis_index.build_partition_index(ordered)
+    keys = sdwis_index.build_event_keys(ordered, 'VISIT_DATE')
+    assert index == {'A': (0, 3), 'B': (3, 5)}
+    assert sdwis_index.window_bounds(keys, index['A']) == (0, 3)
+    assert sdwis_index.window_bounds(keys, index['A'], start=pd.Timestamp('2000-01-01')) == (0, 2)
+    assert sdwis_index.window_bounds(keys, index['B'], end=pd.Timestamp('2019-01-15')) == (3, 4)
+
+
+def fingerprints(df):
+    df = sdwis_index.sort_by_pwsid(df)
+    return sdwis_index.partition_fingerprints(df, sdwis_index.build_partition_index(df))
+
+
+def test_fingerprints_change_only_for_edited_systems(loaded_app):
+    df = loaded_app.dataframes['SDWA_SITE_VISITS']
+    before = fingerprints(df)
+    edited, dropped, added = sample_pwsids(df, 6)[:3]
+
+    changed = df.copy()
+    changed.loc[changed.index[changed['PWSID'] == edited][0], 'VISIT_REASON_CODE'] = 'OTHR'
+    changed = changed.drop(changed.index[changed['PWSID'] == dropped][:1])
+    changed = pd.concat([changed, df[df['PWSID'] == added].head(1)], ignore_index=True)
+    after = fingerprints(changed)
+
+    assert before.keys() == after.keys()
+    assert {pwsid for pwsid in before if before[pwsid] != after[pwsid]} == {edited, dropped, added}
+
+
+def test_fingerprints_ignore_row_order_and_track_extra_columns(loaded_app):
+    df = loaded_app.dataframes['SDWA_SITE_VISITS']
+    shuffled = df.sample(frac=1, random_state=7).reset_index(drop=True)
+    assert fingerprints(shuffled) == fingerprints(df)
+
+    ordered = sdwis_index.sort_by_pwsid(df)
+    index = sdwis_index.build_partition_index(ordered)
+    extra = pd.DataFrame({'VISIT_COMMENTS': np.where(ordered['PWSID'] == ordered['PWSID'].iloc[0], 'x', '')})
+    with_extra = sdwis_index.partition_fingerprints(ordered, index, extra)
+    plain = sdwis_index.partition_fingerprints(ordered, index, pd.DataFrame({'VISIT_COMMENTS': [''] * len(ordered)}))
+    assert {pwsid for pwsid in plain if plain[pwsid] != with_extra[pwsid]} == {ordered['PWSID'].iloc[0]}
+
+
+def test_combined_fingerprints_cover_every_table():
+    combined = sdwis_index.combine_fingerprints({'A': {'X': 1, 'Y': 2}, 'B': {'Y': 3}})
+    assert set(combined) == {'X', 'Y'}
+    moved = sdwis_index.combine_fingerprints({'A': {'X': 1, 'Y': 2}, 'B': {'Y': 4}})
+    assert moved['X'] == combined['X'] and moved['Y'] != combined['Y']
+
+
+@pytest.mark.parametrize("name", EVENT_TABLES)
+def test_latest_records_match_a_date_sort(loaded_app, name):
+    tables = loaded_app.tables_for('GA0000000')
+    df, index = loaded_app.dataframes[name], loaded_app.pwsid_index[name]
+    dates = df[sdwis_index.EVENT_DATE_COLUMNS[name]]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format='%m/%d/%Y', errors='coerce')
+    for pwsid in sample_pwsids(df):
+        rows = sdwis_index.slice_partition(df, index, pwsid)
+        newest_first = dates[rows.index].sort_values(ascending=False, na_position='last')
+        for n in (1, 10, len(rows) + 5):
+            latest = loaded_app.latest_records(tables, name, pwsid, rows, n)
+            assert latest.index.is_unique and set(latest.index) <= set(rows.index)
+            assert dates[latest.index].reset_index(drop=True).equals(newest_first.head(n).reset_index(drop=True))
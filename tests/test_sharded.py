@@ -0,0 +1,38 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import filter_sdwis_to_georgia as ingest
+from conftest import DATA_DIR, DATA_GLOBALS
+
+
+@pytest.fixture
+def sharded_app(loaded_app, tmp_path, monkeypatch):
+    """The app in sharded mode, over a --partition run of the shipped tables."""
+    shard_dir = str(tmp_path / "shards")
+    # Threads instead of forked workers: the test process already runs threads of its own.
+    monkeypatch.setattr(ingest, "ProcessPoolExecutor", ThreadPoolExecutor)
+    ingest.partition_sdwis_by_state(DATA_DIR, shard_dir, workers=2)
+    monkeypatch.setattr(loaded_app, "SHARD_DIR", shard_dir)
+    monkeypatch.setattr(loaded_app, "SNAPSHOT_DIR", str(tmp_path / "snapshot"))
+    for name, empty in DATA_GLOBALS.items():
+        monkeypatch.setattr(loaded_app, name, empty())
+    loaded_app.load_all_data()
+    return loaded_app
+
+
+def test_partition_shares_reference_files(sharded_app):
+    shared = os.path.join(sharded_app.SHARD_DIR, ingest.SHARED_PARTITION)
+    assert sorted(os.listdir(shared)) == sorted(ingest.SHARED_FILENAMES)
+    assert sharded_app.shard_store.states() == ['GA']
+
+
+def test_sharded_map_and_lookup(sharded_app, client):
+    assert sharded_app.zip_coords
+    assert client.get("/api/map").status_code == 200
+    zip_code = next(iter(sharded_app.zip_coords))
+    assert client.get(f"/api/lookup?zip={zip_code}").status_code == 200
+    assert client.get("/api/lookup?county=Fulton").status_code == 200
+    pwsid = sharded_app.all_systems()['PWSID'].iloc[0]
+    assert client.get(f"/api/systems/{pwsid}").status_code == 200
@@ -0,0 +1,47 @@
+import os
+import shutil
+
+import pytest
+
+import sdwis_shards
+from conftest import DATA_DIR
+
+STATE_TABLES = ('SDWA_PUB_WATER_SYSTEMS', 'SDWA_GEOGRAPHIC_AREAS', 'SDWA_SITE_VISITS')
+
+
+@pytest.fixture
+def store(loaded_app, tmp_path):
+    os.makedirs(tmp_path / "shards" / "GA")
+    for name in STATE_TABLES:
+        shutil.copy(os.path.join(DATA_DIR, f"{name}.csv"), tmp_path / "shards" / "GA" / f"{name}.csv")
+    return sdwis_shards.ShardStore(str(tmp_path / "shards"), str(tmp_path / "snapshots"), loaded_app.prepare_table,
+                                   memory_budget_bytes=1 << 30)
+
+
+def test_unknown_state_touches_no_state(store):
+    assert store.get("ZZ") is sdwis_shards.EMPTY_SHARD
+    assert store.get("../") is sdwis_shards.EMPTY_SHARD
+    assert store.fingerprint("ZZ0000001") is None
+    assert store.loading == {}
+    assert store.report()["misses"] == 0
+
+
+def test_shard_matches_global_tables(loaded_app, store):
+    shard = store.get("GA")
+    assert store.report()["misses"] == 1 and store.get("GA") is shard and store.report()["hits"] == 1
+    for name in STATE_TABLES:
+        assert shard.pwsid_index[name] == loaded_app.pwsid_index[name]
+    pwsid = next(iter(shard.pwsid_fingerprints))
+    assert store.fingerprint(pwsid) == shard.pwsid_fingerprints[pwsid]
+
+
+def test_directory_refreshes_changed_states(loaded_app, store, tmp_path):
+    assert store.directory_changed()
+    assert store.refresh_directory() == ["GA"]
+    assert not store.directory_changed() and store.refresh_directory() == []
+    frames, violations = store.directory()
+    assert len(frames['SDWA_PUB_WATER_SYSTEMS']) == len(loaded_app.dataframes['SDWA_PUB_WATER_SYSTEMS'])
+    assert violations.empty
+    shutil.rmtree(tmp_path / "shards" / "GA")
+    assert store.directory_changed()
+    assert store.refresh_directory() == ["GA"] and store.directory()[0] == {}